@@ -0,0 +1,246 @@
+##########
+# IMPORTS
+##########
+
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from concurrent.futures.process import BrokenProcessPool
+import argparse
+import interpreter
+import json
+import multiprocessing
+import os
+import shell
+import signal
+import sys
+import time
+
+
+##########
+# CONSTANTS
+##########
+
+PROGRAM_SUFFIX = '.imp'
+DEFAULT_TIMEOUT = 30.0
+
+
+####################
+# PROGRAMS
+####################
+
+def find_programs(path):
+    # A directory contributes every .imp file below it, a manifest lists one program path per line
+    if os.path.isdir(path):
+        programs = []
+        for directory, _, file_names in os.walk(path):
+            programs.extend(os.path.join(directory, name) for name in file_names if name.endswith(PROGRAM_SUFFIX))
+        return sorted(programs)
+
+    if path.endswith(PROGRAM_SUFFIX):
+        return [path]
+
+    programs = []
+    base = os.path.dirname(path)
+    with open(path) as manifest:
+        for line in manifest:
+            line = line.strip()
+            if line and not line.startswith('#'):
+                programs.append(os.path.join(base, line))
+    return programs
+
+
+####################
+# WORKER
+####################
+
+class ProgramTimeout(Exception):
+    pass
+
+
+def raise_timeout(signum, frame):
+    raise ProgramTimeout()
+
+
+# Queue a pooled worker reports each program's index to as it starts it, or the error it failed to start with
+started_queue = None
+
+
+def init_worker(engine, optimize, started=None):
+    global started_queue
+    started_queue = started
+
+    try:
+        # Ctrl-C is handled by the parent, which shuts the pool down
+        signal.signal(signal.SIGINT, signal.SIG_IGN)
+        if hasattr(signal, 'SIGALRM'):
+            signal.signal(signal.SIGALRM, raise_timeout)
+
+        # Warm the engine up once so the first program doesn't pay for it
+        shell.run('<warmup>', '0', engine=engine, optimize=optimize, symbol_table=interpreter.SymbolTable())
+    except Exception as exception:
+        if started is not None: started.put(f'{type(exception).__name__}: {exception}')
+        raise
+
+
+def start_program(index, path, engine, optimize, use_cache, timeout):
+    # The marker is written before the program runs, so a worker that dies leaves the index of the program that killed it
+    if started_queue is not None: started_queue.put(index)
+    return run_program(path, engine, optimize, use_cache, timeout)
+
+
+def run_program(path, engine, optimize, use_cache, timeout):
+    # Lines run in order like REPL input, against a symbol table of their own; the first error stops the program
+    result = {'program': path, 'status': 'ok', 'results': []}
+    symbol_table = interpreter.SymbolTable()
+    start = time.perf_counter()
+    timed = timeout and hasattr(signal, 'setitimer')
+
+    # The timer is armed and disarmed inside the handlers, so it can only fire where ProgramTimeout is caught
+    try:
+        try:
+            if timed: signal.setitimer(signal.ITIMER_REAL, timeout)
+
+            with open(path) as file:
+                lines = file.read().splitlines()
+
+            for line_num, text in enumerate(lines):
+                if not text.strip(): continue
+
+                value, err = shell.run(path, text, engine=engine, optimize=optimize, use_cache=use_cache, symbol_table=symbol_table)
+                if err:
+                    result.update(status='error', line=line_num + 1, error=err.as_string())
+                    break
+                result['results'].append(None if value is None else repr(value))
+        finally:
+            if timed: signal.setitimer(signal.ITIMER_REAL, 0)
+    except ProgramTimeout:
+        result.update(status='timeout', error=f'Timed out after {timeout}s')
+    except Exception as exception:
+        result.update(status='crash', error=f'{type(exception).__name__}: {exception}')
+
+    result['seconds'] = round(time.perf_counter() - start, 6)
+    return result
+
+
+####################
+# BATCH
+####################
+
+def run_batch(programs, output, workers=None, engine='interpreter', optimize=True, use_cache=False, timeout=DEFAULT_TIMEOUT):
+    counts = {}
+
+    def report(index, result):
+        result['index'] = index
+        counts[result['status']] = counts.get(result['status'], 0) + 1
+        output.write(json.dumps(result) + '\n')
+        output.flush()
+
+    def new_pool(size, started=None):
+        return ProcessPoolExecutor(size, initializer=init_worker, initargs=(engine, optimize, started))
+
+    # A worker that dies breaks every future still pending in its pool. Programs that hadn't started go
+    # to a fresh pool of full size; only those that were running when it broke are suspects
+    pending = list(enumerate(programs))
+    while pending:
+        started = multiprocessing.SimpleQueue()
+        executor = new_pool(workers, started)
+        broken = []
+        try:
+            futures = {executor.submit(start_program, index, path, engine, optimize, use_cache, timeout): (index, path)
+                       for index, path in pending}
+
+            while futures:
+                done, _ = wait(futures, return_when=FIRST_COMPLETED)
+                for future in done:
+                    index, path = futures.pop(future)
+                    try:
+                        report(index, future.result())
+                    except BrokenProcessPool:
+                        broken.append((index, path))
+                    except Exception as exception:
+                        report(index, crash(path, exception))
+        finally:
+            executor.shutdown(wait=not broken, cancel_futures=True)
+
+        started_indexes = set()
+        start_errors = []
+        while not started.empty():
+            marker = started.get()
+            if type(marker) is str:
+                start_errors.append(marker)
+            else:
+                started_indexes.add(marker)
+        started.close()
+
+        # A pool that broke before running anything would break again the same way, so its programs fail here
+        if broken and not started_indexes:
+            message = f'Worker failed to start: {start_errors[0]}' if start_errors else 'Worker process died before starting a program'
+            for index, path in broken:
+                report(index, {'program': path, 'status': 'crash', 'error': message})
+            break
+
+        # Every program that started either finished or is a suspect, so each round makes progress
+        suspects = [(index, path) for index, path in broken if index in started_indexes]
+        pending = [(index, path) for index, path in broken if index not in started_indexes]
+        run_isolated(suspects, workers or os.cpu_count() or 1, new_pool, report, engine, optimize, use_cache, timeout)
+
+    return counts
+
+
+def crash(path, exception):
+    return {'program': path, 'status': 'crash', 'error': f'{type(exception).__name__}: {exception}'}
+
+
+def run_isolated(suspects, workers, new_pool, report, engine, optimize, use_cache, timeout):
+    # Reruns each suspect once in a pool of its own, up to `workers` of them at a time; the one that kills
+    # its worker again is the crash
+    suspects = iter(suspects)
+    pools = {}
+
+    def submit_next():
+        suspect = next(suspects, None)
+        if suspect is None: return
+
+        index, path = suspect
+        executor = new_pool(1)
+        pools[executor.submit(run_program, path, engine, optimize, use_cache, timeout)] = (index, path, executor)
+
+    try:
+        for _ in range(workers):
+            submit_next()
+
+        while pools:
+            done, _ = wait(pools, return_when=FIRST_COMPLETED)
+            for future in done:
+                index, path, executor = pools.pop(future)
+                executor.shutdown(wait=False)
+                try:
+                    report(index, future.result())
+                except BrokenProcessPool:
+                    report(index, {'program': path, 'status': 'crash', 'error': 'Worker process died'})
+                except Exception as exception:
+                    report(index, crash(path, exception))
+                submit_next()
+    finally:
+        for index, path, executor in pools.values():
+            executor.shutdown(wait=False)
+
+
+def main(argv=None):
+    arg_parser = argparse.ArgumentParser(description='Run imp programs in parallel and print one JSON line per program.')
+    arg_parser.add_argument('paths', nargs='+', help='program files, directories of .imp files, or manifests listing programs')
+    arg_parser.add_argument('-j', '--workers', type=int, default=None, help='worker processes (default: CPU count)')
+    arg_parser.add_argument('--engine', default='interpreter', choices=('interpreter', 'vm', 'closure', 'flat', 'transpile', 'iterative'))
+    arg_parser.add_argument('--no-optimize', dest='optimize', action='store_false', help='skip constant folding')
+    arg_parser.add_argument('--cache', dest='use_cache', action='store_true', help='use the on-disk parse cache')
+    arg_parser.add_argument('--timeout', type=float, default=DEFAULT_TIMEOUT, help='seconds per program, 0 for none')
+    args = arg_parser.parse_args(argv)
+
+    programs = [program for path in args.paths for program in find_programs(path)]
+    counts = run_batch(programs, sys.stdout, args.workers, args.engine, args.optimize, args.use_cache, args.timeout)
+
+    print(', '.join(f'{count} {status}' for status, count in sorted(counts.items())) or 'no programs', file=sys.stderr)
+    return 0 if set(counts) <= {'ok'} else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,65 @@
+##########
+# IMPORTS
+##########
+
+from benchmarks import runner
+from benchmarks.corpus import CORPUS
+import argparse
+import sys
+
+
+####################
+# COMMANDS
+####################
+
+def run_command(args):
+    report = runner.run_suite(args.benchmarks or None, args.stages or runner.STAGES, args.rounds, args.min_time,
+                              progress=lambda key, result: print(runner.format_result(key, result), flush=True))
+    if args.output:
+        runner.save(report, args.output)
+    if args.baseline:
+        return compare_reports(runner.load(args.baseline), report, args.threshold)
+    return 0
+
+
+def compare_command(args):
+    return compare_reports(runner.load(args.old), runner.load(args.new), args.threshold)
+
+
+def compare_reports(old, new, threshold):
+    rows, regressions = runner.compare(old, new, threshold)
+    print(runner.format_comparison(rows))
+    if regressions:
+        print(f'{len(regressions)} regression(s) beyond {threshold:.0%}: {", ".join(regressions)}', file=sys.stderr)
+        return 1
+    return 0
+
+
+def main(argv=None):
+    arg_parser = argparse.ArgumentParser(prog='python -m benchmarks', description='Time lexing, parsing and evaluation of imp programs.')
+    commands = arg_parser.add_subparsers(dest='command', required=True)
+
+    run = commands.add_parser('run', help='run the benchmarks')
+    run.add_argument('benchmarks', nargs='*', metavar='BENCHMARK', help=f'programs to run (default: all of {", ".join(CORPUS)})')
+    run.add_argument('--stage', dest='stages', action='append', choices=runner.STAGES, help='stages to time (default: all)')
+    run.add_argument('--rounds', type=int, default=5, help='samples per benchmark')
+    run.add_argument('--min-time', type=float, default=0.2, help='seconds each sample runs for at least')
+    run.add_argument('-o', '--output', help='save results as JSON')
+    run.add_argument('--baseline', help='compare against saved results')
+    run.add_argument('--threshold', type=float, default=runner.DEFAULT_THRESHOLD, help='allowed slowdown, e.g. 0.1')
+    run.set_defaults(handler=run_command)
+
+    compare = commands.add_parser('compare', help='compare two saved runs')
+    compare.add_argument('old')
+    compare.add_argument('new')
+    compare.add_argument('--threshold', type=float, default=runner.DEFAULT_THRESHOLD, help='allowed slowdown, e.g. 0.1')
+    compare.set_defaults(handler=compare_command)
+
+    args = arg_parser.parse_args(argv)
+    unknown = [name for name in getattr(args, 'benchmarks', []) if name not in CORPUS]
+    if unknown: arg_parser.error(f'unknown benchmark: {", ".join(unknown)}')
+    return args.handler(args)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,96 @@
+##########
+# IMPORTS
+##########
+
+import random
+
+
+####################
+# PROGRAMS
+####################
+
+# Each program is a list of lines that run in order against one symbol table, like REPL input
+
+def nested_for():
+    return [
+        'VAR total = 0',
+        'FOR i = 0 TO 60 THEN FOR j = 0 TO 60 THEN VAR total = total + (IF i > j THEN i - j ELSE j - i)',
+        'FOR i = 40 TO 0 STEP -1 THEN FOR j = 0 TO i STEP 0.5 THEN VAR total = total - j / (i + 1)',
+        'total',
+    ]
+
+
+def while_convergence(values=40):
+    # Newton's method for square roots, then a slowly damped series
+    lines = ['VAR roots = 0']
+    for x in range(1, values + 1):
+        lines += [
+            f'VAR g = {x}',
+            f'WHILE (g * g - {x}) * (g * g - {x}) > 0.000000000001 THEN VAR g = (g + {x} / g) / 2',
+            'VAR roots = roots + g',
+        ]
+    return lines + [
+        'VAR y = 0',
+        'VAR d = 1',
+        'WHILE d > 0.0001 THEN (VAR y = y + d) + (VAR d = d * 0.999)',
+        'roots + y',
+    ]
+
+
+def if_chain(branches=40):
+    # Buckets every value of a loop through a long IF/ELIF chain
+    chain = ' '.join(f'ELIF i < {branch * 5} THEN {branch}' for branch in range(2, branches))
+    return [
+        'VAR buckets = 0',
+        f'FOR i = 0 TO {branches * 5} THEN VAR buckets = buckets + (IF i < 5 THEN 1 {chain} ELSE {branches})',
+        'buckets',
+    ]
+
+
+def long_arithmetic(terms=400, seed=17):
+    generator = random.Random(seed)
+    expression = 'x'
+    for _ in range(terms):
+        operator = generator.choice(['+', '-', '*', '/'])
+        operand = generator.choice(['x', 'y', str(generator.randint(1, 9)), f'({generator.randint(1, 9)} + y)'])
+        expression = f'({expression} {operator} {operand})' if operator in '*/' else f'{expression} {operator} {operand}'
+    return [
+        'VAR x = 1.5',
+        'VAR y = 0.75',
+        f'VAR result = {expression}',
+        'result',
+    ]
+
+
+def generated_source(statements=60, width=40, seed=5):
+    # Many long generated lines, so lexing and parsing dominate
+    generator = random.Random(seed)
+    names = ['a', 'b', 'c', 'counter', 'value']
+    lines = [f'VAR {name} = {index + 1}' for index, name in enumerate(names)]
+
+    for _ in range(statements):
+        terms = []
+        for _ in range(width):
+            kind = generator.random()
+            if kind < 0.4:
+                terms.append(generator.choice(names))
+            elif kind < 0.7:
+                terms.append(str(generator.randint(0, 1000)))
+            elif kind < 0.85:
+                terms.append(f'{generator.randint(1, 99)}.{generator.randint(0, 99)}')
+            else:
+                terms.append(f'(IF {generator.choice(names)} > {generator.randint(0, 10)} THEN 1 ELSE 2)')
+        operators = [generator.choice([' + ', ' - ', ' * ']) for _ in range(width - 1)]
+        expression = terms[0] + ''.join(operator + term for operator, term in zip(operators, terms[1:]))
+        lines.append(f'VAR {generator.choice(names)} = ({expression}) / 1000000')
+
+    return lines
+
+
+CORPUS = {
+    'nested_for': nested_for,
+    'while_convergence': while_convergence,
+    'if_chain': if_chain,
+    'long_arithmetic': long_arithmetic,
+    'generated_source': generated_source,
+}
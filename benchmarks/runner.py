@@ -0,0 +1,185 @@
+##########
+# IMPORTS
+##########
+
+from benchmarks.corpus import CORPUS
+import interpreter
+import json
+import lexer
+import optimizer
+import os
+import parse
+import platform
+import statistics
+import sys
+import time
+
+
+##########
+# CONSTANTS
+##########
+
+FORMAT_VERSION = 1
+STAGES = ('lex', 'parse', 'evaluate')
+DEFAULT_THRESHOLD = 0.10
+
+
+####################
+# STAGES
+####################
+
+def lex_program(file_name, lines):
+    tokens = []
+    for text in lines:
+        line_tokens, err = lexer.Lexer(file_name, text).create_tokens()
+        if err: raise ValueError(err.as_string())
+        tokens.append(line_tokens)
+    return tokens
+
+
+def parse_program(tokens):
+    nodes = []
+    for line_tokens in tokens:
+        ast = parse.Parser(line_tokens).parse()
+        if ast.error: raise ValueError(ast.error.as_string())
+        nodes.append(ast.node)
+    return nodes
+
+
+def evaluate_program(nodes):
+    symbol_table = interpreter.SymbolTable()
+    interp = interpreter.Interpreter()
+    result = None
+
+    for node in nodes:
+        context = interpreter.Context('<program>')
+        context.symbol_table = symbol_table
+        result, err = interp.run(node, context)
+        if err: raise ValueError(err.as_string())
+
+    return result
+
+
+def stage_functions(name, lines):
+    # Each stage is timed on its own, with the earlier stages' output prepared up front
+    tokens = lex_program(name, lines)
+    nodes = [optimizer.optimize(node) for node in parse_program(tokens)]
+    evaluate_program(nodes)
+
+    return {
+        'lex': lambda: lex_program(name, lines),
+        'parse': lambda: parse_program(tokens),
+        'evaluate': lambda: evaluate_program(nodes),
+    }
+
+
+####################
+# TIMING
+####################
+
+def calibrate(function, min_time):
+    # The smallest power of two of calls that takes at least min_time
+    number = 1
+    while True:
+        start = time.perf_counter()
+        for _ in range(number):
+            function()
+        if time.perf_counter() - start >= min_time or number >= 1 << 20:
+            return number
+        number *= 2
+
+
+def measure(function, rounds, min_time):
+    number = calibrate(function, min_time)
+    samples = []
+
+    for _ in range(rounds):
+        start = time.perf_counter()
+        for _ in range(number):
+            function()
+        samples.append(number / (time.perf_counter() - start))
+
+    mean = statistics.fmean(samples)
+    stdev = statistics.stdev(samples) if len(samples) > 1 else 0.0
+    return {
+        'ops_per_sec': mean,
+        'stdev': stdev,
+        'relative_stdev': stdev / mean,
+        'calls_per_round': number,
+        'samples': samples,
+    }
+
+
+def run_suite(names=None, stages=STAGES, rounds=5, min_time=0.2, progress=None):
+    results = {}
+
+    for name in names or CORPUS:
+        functions = stage_functions(name, CORPUS[name]())
+        for stage in stages:
+            key = f'{name}/{stage}'
+            results[key] = measure(functions[stage], rounds, min_time)
+            if progress: progress(key, results[key])
+
+    return {
+        'format_version': FORMAT_VERSION,
+        'created': time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+        'python': sys.version.split()[0],
+        'platform': platform.platform(),
+        'cpu_count': os.cpu_count(),
+        'rounds': rounds,
+        'results': results,
+    }
+
+
+####################
+# RESULTS
+####################
+
+def save(report, path):
+    with open(path, 'w') as file:
+        json.dump(report, file, indent=2)
+        file.write('\n')
+
+
+def load(path):
+    with open(path) as file:
+        report = json.load(file)
+    if report.get('format_version') != FORMAT_VERSION:
+        raise ValueError(f'{path}: unsupported benchmark format {report.get("format_version")!r}')
+    return report
+
+
+def compare(old, new, threshold=DEFAULT_THRESHOLD):
+    # A benchmark regressed when its ops/sec dropped by more than the threshold and by more than
+    # the two runs' combined noise; returns (rows, regressions)
+    rows = []
+    regressions = []
+
+    for key in sorted(set(old['results']) & set(new['results'])):
+        before = old['results'][key]
+        after = new['results'][key]
+        change = after['ops_per_sec'] / before['ops_per_sec'] - 1
+        noise = before['relative_stdev'] + after['relative_stdev']
+
+        if change < -threshold and -change > noise:
+            status = 'REGRESSION'
+            regressions.append(key)
+        elif change > threshold and change > noise:
+            status = 'faster'
+        else:
+            status = ''
+
+        rows.append((key, before['ops_per_sec'], after['ops_per_sec'], change, status))
+
+    return rows, regressions
+
+
+def format_result(key, result):
+    return f'{key:<32} {result["ops_per_sec"]:>12.2f} ops/s  +/- {result["relative_stdev"]:.1%}'
+
+
+def format_comparison(rows):
+    lines = [f'{"benchmark":<32} {"before":>12} {"after":>12} {"change":>8}']
+    for key, before, after, change, status in rows:
+        lines.append(f'{key:<32} {before:>12.2f} {after:>12.2f} {change:>+8.1%}  {status}'.rstrip())
+    return '\n'.join(lines)
@@ -0,0 +1,157 @@
+##########
+# IMPORTS
+##########
+
+import flat_ast
+import hashlib
+import lexer
+import marshal
+import os
+import parse
+import zlib
+
+
+##########
+# CONSTANTS
+##########
+
+FORMAT_VERSION = 1
+MAGIC = b'IMPP'
+CACHE_DIR = os.path.join(os.environ.get('IMP_CACHE_DIR', os.path.join(os.path.expanduser('~'), '.cache', 'imp')), 'parsed')
+
+# Least recently used entries are removed once the directory grows past this
+MAX_CACHE_BYTES = 64 * 1024 * 1024
+
+COLUMNS = ('kinds', 'ops', 'first', 'second', 'third', 'fourth', 'starts', 'ends', 'token_starts', 'token_ends')
+CHILD_COLUMNS = ('first', 'second', 'third', 'fourth')
+
+
+####################
+# ENCODING
+####################
+
+def encode(tree):
+    columns = tuple((getattr(tree, name).typecode, getattr(tree, name).tobytes()) for name in COLUMNS)
+    payload = zlib.compress(marshal.dumps((FORMAT_VERSION, len(tree.source.text), tree.root, tree.values, columns,
+                                           (tree.cases.typecode, tree.cases.tobytes()))), 1)
+    return MAGIC + hashlib.sha256(payload).digest() + payload
+
+
+def decode(data, source):
+    # Anything unexpected makes the entry a miss rather than an error
+    header = len(MAGIC) + hashlib.sha256().digest_size
+    if data[:len(MAGIC)] != MAGIC: return None
+
+    payload = data[header:]
+    if hashlib.sha256(payload).digest() != data[len(MAGIC):header]: return None
+
+    try:
+        version, text_length, root, values, columns, cases = marshal.loads(zlib.decompress(payload))
+    except (EOFError, ValueError, TypeError, zlib.error):
+        return None
+
+    if version != FORMAT_VERSION or text_length != len(source.text): return None
+    if len(columns) != len(COLUMNS): return None
+
+    tree = flat_ast.FlatTree(source)
+    try:
+        for name, (typecode, raw) in zip(COLUMNS, columns):
+            column = getattr(tree, name)
+            if typecode != column.typecode: return None
+            column.frombytes(raw)
+
+        typecode, raw = cases
+        if typecode != tree.cases.typecode: return None
+        tree.cases.frombytes(raw)
+    except (TypeError, ValueError):
+        return None
+
+    tree.values = values
+    tree.root = root
+    size = len(tree.kinds)
+
+    if not isinstance(values, list) or any(len(getattr(tree, name)) != size for name in COLUMNS) or len(values) != size:
+        return None
+    if not 0 <= root < size or (size and max(tree.kinds) > flat_ast.WHILE):
+        return None
+    if any(column and (min(column) < flat_ast.NO_NODE or max(column) >= size)
+           for column in [getattr(tree, name) for name in CHILD_COLUMNS] + [tree.cases]):
+        return None
+
+    return tree
+
+
+####################
+# CACHE
+####################
+
+def cache_path(text):
+    key = hashlib.sha256(f'{FORMAT_VERSION}\0{text}'.encode()).hexdigest()
+    return os.path.join(CACHE_DIR, f'{key}.impp')
+
+
+def load(file_name, text, parser=parse.Parser):
+    source = lexer.Source(file_name, text)
+    path = cache_path(text)
+
+    try:
+        with open(path, 'rb') as file:
+            tree = decode(file.read(), source)
+    except OSError:
+        tree = None
+
+    if tree is not None:
+        # The modification time is the recency eviction goes by
+        try:
+            os.utime(path)
+        except OSError:
+            pass
+        return tree, None
+
+    # Generate tokens
+    lex = lexer.Lexer(file_name, text)
+    tokens, error = lex.create_tokens()
+    if error: return None, error
+
+    # Generate AST
+    ast = flat_ast.parse_tokens(tokens, parser)
+    if ast.error: return None, ast.error
+
+    store(path, ast.node)
+    return ast.node, None
+
+
+def store(path, tree):
+    try:
+        os.makedirs(CACHE_DIR, exist_ok=True)
+        temp_path = f'{path}.{os.getpid()}.tmp'
+        with open(temp_path, 'wb') as file:
+            file.write(encode(tree))
+        os.replace(temp_path, path)
+        evict()
+    except OSError:
+        pass
+
+
+def evict(max_bytes=None):
+    if max_bytes is None: max_bytes = MAX_CACHE_BYTES
+
+    entries = []
+    total = 0
+    for entry in os.scandir(CACHE_DIR):
+        if not entry.name.endswith('.impp'): continue
+        try:
+            stat = entry.stat()
+        except OSError:
+            continue
+        entries.append((stat.st_mtime, stat.st_size, entry.path))
+        total += stat.st_size
+
+    entries.sort()
+    for mtime, size, path in entries:
+        if total <= max_bytes: break
+        try:
+            os.remove(path)
+            total -= size
+        except OSError:
+            pass
@@ -0,0 +1,280 @@
+##########
+# IMPORTS
+##########
+
+import error
+import interpreter
+import lexer
+import parse
+
+
+####################
+# FRAME
+####################
+
+class Frame(dict):
+    def __init__(self, context):
+        super().__init__()
+        self.context = context
+        self.span = None
+
+    def __missing__(self, name):
+        number = self.context.symbol_table.get(name)
+        if not number: raise KeyError(name)
+        value = self[name] = number.value
+        return value
+
+    def store(self, name, value):
+        if value is None:
+            self.context.symbol_table.set(name, None)
+            self.pop(name, None)
+        else:
+            self[name] = value
+
+    def fail(self, pos_start, pos_end, info):
+        raise error.RuntimeError(pos_start, pos_end, info, self.context)
+
+
+####################
+# COMPILED PROGRAM
+####################
+
+class CompiledProgram:
+    def __init__(self, function, stored_names):
+        self.function = function
+        self.stored_names = stored_names
+
+    def run(self, context):
+        frame = Frame(context)
+
+        try:
+            value = self.function(frame)
+        except error.RuntimeError as err:
+            return None, err
+        finally:
+            for name in self.stored_names:
+                if name in frame:
+                    context.symbol_table.set(name, interpreter.make_number(frame[name]))
+
+        if value is None: return None, None
+        return interpreter.make_number(value), None
+
+
+####################
+# CLOSURE COMPILER
+####################
+
+BINARY_FUNCTIONS = {
+    lexer.TT_PLUS: lambda left, right: lambda frame: left(frame) + right(frame),
+    lexer.TT_MINUS: lambda left, right: lambda frame: left(frame) - right(frame),
+    lexer.TT_MUL: lambda left, right: lambda frame: left(frame) * right(frame),
+    lexer.TT_POW: lambda left, right: lambda frame: left(frame) ** right(frame),
+    lexer.TT_EEQ: lambda left, right: lambda frame: int(left(frame) == right(frame)),
+    lexer.TT_NEQ: lambda left, right: lambda frame: int(left(frame) != right(frame)),
+    lexer.TT_LESS: lambda left, right: lambda frame: int(left(frame) < right(frame)),
+    lexer.TT_GREATER: lambda left, right: lambda frame: int(left(frame) > right(frame)),
+    lexer.TT_LESS_OR_EQ: lambda left, right: lambda frame: int(left(frame) <= right(frame)),
+    lexer.TT_GREATER_OR_EQ: lambda left, right: lambda frame: int(left(frame) >= right(frame)),
+    'AND': lambda left, right: logical_and(left, right),
+    'OR': lambda left, right: logical_or(left, right),
+}
+
+
+# Both operands are always evaluated, as in Number.and_by/or_by
+def logical_and(left, right):
+    def and_expr(frame):
+        left_value = left(frame)
+        right_value = right(frame)
+        return int(left_value and right_value)
+
+    return and_expr
+
+
+def logical_or(left, right):
+    def or_expr(frame):
+        left_value = left(frame)
+        right_value = right(frame)
+        return int(left_value or right_value)
+
+    return or_expr
+
+
+class ClosureCompiler:
+    def compile(self, node):
+        self.stored_names = []
+        function = self.visit(node)
+        return CompiledProgram(function, self.stored_names)
+
+    def visit(self, node):
+        method_name = f'visit_{type(node).__name__}'
+        method = getattr(self, method_name, self.no_visit_method)
+        return method(node)
+
+    def no_visit_method(self, node):
+        raise Exception(f'No visit_{type(node).__name__} method defined')
+
+    def store_name(self, name):
+        if name not in self.stored_names:
+            self.stored_names.append(name)
+        return name
+
+    def visit_NumberNode(self, node):
+        value = node.token.value
+        return lambda frame: value
+
+    def visit_VarAccessNode(self, node):
+        name = node.var_name_token.value
+        pos_start, pos_end = node.pos_start, node.pos_end
+
+        def var_access(frame):
+            try:
+                return frame[name]
+            except KeyError:
+                frame.fail(pos_start, pos_end, f"'{name}' is not defined")
+
+        return var_access
+
+    def visit_VarAssignNode(self, node, track_span=False):
+        name = self.store_name(node.var_name_token.value)
+        value_function = self.visit_tracked(node.value_node) if track_span else self.visit(node.value_node)
+
+        def var_assign(frame):
+            value = value_function(frame)
+            frame.store(name, value)
+            return value
+
+        return var_assign
+
+    def visit_BinaryOperationNode(self, node):
+        token = node.operation_token
+        left = self.visit(node.left_node)
+
+        if token.type == lexer.TT_DIV:
+            return self.division(left, node.right_node)
+
+        right = self.visit(node.right_node)
+        return BINARY_FUNCTIONS[token.value if token.type == lexer.TT_KEYWORD else token.type](left, right)
+
+    def division(self, left, right_node):
+        origin = parse.value_origin(right_node)
+
+        if origin is None:
+            right = self.visit_tracked(right_node)
+
+            def div(frame):
+                left_value = left(frame)
+                right_value = right(frame)
+                if right_value == 0: frame.fail(*frame.span, 'Division by zero')
+                return left_value / right_value
+        else:
+            right = self.visit(right_node)
+            pos_start, pos_end = origin.pos_start, origin.pos_end
+
+            def div(frame):
+                left_value = left(frame)
+                right_value = right(frame)
+                if right_value == 0: frame.fail(pos_start, pos_end, 'Division by zero')
+                return left_value / right_value
+
+        return div
+
+    def visit_UnaryOperationNode(self, node):
+        operand = self.visit(node.node)
+
+        if node.operation_token.type == lexer.TT_MINUS:
+            return lambda frame: -operand(frame)
+        elif node.operation_token.matches(lexer.TT_KEYWORD, 'NOT'):
+            return lambda frame: 1 if operand(frame) == 0 else 0
+
+        return operand
+
+    def visit_IfNode(self, node, track_span=False):
+        visit = self.visit_tracked if track_span else self.visit
+        cases = tuple((self.visit(condition), visit(expr)) for condition, expr in node.cases)
+        else_case = visit(node.else_case) if node.else_case else None
+
+        def if_expr(frame):
+            for condition, expr in cases:
+                if condition(frame) != 0:
+                    return expr(frame)
+            if else_case:
+                return else_case(frame)
+            return None
+
+        return if_expr
+
+    def visit_ForNode(self, node):
+        name = self.store_name(node.var_name_token.value)
+        start = self.visit(node.start_value_node)
+        end = self.visit(node.end_value_node)
+        step = self.visit(node.step_value_node) if node.step_value_node else (lambda frame: 1)
+        body = self.visit(node.body_node)
+        invariants = tuple(node.invariants)
+
+        def for_expr(frame):
+            i = start(frame)
+            end_value = end(frame)
+            step_value = step(frame)
+
+            for invariant in invariants:
+                frame.pop(invariant, None)
+
+            if step_value >= 0:
+                while i < end_value:
+                    frame[name] = i
+                    i += step_value
+                    body(frame)
+            else:
+                while i > end_value:
+                    frame[name] = i
+                    i += step_value
+                    body(frame)
+
+            return None
+
+        return for_expr
+
+    def visit_WhileNode(self, node):
+        condition = self.visit(node.condition_node)
+        body = self.visit(node.body_node)
+        invariants = tuple(node.invariants)
+
+        def while_expr(frame):
+            for invariant in invariants:
+                frame.pop(invariant, None)
+
+            while condition(frame) != 0:
+                body(frame)
+            return None
+
+        return while_expr
+
+    def visit_InvariantNode(self, node):
+        # The cached value is kept in the frame under the node itself, which no variable name can clash with
+        function = self.visit(node.value_node)
+
+        def invariant(frame):
+            value = frame.get(node)
+            if value is None:
+                value = frame[node] = function(frame)
+            return value
+
+        return invariant
+
+    def visit_tracked(self, node):
+        if isinstance(node, parse.IfNode):
+            return self.visit_IfNode(node, track_span=True)
+        elif isinstance(node, parse.VarAssignNode):
+            return self.visit_VarAssignNode(node, track_span=True)
+
+        function = self.visit(node)
+        origin = parse.value_origin(node)
+        if origin is None: return function
+        span = (origin.pos_start, origin.pos_end)
+
+        def tracked(frame):
+            value = function(frame)
+            frame.span = span
+            return value
+
+        return tracked
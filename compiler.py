@@ -0,0 +1,258 @@
+##########
+# IMPORTS
+##########
+
+import lexer
+import parse
+
+
+####################
+# OPCODES
+####################
+
+OP_LOAD_CONST = 0
+OP_LOAD_NAME = 1
+OP_STORE_NAME = 2
+OP_POP_TOP = 3
+OP_LOAD_NONE = 4
+OP_ADD = 5
+OP_SUB = 6
+OP_MUL = 7
+OP_DIV = 8
+OP_POW = 9
+OP_EQ = 10
+OP_NEQ = 11
+OP_LESS = 12
+OP_GREATER = 13
+OP_LESS_OR_EQ = 14
+OP_GREATER_OR_EQ = 15
+OP_AND = 16
+OP_OR = 17
+OP_NEG = 18
+OP_NOT = 19
+OP_JUMP = 20
+OP_POP_JUMP_IF_FALSE = 21
+OP_FOR_ITER = 22
+OP_SET_SPAN = 23
+OP_RETURN = 24
+OP_LOAD_INVARIANT = 25
+OP_STORE_INVARIANT = 26
+OP_RESET_INVARIANTS = 27
+
+OPCODE_NAMES = {value: name[3:] for name, value in globals().items() if name.startswith('OP_')}
+
+BINARY_OPCODES = {
+    lexer.TT_PLUS: OP_ADD,
+    lexer.TT_MINUS: OP_SUB,
+    lexer.TT_MUL: OP_MUL,
+    lexer.TT_DIV: OP_DIV,
+    lexer.TT_POW: OP_POW,
+    lexer.TT_EEQ: OP_EQ,
+    lexer.TT_NEQ: OP_NEQ,
+    lexer.TT_LESS: OP_LESS,
+    lexer.TT_GREATER: OP_GREATER,
+    lexer.TT_LESS_OR_EQ: OP_LESS_OR_EQ,
+    lexer.TT_GREATER_OR_EQ: OP_GREATER_OR_EQ,
+    'AND': OP_AND,
+    'OR': OP_OR,
+}
+
+
+####################
+# CHUNK
+####################
+
+class Chunk:
+    def __init__(self):
+        self.code = []
+        self.names = []
+        self.name_slots = {}
+        self.stored_slots = []
+        self.invariant_slots = {}
+        self.spans = {}
+
+    def emit(self, op, arg=None, node=None):
+        pc = len(self.code)
+        self.code.append(op)
+        self.code.append(arg)
+
+        if node:
+            self.spans[pc] = (node.pos_start, node.pos_end)
+
+        return pc
+
+    def patch(self, pc, arg):
+        self.code[pc + 1] = arg
+
+    def here(self):
+        return len(self.code)
+
+    def name_slot(self, name, stored=False):
+        slot = self.name_slots.get(name)
+
+        if slot is None:
+            slot = self.name_slots[name] = len(self.names)
+            self.names.append(name)
+
+        if stored and slot not in self.stored_slots:
+            self.stored_slots.append(slot)
+
+        return slot
+
+    def invariant_slot(self, node):
+        return self.invariant_slots.setdefault(node, len(self.invariant_slots))
+
+    def disassemble(self):
+        lines = []
+
+        for pc in range(0, len(self.code), 2):
+            op, arg = self.code[pc], self.code[pc + 1]
+            line = f'{pc:>6} {OPCODE_NAMES[op]:<18}'
+
+            if op in (OP_LOAD_NAME, OP_STORE_NAME):
+                line += f'{arg} ({self.names[arg]})'
+            elif op == OP_FOR_ITER:
+                line += f'{arg[0]} ({self.names[arg[0]]}), to {arg[1]}'
+            elif op == OP_LOAD_INVARIANT:
+                line += f'{arg[0]}, to {arg[1]}'
+            elif arg is not None:
+                line += f'{arg}'
+
+            lines.append(line.rstrip())
+
+        return '\n'.join(lines)
+
+
+####################
+# COMPILER
+####################
+
+class Compiler:
+    def compile(self, node):
+        self.chunk = Chunk()
+        self.visit(node)
+        self.chunk.emit(OP_RETURN)
+        return self.chunk
+
+    def visit(self, node):
+        method_name = f'visit_{type(node).__name__}'
+        method = getattr(self, method_name, self.no_visit_method)
+        return method(node)
+
+    def no_visit_method(self, node):
+        raise Exception(f'No visit_{type(node).__name__} method defined')
+
+    def visit_NumberNode(self, node):
+        self.chunk.emit(OP_LOAD_CONST, node.token.value)
+
+    def visit_VarAccessNode(self, node):
+        self.chunk.emit(OP_LOAD_NAME, self.chunk.name_slot(node.var_name_token.value), node)
+
+    def visit_VarAssignNode(self, node, track_span=False):
+        if track_span: self.visit_tracked(node.value_node)
+        else: self.visit(node.value_node)
+
+        self.chunk.emit(OP_STORE_NAME, self.chunk.name_slot(node.var_name_token.value, stored=True))
+
+    def visit_BinaryOperationNode(self, node):
+        token = node.operation_token
+        op = BINARY_OPCODES[token.value if token.type == lexer.TT_KEYWORD else token.type]
+
+        self.visit(node.left_node)
+
+        # Division by zero is reported on the span of the value the divisor came from
+        if op == OP_DIV:
+            origin = parse.value_origin(node.right_node)
+
+            if origin is None:
+                self.visit_tracked(node.right_node)
+                self.chunk.emit(OP_DIV)
+            else:
+                self.visit(node.right_node)
+                self.chunk.emit(OP_DIV, node=origin)
+            return
+
+        self.visit(node.right_node)
+        self.chunk.emit(op)
+
+    def visit_UnaryOperationNode(self, node):
+        self.visit(node.node)
+
+        if node.operation_token.type == lexer.TT_MINUS:
+            self.chunk.emit(OP_NEG)
+        elif node.operation_token.matches(lexer.TT_KEYWORD, 'NOT'):
+            self.chunk.emit(OP_NOT)
+
+    def visit_IfNode(self, node, track_span=False):
+        end_jumps = []
+
+        for condition, expr in node.cases:
+            self.visit(condition)
+            next_case = self.chunk.emit(OP_POP_JUMP_IF_FALSE)
+
+            if track_span: self.visit_tracked(expr)
+            else: self.visit(expr)
+
+            end_jumps.append(self.chunk.emit(OP_JUMP))
+            self.chunk.patch(next_case, self.chunk.here())
+
+        if node.else_case:
+            if track_span: self.visit_tracked(node.else_case)
+            else: self.visit(node.else_case)
+        else:
+            self.chunk.emit(OP_LOAD_NONE)
+
+        for jump in end_jumps:
+            self.chunk.patch(jump, self.chunk.here())
+
+    def visit_ForNode(self, node):
+        self.visit(node.start_value_node)
+        self.visit(node.end_value_node)
+
+        if node.step_value_node:
+            self.visit(node.step_value_node)
+        else:
+            self.chunk.emit(OP_LOAD_CONST, 1)
+
+        self.reset_invariants(node)
+        slot = self.chunk.name_slot(node.var_name_token.value, stored=True)
+        loop_start = self.chunk.emit(OP_FOR_ITER)
+        self.visit(node.body_node)
+        self.chunk.emit(OP_POP_TOP)
+        self.chunk.emit(OP_JUMP, loop_start)
+        self.chunk.patch(loop_start, (slot, self.chunk.here()))
+        self.chunk.emit(OP_LOAD_NONE)
+
+    def visit_WhileNode(self, node):
+        self.reset_invariants(node)
+        loop_start = self.chunk.here()
+        self.visit(node.condition_node)
+        loop_exit = self.chunk.emit(OP_POP_JUMP_IF_FALSE)
+        self.visit(node.body_node)
+        self.chunk.emit(OP_POP_TOP)
+        self.chunk.emit(OP_JUMP, loop_start)
+        self.chunk.patch(loop_exit, self.chunk.here())
+        self.chunk.emit(OP_LOAD_NONE)
+
+    def reset_invariants(self, node):
+        if node.invariants:
+            self.chunk.emit(OP_RESET_INVARIANTS, tuple(self.chunk.invariant_slot(invariant) for invariant in node.invariants))
+
+    def visit_InvariantNode(self, node):
+        # A cached value is pushed and the expression's code skipped; otherwise it runs and fills the cache
+        slot = self.chunk.invariant_slot(node)
+        load = self.chunk.emit(OP_LOAD_INVARIANT)
+        self.visit(node.value_node)
+        self.chunk.emit(OP_STORE_INVARIANT, slot)
+        self.chunk.patch(load, (slot, self.chunk.here()))
+
+    def visit_tracked(self, node):
+        if isinstance(node, parse.IfNode):
+            self.visit_IfNode(node, track_span=True)
+        elif isinstance(node, parse.VarAssignNode):
+            self.visit_VarAssignNode(node, track_span=True)
+        else:
+            self.visit(node)
+            if parse.value_origin(node) is not None:
+                self.chunk.emit(OP_SET_SPAN, node=parse.value_origin(node))
+
@@ -0,0 +1,254 @@
+##########
+# IMPORTS
+##########
+
+import asyncio
+import error
+import interpreter
+import lexer
+import optimizer
+import parse
+import resolver
+import time
+
+
+##########
+# CONSTANTS
+##########
+
+# Node visits between two yields to the event loop
+DEFAULT_QUANTUM = 1000
+
+
+####################
+# COOPERATIVE INTERPRETER
+####################
+
+# The same evaluation as Interpreter, with every visit a coroutine so that a running
+# program can hand the event loop back every `quantum` steps
+class CooperativeInterpreter(interpreter.Interpreter):
+    def __init__(self, quantum=DEFAULT_QUANTUM, max_steps=None, max_seconds=None, vectorize=True):
+        super().__init__(vectorize)
+        self.quantum = quantum
+        self.max_steps = max_steps
+        self.max_seconds = max_seconds
+
+        # Budgets count this program's own steps and running time, not time spent waiting for others
+        self.steps = 0
+        self.seconds = 0.0
+        self.resumed = None
+        self.next_pause = self.pause_after(0)
+
+    def pause_after(self, steps):
+        next_pause = steps + self.quantum
+        if self.max_steps is not None: next_pause = min(next_pause, self.max_steps + 1)
+        return next_pause
+
+    async def run(self, node, context):
+        scope = resolver.Resolver().resolve(node)
+        context.frame = scope.load(context.symbol_table)
+        self.resumed = time.perf_counter()
+
+        try:
+            return await self.visit(node, context), None
+        except error.RuntimeError as err:
+            return None, err
+        finally:
+            self.seconds += time.perf_counter() - self.resumed
+            scope.store(context.frame, context.symbol_table)
+
+    async def pause(self, node, context):
+        self.seconds += time.perf_counter() - self.resumed
+
+        if self.max_steps is not None and self.steps > self.max_steps:
+            raise error.RuntimeError(node.pos_start, node.pos_end, f'Step budget of {self.max_steps} exceeded', context)
+        if self.max_seconds is not None and self.seconds > self.max_seconds:
+            raise error.RuntimeError(node.pos_start, node.pos_end, f'Time budget of {self.max_seconds}s exceeded', context)
+
+        await asyncio.sleep(0)
+        self.resumed = time.perf_counter()
+        self.next_pause = self.pause_after(self.steps)
+
+    async def visit(self, node, context):
+        self.steps += 1
+        if self.steps >= self.next_pause:
+            await self.pause(node, context)
+
+        try:
+            method = self.dispatch[type(node)]
+        except KeyError:
+            return self.no_visit_method(node, context)
+        return await method(node, context)
+
+    async def visit_NumberNode(self, node, context):
+        return interpreter.make_number(node.token.value)
+
+    async def visit_VarAccessNode(self, node, context):
+        return interpreter.Interpreter.visit_VarAccessNode(self, node, context)
+
+    async def visit_VarAssignNode(self, node, context):
+        value = await self.visit(node.value_node, context)
+        self.store(node, value, context)
+        return value
+
+    async def visit_BinaryOperationNode(self, node, context):
+        try:
+            site = node.site
+        except AttributeError:
+            site = self.attach_site(node)
+
+        if site.divides:
+            return await self.divide(node, context)
+
+        left = await self.visit(node.left_node, context)
+        right = await self.visit(node.right_node, context)
+        left, right = left.value, right.value
+
+        if type(left) is site.left_type and type(right) is site.right_type:
+            site.hits += 1
+            return site.specialized(left, right)
+        return site.generic(left, right)
+
+    async def divide(self, node, context):
+        left = await self.visit(node.left_node, context)
+
+        origin = parse.value_origin(node.right_node)
+        if origin is None:
+            right, origin = await self.visit_tracked(node.right_node, context)
+        else:
+            right = await self.visit(node.right_node, context)
+
+        if right.value == 0:
+            raise error.RuntimeError(origin.pos_start, origin.pos_end, 'Division by zero', context)
+
+        return interpreter.make_number(left.value / right.value)
+
+    async def visit_tracked(self, node, context):
+        if isinstance(node, parse.IfNode):
+            for condition, expr in node.cases:
+                if (await self.visit(condition, context)).value != 0:
+                    return await self.visit_tracked(expr, context)
+
+            if node.else_case:
+                return await self.visit_tracked(node.else_case, context)
+
+            return None, None
+
+        if isinstance(node, parse.VarAssignNode):
+            value, origin = await self.visit_tracked(node.value_node, context)
+            self.store(node, value, context)
+            return value, origin
+
+        return await self.visit(node, context), parse.value_origin(node)
+
+    async def visit_UnaryOperationNode(self, node, context):
+        number = await self.visit(node.node, context)
+
+        if node.operation_token.type == lexer.TT_MINUS:
+            return interpreter.make_number(number.value * -1)
+        elif node.operation_token.matches(lexer.TT_KEYWORD, 'NOT'):
+            return interpreter.make_number(1 if number.value == 0 else 0)
+
+        return number
+
+    async def visit_IfNode(self, node, context):
+        for condition, expr in node.cases:
+            if (await self.visit(condition, context)).value != 0:
+                return await self.visit(expr, context)
+
+        if node.else_case:
+            return await self.visit(node.else_case, context)
+
+        return None
+
+    async def visit_ForNode(self, node, context):
+        start_value = await self.visit(node.start_value_node, context)
+        end_value = (await self.visit(node.end_value_node, context)).value
+
+        if node.step_value_node:
+            step_value = (await self.visit(node.step_value_node, context)).value
+        else:
+            step_value = 1
+
+        frame = context.frame
+        for invariant in node.invariants:
+            frame[invariant.slot] = None
+
+        slot = node.slot
+        body_node = node.body_node
+        i = start_value.value
+
+        if type(i) is int and type(end_value) is int and type(step_value) is int and step_value != 0:
+            values = range(i, end_value, step_value)
+            if self.reduce_loop(node, values, frame): return None
+
+            for i in values:
+                frame[slot] = interpreter.make_number(i)
+                await self.visit(body_node, context)
+            return None
+
+        if step_value >= 0:
+            while i < end_value:
+                frame[slot] = interpreter.make_number(i)
+                i += step_value
+                await self.visit(body_node, context)
+        else:
+            while i > end_value:
+                frame[slot] = interpreter.make_number(i)
+                i += step_value
+                await self.visit(body_node, context)
+
+        return None
+
+    async def visit_WhileNode(self, node, context):
+        for invariant in node.invariants:
+            context.frame[invariant.slot] = None
+
+        while (await self.visit(node.condition_node, context)).value != 0:
+            await self.visit(node.body_node, context)
+
+        return None
+
+    def reduce_loop(self, node, values, frame):
+        # A reduced loop runs without yielding or checking the budgets. So it isn't used under a time
+        # budget, and under a step budget only when its iterations, one step each, fit in what is left;
+        # otherwise the loop runs step by step and stops where the budget runs out
+        if self.max_seconds is not None: return False
+        if self.max_steps is not None and self.steps + len(values) > self.max_steps: return False
+
+        if not super().reduce_loop(node, values, frame): return False
+        self.steps += len(values)
+        return True
+
+    async def visit_InvariantNode(self, node, context):
+        value = context.frame[node.slot]
+        if value is None:
+            value = context.frame[node.slot] = await self.visit(node.value_node, context)
+        return value
+
+
+####################
+# RUN
+####################
+
+async def run(file_name, text, symbol_table=None, optimize=True, quantum=DEFAULT_QUANTUM, max_steps=None, max_seconds=None):
+    # Lexing and parsing take time proportional to the text, so only evaluation yields
+    lex = lexer.Lexer(file_name, text)
+    tokens, err = lex.create_tokens()
+    if err: return None, err
+
+    ast = parse.Parser(tokens).parse()
+    if ast.error: return None, ast.error
+
+    node = optimizer.optimize(ast.node) if optimize else ast.node
+
+    context = interpreter.Context('<program>')
+    context.symbol_table = symbol_table if symbol_table is not None else interpreter.SymbolTable()
+    return await CooperativeInterpreter(quantum, max_steps, max_seconds).run(node, context)
+
+
+async def run_many(programs, **options):
+    # Runs (file_name, text) pairs concurrently on the current loop and returns their
+    # (value, error) results in the same order. A program that raises something other than an imp
+    # error gets the exception in place of its pair, and the others still finish
+    return await asyncio.gather(*(run(file_name, text, **options) for file_name, text in programs), return_exceptions=True)
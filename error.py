@@ -8,8 +8,9 @@ from string_with_arrows import *
 # ERROR
 ####################
 
-class Error:
+class Error(Exception):
     def __init__(self, pos_start, pos_end, error_name, info):
+        super().__init__(f'{error_name}: {info}')
         self.pos_start = pos_start
         self.pos_end = pos_end
         self.error_name = error_name
@@ -29,10 +30,12 @@ class ExpectedCharError(Error):
 	def __init__(self, pos_start, pos_end, info):
 		super().__init__(pos_start, pos_end, 'Expected Character', info)
 
-class InvalidSynaxError(Error):
+class InvalidSyntaxError(Error):
     def __init__(self, pos_start, pos_end, info=''):
         super().__init__(pos_start, pos_end, 'Invalid Syntax', info)
 
+InvalidSynaxError = InvalidSyntaxError
+
 class RuntimeError(Error):
     def __init__(self, pos_start, pos_end, info, context):
         super().__init__(pos_start, pos_end, 'Runtime Error', info)
@@ -54,4 +57,4 @@ class RuntimeError(Error):
             pos = ctx.parent_entry_pos
             ctx = ctx.parent
 
-        return 'Traceback (most recent call last):\n' + result
\ No newline at end of file
+        return 'Traceback (most recent call last):\n' + result
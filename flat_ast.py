@@ -0,0 +1,481 @@
+##########
+# IMPORTS
+##########
+
+from array import array
+import error
+import interpreter
+import lexer
+import parse
+
+
+##########
+# CONSTANTS
+##########
+
+NUMBER = 0
+VAR_ACCESS = 1
+VAR_ASSIGN = 2
+BINARY = 3
+UNARY = 4
+IF = 5
+FOR = 6
+WHILE = 7
+
+NO_NODE = -1
+
+# Operators by token type, or by keyword for AND/OR/NOT
+OPERATORS = (
+    lexer.TT_PLUS, lexer.TT_MINUS, lexer.TT_MUL, lexer.TT_DIV, lexer.TT_POW, lexer.TT_EEQ, lexer.TT_NEQ,
+    lexer.TT_LESS, lexer.TT_GREATER, lexer.TT_LESS_OR_EQ, lexer.TT_GREATER_OR_EQ, 'AND', 'OR', 'NOT',
+)
+OPERATOR_CODES = {operator: code for code, operator in enumerate(OPERATORS)}
+KEYWORD_OPERATORS = ('AND', 'OR', 'NOT')
+DIV_CODE = OPERATOR_CODES[lexer.TT_DIV]
+MINUS_CODE = OPERATOR_CODES[lexer.TT_MINUS]
+NOT_CODE = OPERATOR_CODES['NOT']
+
+
+def operator_code(token):
+    return OPERATOR_CODES[token.value if token.type == lexer.TT_KEYWORD else token.type]
+
+
+def operator_token(code, pos_start, pos_end):
+    operator = OPERATORS[code]
+    if operator in KEYWORD_OPERATORS:
+        return lexer.Token(lexer.TT_KEYWORD, operator, pos_start, pos_end)
+    return lexer.Token(operator, None, pos_start, pos_end)
+
+
+####################
+# FLAT TREE
+####################
+
+# One row per node, stored column by column. What the child columns hold depends on the kind:
+#   VAR_ASSIGN  first = value
+#   BINARY      first = left, second = right
+#   UNARY       first = operand
+#   IF          first = offset into cases, second = case count, third = else case
+#   FOR         first = start, second = end, third = step, fourth = body
+#   WHILE       first = condition, second = body
+# values holds the literal of a NUMBER and the variable name of VAR_ACCESS, VAR_ASSIGN and FOR.
+# token_starts/token_ends span the node's own token (literal, name or operator).
+# Rows are added children first, so a child's index is always smaller than its parent's
+class FlatTree:
+    def __init__(self, source):
+        self.source = source
+        self.kinds = array('B')
+        self.ops = array('B')
+        self.values = []
+        self.first = array('i')
+        self.second = array('i')
+        self.third = array('i')
+        self.fourth = array('i')
+        self.starts = array('L')
+        self.ends = array('L')
+        self.token_starts = array('L')
+        self.token_ends = array('L')
+        self.cases = array('i')
+        self.root = NO_NODE
+
+    def __len__(self):
+        return len(self.kinds)
+
+    def add(self, kind, op, value, first, second, third, fourth, start, end, token_start, token_end):
+        self.kinds.append(kind)
+        self.ops.append(op)
+        self.values.append(value)
+        self.first.append(first)
+        self.second.append(second)
+        self.third.append(third)
+        self.fourth.append(fourth)
+        self.starts.append(start)
+        self.ends.append(end)
+        self.token_starts.append(token_start)
+        self.token_ends.append(token_end)
+        return len(self.kinds) - 1
+
+    def add_cases(self, cases):
+        offset = len(self.cases)
+        for condition, expr in cases:
+            self.cases.append(condition)
+            self.cases.append(expr)
+        return offset
+
+    def pos_start(self, index):
+        return self.source.position(self.starts[index])
+
+    def pos_end(self, index):
+        return self.source.position(self.ends[index])
+
+
+def value_origin(tree, index):
+    # parse.value_origin on rows
+    while tree.kinds[index] == VAR_ASSIGN:
+        index = tree.first[index]
+
+    if tree.kinds[index] in (IF, FOR, WHILE):
+        return NO_NODE
+
+    return index
+
+
+####################
+# FLAT BUILDER
+####################
+
+# Lets parse.Parser write rows straight into a FlatTree, so no node objects are created
+class FlatBuilder:
+    def __init__(self, source):
+        self.tree = FlatTree(source)
+
+    def number_node(self, token):
+        start, end = token.pos_start.index, token.pos_end.index
+        return self.tree.add(NUMBER, 0, token.value, NO_NODE, NO_NODE, NO_NODE, NO_NODE, start, end, start, end)
+
+    def var_access_node(self, var_name_token):
+        start, end = var_name_token.pos_start.index, var_name_token.pos_end.index
+        return self.tree.add(VAR_ACCESS, 0, var_name_token.value, NO_NODE, NO_NODE, NO_NODE, NO_NODE, start, end, start, end)
+
+    def var_assign_node(self, var_name_token, value_node):
+        tree = self.tree
+        start = var_name_token.pos_start.index
+        return tree.add(VAR_ASSIGN, 0, var_name_token.value, value_node, NO_NODE, NO_NODE, NO_NODE,
+                        start, tree.ends[value_node], start, var_name_token.pos_end.index)
+
+    def binary_operation_node(self, left_node, operation_token, right_node):
+        tree = self.tree
+        return tree.add(BINARY, operator_code(operation_token), None, left_node, right_node, NO_NODE, NO_NODE,
+                        tree.starts[left_node], tree.ends[right_node],
+                        operation_token.pos_start.index, operation_token.pos_end.index)
+
+    def unary_operation_node(self, operation_token, node):
+        tree = self.tree
+        start = operation_token.pos_start.index
+        return tree.add(UNARY, operator_code(operation_token), None, node, NO_NODE, NO_NODE, NO_NODE,
+                        start, tree.ends[node], start, operation_token.pos_end.index)
+
+    def if_node(self, cases, else_case):
+        tree = self.tree
+        # Same span as IfNode: the end of the else case, or of the last condition
+        end = tree.ends[else_case] if else_case is not None else tree.ends[cases[-1][0]]
+        start = tree.starts[cases[0][0]]
+        return tree.add(IF, 0, None, tree.add_cases(cases), len(cases), NO_NODE if else_case is None else else_case, NO_NODE,
+                        start, end, start, start)
+
+    def for_node(self, var_name_token, start_value_node, end_value_node, step_value_node, body_node):
+        tree = self.tree
+        start = var_name_token.pos_start.index
+        return tree.add(FOR, 0, var_name_token.value, start_value_node, end_value_node,
+                        NO_NODE if step_value_node is None else step_value_node, body_node,
+                        start, tree.ends[body_node], start, var_name_token.pos_end.index)
+
+    def while_node(self, condition_node, body_node):
+        tree = self.tree
+        start = tree.starts[condition_node]
+        return tree.add(WHILE, 0, None, condition_node, body_node, NO_NODE, NO_NODE, start, tree.ends[body_node], start, start)
+
+
+def parse_tokens(tokens, parser=parse.Parser):
+    builder = FlatBuilder(tokens.source)
+    result = parser(tokens, builder).parse()
+    if result.error: return result
+
+    builder.tree.root = result.node
+    return parse.ParseResult(builder.tree)
+
+
+####################
+# CONVERSION
+####################
+
+class NodeFlattener:
+    def flatten(self, node):
+        self.tree = FlatTree(node.pos_start.source)
+        self.tree.root = self.visit(node)
+        return self.tree
+
+    def visit(self, node):
+        method_name = f'visit_{type(node).__name__}'
+        method = getattr(self, method_name, self.no_visit_method)
+        return method(node)
+
+    def no_visit_method(self, node):
+        raise Exception(f'No visit_{type(node).__name__} method defined')
+
+    def add(self, node, kind, op, value, first, second, third, fourth, token):
+        # Spans are copied from the node rather than recomputed, since rewritten nodes may carry their own
+        token_start = token.pos_start.index if token else node.pos_start.index
+        token_end = token.pos_end.index if token else node.pos_start.index
+        return self.tree.add(kind, op, value, first, second, third, fourth,
+                             node.pos_start.index, node.pos_end.index, token_start, token_end)
+
+    def visit_NumberNode(self, node):
+        return self.add(node, NUMBER, 0, node.token.value, NO_NODE, NO_NODE, NO_NODE, NO_NODE, node.token)
+
+    def visit_VarAccessNode(self, node):
+        token = node.var_name_token
+        return self.add(node, VAR_ACCESS, 0, token.value, NO_NODE, NO_NODE, NO_NODE, NO_NODE, token)
+
+    def visit_VarAssignNode(self, node):
+        value_node = self.visit(node.value_node)
+        token = node.var_name_token
+        return self.add(node, VAR_ASSIGN, 0, token.value, value_node, NO_NODE, NO_NODE, NO_NODE, token)
+
+    def visit_BinaryOperationNode(self, node):
+        left_node = self.visit(node.left_node)
+        right_node = self.visit(node.right_node)
+        token = node.operation_token
+        return self.add(node, BINARY, operator_code(token), None, left_node, right_node, NO_NODE, NO_NODE, token)
+
+    def visit_UnaryOperationNode(self, node):
+        operand = self.visit(node.node)
+        token = node.operation_token
+        return self.add(node, UNARY, operator_code(token), None, operand, NO_NODE, NO_NODE, NO_NODE, token)
+
+    def visit_IfNode(self, node):
+        cases = [(self.visit(condition), self.visit(expr)) for condition, expr in node.cases]
+        else_case = self.visit(node.else_case) if node.else_case else NO_NODE
+        return self.add(node, IF, 0, None, self.tree.add_cases(cases), len(cases), else_case, NO_NODE, None)
+
+    def visit_ForNode(self, node):
+        start_value_node = self.visit(node.start_value_node)
+        end_value_node = self.visit(node.end_value_node)
+        step_value_node = self.visit(node.step_value_node) if node.step_value_node else NO_NODE
+        body_node = self.visit(node.body_node)
+        token = node.var_name_token
+        return self.add(node, FOR, 0, token.value, start_value_node, end_value_node, step_value_node, body_node, token)
+
+    def visit_WhileNode(self, node):
+        condition_node = self.visit(node.condition_node)
+        body_node = self.visit(node.body_node)
+        return self.add(node, WHILE, 0, None, condition_node, body_node, NO_NODE, NO_NODE, None)
+
+    def visit_InvariantNode(self, node):
+        # Flat trees have no frame slots to cache hoisted values in, so the value is computed where it is
+        # used; loops rebuilt from the rows get no invariants either
+        return self.visit(node.value_node)
+
+
+def from_nodes(node):
+    return NodeFlattener().flatten(node)
+
+
+class NodeRebuilder:
+    def __init__(self, tree):
+        self.tree = tree
+        # Nodes and tokens starting or ending at the same offset share one Position
+        self.positions = {}
+
+    def rebuild(self, index):
+        # Children always come before their parent, so one pass in row order sees every child built
+        nodes = []
+        for row in range(index + 1):
+            nodes.append(self.build(row, nodes))
+        return nodes[index]
+
+    def position(self, offset):
+        position = self.positions.get(offset)
+        if position is None:
+            position = self.positions[offset] = lexer.Position(self.tree.source, offset)
+        return position
+
+    def build(self, index, nodes):
+        tree = self.tree
+        kind = tree.kinds[index]
+        first, second, third = tree.first[index], tree.second[index], tree.third[index]
+        token_start = self.position(tree.token_starts[index])
+        token_end = self.position(tree.token_ends[index])
+
+        if kind == NUMBER:
+            value = tree.values[index]
+            token_type = lexer.TT_INT if isinstance(value, int) else lexer.TT_FLOAT
+            node = parse.NumberNode(lexer.Token(token_type, value, token_start, token_end))
+        elif kind == VAR_ACCESS:
+            node = parse.VarAccessNode(lexer.Token(lexer.TT_IDENTIFIER, tree.values[index], token_start, token_end))
+        elif kind == VAR_ASSIGN:
+            token = lexer.Token(lexer.TT_IDENTIFIER, tree.values[index], token_start, token_end)
+            node = parse.VarAssignNode(token, nodes[first])
+        elif kind == BINARY:
+            token = operator_token(tree.ops[index], token_start, token_end)
+            node = parse.BinaryOperationNode(nodes[first], token, nodes[second])
+        elif kind == UNARY:
+            node = parse.UnaryOperationNode(operator_token(tree.ops[index], token_start, token_end), nodes[first])
+        elif kind == IF:
+            cases = [(nodes[tree.cases[case]], nodes[tree.cases[case + 1]]) for case in range(first, first + 2 * second, 2)]
+            node = parse.IfNode(cases, nodes[third] if third != NO_NODE else None)
+        elif kind == FOR:
+            token = lexer.Token(lexer.TT_IDENTIFIER, tree.values[index], token_start, token_end)
+            node = parse.ForNode(token, nodes[first], nodes[second], nodes[third] if third != NO_NODE else None,
+                                 nodes[tree.fourth[index]])
+        else:
+            node = parse.WhileNode(nodes[first], nodes[second])
+
+        # Spans are restored as stored, not recomputed from the children
+        node.pos_start = self.position(tree.starts[index])
+        node.pos_end = self.position(tree.ends[index])
+        return node
+
+
+def to_nodes(tree, index=None):
+    return NodeRebuilder(tree).rebuild(tree.root if index is None else index)
+
+
+####################
+# FLAT INTERPRETER
+####################
+
+VALUE_OPERATIONS = [interpreter.VALUE_OPERATIONS.get(operator) for operator in OPERATORS]
+
+
+class FlatInterpreter:
+    def __init__(self):
+        # Indexed by node kind
+        self.dispatch = [
+            self.visit_number, self.visit_var_access, self.visit_var_assign, self.visit_binary,
+            self.visit_unary, self.visit_if, self.visit_for, self.visit_while,
+        ]
+
+    def run(self, tree, context):
+        self.tree = tree
+
+        try:
+            value = self.visit(tree.root, context)
+        except error.RuntimeError as err:
+            return None, err
+
+        if value is None: return None, None
+        return interpreter.make_number(value), None
+
+    def visit(self, index, context):
+        return self.dispatch[self.tree.kinds[index]](index, context)
+
+    def fail(self, index, info, context):
+        raise error.RuntimeError(self.tree.pos_start(index), self.tree.pos_end(index), info, context)
+
+    def visit_number(self, index, context):
+        return self.tree.values[index]
+
+    def visit_var_access(self, index, context):
+        name = self.tree.values[index]
+        number = context.symbol_table.get(name)
+
+        if not number:
+            self.fail(index, f"'{name}' is not defined", context)
+
+        return number.value
+
+    def visit_var_assign(self, index, context):
+        value = self.visit(self.tree.first[index], context)
+        self.store(self.tree.values[index], value, context)
+        return value
+
+    def store(self, name, value, context):
+        context.symbol_table.set(name, None if value is None else interpreter.make_number(value))
+
+    def visit_binary(self, index, context):
+        tree = self.tree
+        op = tree.ops[index]
+
+        if op == DIV_CODE:
+            return self.divide(index, context)
+
+        left = self.visit(tree.first[index], context)
+        right = self.visit(tree.second[index], context)
+        return VALUE_OPERATIONS[op](left, right)
+
+    def divide(self, index, context):
+        tree = self.tree
+        left = self.visit(tree.first[index], context)
+
+        # Division by zero is reported on the span of the value the divisor came from
+        right_node = tree.second[index]
+        origin = value_origin(tree, right_node)
+        if origin == NO_NODE:
+            right, origin = self.visit_tracked(right_node, context)
+        else:
+            right = self.visit(right_node, context)
+
+        if right == 0:
+            self.fail(origin, 'Division by zero', context)
+
+        return left / right
+
+    def visit_tracked(self, index, context):
+        # Evaluates the node at `index` and returns its value with the row whose span that value came from
+        tree = self.tree
+        kind = tree.kinds[index]
+
+        if kind == IF:
+            first, second, else_case = tree.first[index], tree.second[index], tree.third[index]
+            for case in range(first, first + 2 * second, 2):
+                if self.visit(tree.cases[case], context) != 0:
+                    return self.visit_tracked(tree.cases[case + 1], context)
+
+            if else_case != NO_NODE:
+                return self.visit_tracked(else_case, context)
+
+            return None, NO_NODE
+
+        if kind == VAR_ASSIGN:
+            value, origin = self.visit_tracked(tree.first[index], context)
+            self.store(tree.values[index], value, context)
+            return value, origin
+
+        return self.visit(index, context), value_origin(tree, index)
+
+    def visit_unary(self, index, context):
+        value = self.visit(self.tree.first[index], context)
+        op = self.tree.ops[index]
+
+        if op == MINUS_CODE:
+            return value * -1
+        elif op == NOT_CODE:
+            return 1 if value == 0 else 0
+
+        return value
+
+    def visit_if(self, index, context):
+        tree = self.tree
+        first, second, else_case = tree.first[index], tree.second[index], tree.third[index]
+
+        for case in range(first, first + 2 * second, 2):
+            if self.visit(tree.cases[case], context) != 0:
+                return self.visit(tree.cases[case + 1], context)
+
+        if else_case != NO_NODE:
+            return self.visit(else_case, context)
+
+        return None
+
+    def visit_for(self, index, context):
+        tree = self.tree
+        i = self.visit(tree.first[index], context)
+        end_value = self.visit(tree.second[index], context)
+        step_value = self.visit(tree.third[index], context) if tree.third[index] != NO_NODE else 1
+
+        symbols = context.symbol_table
+        var_name = tree.values[index]
+        body_node = tree.fourth[index]
+
+        if step_value >= 0:
+            while i < end_value:
+                symbols.set(var_name, interpreter.make_number(i))
+                i += step_value
+                self.visit(body_node, context)
+        else:
+            while i > end_value:
+                symbols.set(var_name, interpreter.make_number(i))
+                i += step_value
+                self.visit(body_node, context)
+
+        return None
+
+    def visit_while(self, index, context):
+        tree = self.tree
+        condition_node, body_node = tree.first[index], tree.second[index]
+
+        while self.visit(condition_node, context) != 0:
+            self.visit(body_node, context)
+
+        return None
@@ -0,0 +1,198 @@
+##########
+# IMPORTS
+##########
+
+from array import array
+import bisect
+import error
+import lexer
+import parse
+
+
+####################
+# SCANNING
+####################
+
+def scan(document, start):
+    # Yields the Tokens Lexer.create_tokens would produce from `start` on, without the EOF token;
+    # a lexing error is raised
+    source = document.source
+    text = source.text
+    text_end = document.text_end
+
+    for match in lexer.TOKEN_PATTERN.finditer(text, start):
+        kind = match.lastgroup
+        if kind == 'SKIP': continue
+
+        index = match.start()
+
+        if kind == 'NAME':
+            name = match.group()
+            token_type = lexer.TT_KEYWORD if name in lexer.KEYWORDS else lexer.TT_IDENTIFIER
+            yield lexer.Token(token_type, name, lexer.Position(source, index), text_end)
+        elif kind == 'INT':
+            yield lexer.Token(lexer.TT_INT, int(match.group()), lexer.Position(source, index), text_end)
+        elif kind == 'SINGLE':
+            yield lexer.Token(lexer.SINGLE_TOKENS[match.group()], None, lexer.Position(source, index), lexer.Position(source, index + 1))
+        elif kind == 'COMPARISON':
+            yield lexer.Token(lexer.COMPARISON_TOKENS[match.group()], None, lexer.Position(source, index), text_end)
+        elif kind == 'FLOAT':
+            yield lexer.Token(lexer.TT_FLOAT, float(match.group()), lexer.Position(source, index), text_end)
+        elif kind == 'BANG':
+            raise error.ExpectedCharError(source.position(index), source.position(index + 2), "'=' (after '!')")
+        else:
+            raise error.IllegalCharError(source.position(index), source.position(index + 1), "'" + match.group() + "'")
+
+
+def eof_token(source):
+    end = len(source.text)
+    return lexer.Token(lexer.TT_EOF, None, lexer.Position(source, end), lexer.Position(source, end + 1))
+
+
+####################
+# INCREMENTAL PARSER
+####################
+
+class IncrementalParser(parse.Parser):
+    # Remembers what each expr/binary_expr call starting at a token produced and how many tokens it
+    # read, counting the lookahead it stopped at; a later parse reuses the node while those tokens
+    # are unchanged
+    def __init__(self, tokens, memo, reach):
+        self.memo = memo
+        self.reach = reach
+        super().__init__(tokens)
+
+    def remembered(self, key, parse_rule):
+        start = self.token_index
+        entries = self.memo[start]
+
+        if entries is not None and key in entries:
+            node, length = entries[key]
+            self.token_index = start + length - 1
+            self.advance()
+            return node
+
+        node = parse_rule()
+        if entries is None: entries = self.memo[start] = {}
+        entries[key] = (node, self.token_index - start)
+
+        # The furthest token any call remembered at `start` read
+        if self.token_index > self.reach[start]: self.reach[start] = self.token_index
+        return node
+
+    def expr(self):
+        return self.remembered(0, super().expr)
+
+    def binary_expr(self, min_precedence):
+        return self.remembered(min_precedence, lambda: parse.Parser.binary_expr(self, min_precedence))
+
+
+####################
+# DOCUMENT
+####################
+
+class Document:
+    # Keeps a program's tokens and AST up to date across edits. Every Position shares the document's
+    # Source, so spans in earlier results follow the text as it changes
+    def __init__(self, file_name, text):
+        self.source = lexer.Source(file_name, text)
+
+        # Names, numbers and comparison operators all end at the end of the text, so they share one Position
+        self.text_end = lexer.Position(self.source, len(text))
+        self.tokens = None
+        self.memo = None
+        self.reach = None
+        self.node = None
+        self.errors = []
+        self.relex_all()
+
+    @property
+    def text(self):
+        return self.source.text
+
+    def relex_all(self):
+        try:
+            tokens = list(scan(self, 0))
+        except error.Error as err:
+            self.tokens = self.memo = None
+            return self.finish(None, [err])
+
+        tokens.append(eof_token(self.source))
+        self.tokens = tokens
+        self.memo = [None] * len(tokens)
+        self.reach = array('l', [-1]) * len(tokens)
+        return self.reparse()
+
+    def edit(self, start, end, replacement):
+        # Replaces text[start:end] and returns the new (node, errors)
+        old_text = self.source.text
+        if not 0 <= start <= end <= len(old_text): raise ValueError(f'Invalid edit range {start}..{end}')
+
+        text = old_text[:start] + replacement + old_text[end:]
+        delta = len(replacement) - (end - start)
+        self.source.text = text
+        self.source.line_starts = None
+        self.text_end.index = len(text)
+
+        if self.tokens is None: return self.relex_all()
+
+        tokens = self.tokens
+        old_count = len(tokens)
+        token_start = lambda token: token.pos_start.index
+
+        # The token before the edit is lexed again, since the edit may extend it
+        first = max(bisect.bisect_left(tokens, start, key=token_start) - 1, 0)
+        rescan_from = token_start(tokens[first]) if first < old_count - 1 else start
+
+        # Old tokens from `after` on start past the edit; lexing stops once a new token starts where one of them did
+        after = bisect.bisect_left(tokens, end, lo=first, hi=old_count - 1, key=token_start)
+        edit_end = start + len(replacement)
+        new_tokens = []
+        resume = old_count - 1
+
+        try:
+            for token in scan(self, min(rescan_from, start)):
+                index = token.pos_start.index
+                if index >= edit_end:
+                    while after < old_count - 1 and token_start(tokens[after]) < index - delta:
+                        after += 1
+                    if after < old_count - 1 and token_start(tokens[after]) == index - delta:
+                        resume = after
+                        break
+                new_tokens.append(token)
+        except error.Error as err:
+            self.tokens = self.memo = None
+            return self.finish(None, [err])
+
+        # Later tokens keep their objects and move by the length difference
+        for token in tokens[resume:]:
+            token.pos_start.index += delta
+            if token.pos_end is not self.text_end: token.pos_end.index += delta
+
+        # Remembered parses before the edit stay valid only if they stopped reading before it
+        memo = self.memo
+        reach = self.reach
+        for index in [index for index in range(first) if reach[index] >= first]:
+            entries = memo[index]
+            for key, (node, length) in list(entries.items()):
+                if index + length >= first: del entries[key]
+            reach[index] = max((index + length for node, length in entries.values()), default=-1)
+
+        # Reach is kept as an absolute token index, so it moves with the tokens after the edit
+        shift = len(new_tokens) - (resume - first)
+        moved = array('l', [index + shift if index >= 0 else -1 for index in reach[resume:]])
+
+        self.tokens = tokens[:first] + new_tokens + tokens[resume:]
+        self.memo = memo[:first] + [None] * len(new_tokens) + memo[resume:]
+        self.reach = reach[:first] + array('l', [-1]) * len(new_tokens) + moved
+        return self.reparse()
+
+    def reparse(self):
+        ast = IncrementalParser(self.tokens, self.memo, self.reach).parse()
+        if ast.error: return self.finish(None, [ast.error])
+        return self.finish(ast.node, [])
+
+    def finish(self, node, errors):
+        self.node = node
+        self.errors = errors
+        return node, errors
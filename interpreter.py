@@ -5,118 +5,95 @@
 from string_with_arrows import *
 import lexer
 import error
-
-####################
-# RUNTIME RESULT
-####################
-
-class RuntimeResult:
-    def __init__(self):
-        self.value = None
-        self.error = None
-
-    def register(self, result):
-        if result.error: self.error = result.error
-        return result.value
-    
-    def success(self, value):
-        self.value = value
-        return self
-    
-    def failure(self, error):
-        self.error = error
-        return self
-
+import operator
+import parse
+import resolver
+import vectorize
 
 ####################
 # VALUES
 ####################
 
+# Numbers are immutable and carry no source position: the node being evaluated
+# supplies the span when an error is raised
 class Number:
+    __slots__ = ('value',)
+
     def __init__(self, value):
         self.value = value
-        self.set_pos()
-        self.set_context()
-
-    def set_pos(self, pos_start=None, pos_end=None):
-        self.pos_start = pos_start
-        self.pos_end = pos_end
-        return self
-    
-    def set_context(self, context=None):
-        self.context = context
-        return self
-
 
     def added_to(self, other):
         if isinstance(other, Number):
-            return Number(self.value + other.value).set_context(self.context), None
+            return make_number(self.value + other.value)
         
     def sub_by(self, other):
         if isinstance(other, Number):
-            return Number(self.value - other.value).set_context(self.context), None
+            return make_number(self.value - other.value)
         
     def mul_by(self, other):
         if isinstance(other, Number):
-            return Number(self.value * other.value).set_context(self.context), None
+            return make_number(self.value * other.value)
         
     def div_by(self, other):
         if isinstance(other, Number):
-            if other.value == 0:
-                return None, error.RuntimeError(other.pos_start, other.pos_end, 'Division by zero', self.context)
-            else:
-                return Number(self.value / other.value).set_context(self.context), None
+            return make_number(self.value / other.value)
             
     def pow_by(self, other):
         if isinstance(other, Number):
-            return Number(self.value ** other.value).set_context(self.context), None
+            return make_number(self.value ** other.value)
         
     def get_comparison_eq(self, other):
         if isinstance(other, Number):
-            return Number(int(self.value == other.value)).set_context(self.context), None
+            return make_number(int(self.value == other.value))
 
     def get_comparison_neq(self, other):
         if isinstance(other, Number):
-            return Number(int(self.value != other.value)).set_context(self.context), None
+            return make_number(int(self.value != other.value))
 
     def get_comparison_less(self, other):
         if isinstance(other, Number):
-            return Number(int(self.value < other.value)).set_context(self.context), None
+            return make_number(int(self.value < other.value))
 
     def get_comparison_greater(self, other):
         if isinstance(other, Number):
-            return Number(int(self.value > other.value)).set_context(self.context), None
+            return make_number(int(self.value > other.value))
 
     def get_comparison_less_or_eq(self, other):
         if isinstance(other, Number):
-            return Number(int(self.value <= other.value)).set_context(self.context), None
+            return make_number(int(self.value <= other.value))
 
     def get_comparison_greater_or_eq(self, other):
         if isinstance(other, Number):
-            return Number(int(self.value >= other.value)).set_context(self.context), None
+            return make_number(int(self.value >= other.value))
 
     def and_by(self, other):
         if isinstance(other, Number):
-            return Number(int(self.value and other.value)).set_context(self.context), None
+            return make_number(int(self.value and other.value))
 
     def or_by(self, other):
         if isinstance(other, Number):
-            return Number(int(self.value or other.value)).set_context(self.context), None
+            return make_number(int(self.value or other.value))
 
     def not_by(self):
-        return Number(1 if self.value == 0 else 0).set_context(self.context), None
+        return make_number(1 if self.value == 0 else 0)
 
     def is_true(self):
         return self.value != 0
         
-    def copy(self):
-        copy = Number(self.value)
-        copy.set_pos(self.pos_start, self.pos_end)
-        copy.set_context(self.context)
-        return copy
-        
     def __repr__(self):
         return str(self.value)
+
+
+SMALL_INT_MIN = -256
+SMALL_INT_MAX = 1024
+SMALL_NUMBERS = [Number(value) for value in range(SMALL_INT_MIN, SMALL_INT_MAX + 1)]
+
+
+def make_number(value):
+    # Small integers, including every comparison result, share one instance each
+    if type(value) is int and SMALL_INT_MIN <= value <= SMALL_INT_MAX:
+        return SMALL_NUMBERS[value - SMALL_INT_MIN]
+    return Number(value)
         
 
 ####################
@@ -129,6 +106,7 @@ class Context:
         self.parent = parent
         self.parent_entry_pos = parent_entry_pos
         self.symbol_table = None
+        self.frame = None
 
 
 ####################
@@ -153,153 +131,408 @@ class SymbolTable:
 		del self.symbols[name]
 
 
+####################
+# INDUCTION VARIABLES
+####################
+
+def linear_terms(form, frame):
+    # (c, a, b) such that the form evaluates to c * s + a * i + b for the accumulator s and the loop
+    # variable i, or None when a name isn't bound to an int or a product is not linear
+    kind = form[0]
+
+    if kind == 'const':
+        return 0, 0, form[1]
+    if kind == 'target':
+        return 1, 0, 0
+    if kind == 'induction':
+        return 0, 1, 0
+    if kind == 'var':
+        number = frame[form[1]]
+        if number is None or type(number.value) is not int: return None
+        return 0, 0, number.value
+
+    if kind == 'neg':
+        terms = linear_terms(form[1], frame)
+        if terms is None: return None
+        return -terms[0], -terms[1], -terms[2]
+
+    left = linear_terms(form[1], frame)
+    right = linear_terms(form[2], frame)
+    if left is None or right is None: return None
+
+    if kind == 'add':
+        return left[0] + right[0], left[1] + right[1], left[2] + right[2]
+    if kind == 'sub':
+        return left[0] - right[0], left[1] - right[1], left[2] - right[2]
+
+    # A product stays linear when one side is a constant
+    if left[0] or left[1]:
+        if right[0] or right[1]: return None
+        left, right = right, left
+    factor = left[2]
+    return factor * right[0], factor * right[1], factor * right[2]
+
+
 ####################
 # INTERPRETER
 ####################
 
+VALUE_OPERATIONS = {
+    lexer.TT_PLUS: lambda left, right: left + right,
+    lexer.TT_MINUS: lambda left, right: left - right,
+    lexer.TT_MUL: lambda left, right: left * right,
+    lexer.TT_POW: lambda left, right: left ** right,
+    lexer.TT_EEQ: lambda left, right: int(left == right),
+    lexer.TT_NEQ: lambda left, right: int(left != right),
+    lexer.TT_LESS: lambda left, right: int(left < right),
+    lexer.TT_GREATER: lambda left, right: int(left > right),
+    lexer.TT_LESS_OR_EQ: lambda left, right: int(left <= right),
+    lexer.TT_GREATER_OR_EQ: lambda left, right: int(left >= right),
+    'AND': lambda left, right: int(left and right),
+    'OR': lambda left, right: int(left or right),
+}
+
+
+####################
+# QUICKENING
+####################
+
+# Runs in a row with one pair of operand types before a site specialises for them
+QUICKEN_AFTER = 8
+
+TRUE = SMALL_NUMBERS[1 - SMALL_INT_MIN]
+FALSE = SMALL_NUMBERS[0 - SMALL_INT_MIN]
+
+OPERATOR_SYMBOLS = {
+    lexer.TT_PLUS: '+', lexer.TT_MINUS: '-', lexer.TT_MUL: '*', lexer.TT_DIV: '/', lexer.TT_POW: '^',
+    lexer.TT_EEQ: '==', lexer.TT_NEQ: '!=', lexer.TT_LESS: '<', lexer.TT_GREATER: '>',
+    lexer.TT_LESS_OR_EQ: '<=', lexer.TT_GREATER_OR_EQ: '>=', 'AND': 'AND', 'OR': 'OR',
+}
+
+
+def int_result(operation):
+    # make_number for an operation known to give an int, without the type check
+    def specialized(left, right):
+        value = operation(left, right)
+        if SMALL_INT_MIN <= value <= SMALL_INT_MAX:
+            return SMALL_NUMBERS[value - SMALL_INT_MIN]
+        return Number(value)
+    return specialized
+
+
+def float_result(operation):
+    return lambda left, right: Number(operation(left, right))
+
+
+COMPARISONS = {
+    lexer.TT_EEQ: lambda left, right: TRUE if left == right else FALSE,
+    lexer.TT_NEQ: lambda left, right: TRUE if left != right else FALSE,
+    lexer.TT_LESS: lambda left, right: TRUE if left < right else FALSE,
+    lexer.TT_GREATER: lambda left, right: TRUE if left > right else FALSE,
+    lexer.TT_LESS_OR_EQ: lambda left, right: TRUE if left <= right else FALSE,
+    lexer.TT_GREATER_OR_EQ: lambda left, right: TRUE if left >= right else FALSE,
+}
+
+ARITHMETIC = {
+    lexer.TT_PLUS: operator.add,
+    lexer.TT_MINUS: operator.sub,
+    lexer.TT_MUL: operator.mul,
+}
+
+# (operator, left type, right type) -> specialised form returning the same Number the generic path would.
+# Powers are left out since their result type depends on the values; AND and OR gain nothing
+SPECIALIZATIONS = {}
+for left_type in (int, float):
+    for right_type in (int, float):
+        for key, comparison in COMPARISONS.items():
+            SPECIALIZATIONS[key, left_type, right_type] = comparison
+        for key, operation in ARITHMETIC.items():
+            both_int = left_type is int and right_type is int
+            SPECIALIZATIONS[key, left_type, right_type] = int_result(operation) if both_int else float_result(operation)
+
+
+class Site:
+    # Inline cache of one binary operation node. Once QUICKEN_AFTER runs in a row saw the same operand
+    # types it switches to the specialised form for them; the guard in visit_BinaryOperationNode sends
+    # other types back to `generic`, which specialises again if the new types stick
+    __slots__ = ('operator', 'operation', 'divides', 'left_type', 'right_type', 'specialized',
+                 'hits', 'misses', 'generic_runs', 'specializations', 'seen', 'streak')
+
+    def __init__(self, node):
+        # The node isn't kept, since a reference back to it would make every tree a cycle
+        token = node.operation_token
+        self.operator = token.value if token.type == lexer.TT_KEYWORD else token.type
+        self.operation = VALUE_OPERATIONS.get(self.operator)
+        self.divides = token.type == lexer.TT_DIV
+        self.left_type = self.right_type = self.specialized = None
+
+        # Guarded runs that took the specialised form, guarded runs that failed the guard,
+        # and runs before any specialisation
+        self.hits = 0
+        self.misses = 0
+        self.generic_runs = 0
+        self.specializations = 0
+
+        self.seen = None
+        self.streak = 0
+
+    def generic(self, left, right):
+        result = make_number(self.operation(left, right))
+
+        if self.specialized is None:
+            self.generic_runs += 1
+        else:
+            self.misses += 1
+
+        types = (type(left), type(right))
+        if types == self.seen:
+            self.streak += 1
+        else:
+            self.seen = types
+            self.streak = 1
+
+        if self.streak >= QUICKEN_AFTER:
+            self.streak = 0
+            specialized = SPECIALIZATIONS.get((self.operator,) + types)
+            if specialized is not None:
+                self.left_type, self.right_type = types
+                self.specialized = specialized
+                self.specializations += 1
+
+        return result
+
+    @property
+    def runs(self):
+        return self.hits + self.misses + self.generic_runs
+
+    def describe(self):
+        if self.specialized is None: return f'generic {OPERATOR_SYMBOLS[self.operator]}'
+        return f'{self.left_type.__name__} {OPERATOR_SYMBOLS[self.operator]} {self.right_type.__name__}'
+
+
 class Interpreter:
+    def __init__(self, vectorize=True):
+        # Reductions over long int ranges run as NumPy array operations when it is installed
+        self.vectorize = vectorize
+
+        # Binary operation node -> the inline cache this interpreter attached to it, kept only when a
+        # subclass reports on them; the Interpreter holds its dispatch methods in a cycle, so holding
+        # nodes here would keep each tree alive until the next collection
+        self.sites = None
+
+        # Node class -> bound visit method, resolved once instead of per visit
+        self.dispatch = {}
+        for name in dir(self):
+            if name.startswith('visit_') and hasattr(parse, name[len('visit_'):]):
+                self.dispatch[getattr(parse, name[len('visit_'):])] = getattr(self, name)
+
+    def run(self, node, context):
+        # Variables live in frame slots while the program runs and go back to the symbol table afterwards
+        scope = resolver.Resolver().resolve(node)
+        context.frame = scope.load(context.symbol_table)
+
+        try:
+            return self.visit(node, context), None
+        except error.RuntimeError as err:
+            return None, err
+        finally:
+            scope.store(context.frame, context.symbol_table)
+
     def visit(self, node, context):
-        method_name = f'visit_{type(node).__name__}'
-        method = getattr(self, method_name, self.no_visit_method)
+        try:
+            method = self.dispatch[type(node)]
+        except KeyError:
+            return self.no_visit_method(node, context)
         return method(node, context)
     
     def no_visit_method(self, node, context):
         raise Exception(f'No visit_{type(node).__name__} method defined')
     
     def visit_NumberNode(self, node, context):
-        return RuntimeResult().success(Number(node.token.value).set_context(context).set_pos(node.pos_start, node.pos_end))
+        return make_number(node.token.value)
 
     def visit_VarAccessNode(self, node, context):
-        result = RuntimeResult()
-        var_name = node.var_name_token.value
-        value = context.symbol_table.get(var_name)
+        value = context.frame[node.slot]
 
-        if not value:
-            return result.failure(error.RuntimeError(node.pos_start, node.pos_end, f"'{var_name}' is not defined", context))
+        if value is None:
+            raise error.RuntimeError(node.pos_start, node.pos_end, f"'{node.var_name_token.value}' is not defined", context)
 
-        value = value.copy().set_pos(node.pos_start, node.pos_end)
-        return result.success(value)
+        return value
     
     def visit_VarAssignNode(self, node, context):
-        result = RuntimeResult()
-        var_name = node.var_name_token.value
-        value = result.register(self.visit(node.value_node, context))
-        if result.error: return result
+        value = self.visit(node.value_node, context)
+        self.store(node, value, context)
+        return value
 
-        context.symbol_table.set(var_name, value)
-        return result.success(value)
+    def store(self, node, value, context):
+        context.frame[node.slot] = value
+        if value is None:
+            context.symbol_table.set(node.var_name_token.value, None)
 
     def visit_BinaryOperationNode(self, node, context):
-        res = RuntimeResult()
-        left = res.register(self.visit(node.left_node, context))
-        if res.error: return res
-        right = res.register(self.visit(node.right_node, context))
-        if res.error: return res
-
-        if node.operation_token.type == lexer.TT_PLUS:
-            result, error = left.added_to(right)
-        elif node.operation_token.type == lexer.TT_MINUS:
-            result, error = left.sub_by(right)
-        elif node.operation_token.type == lexer.TT_MUL:
-            result, error = left.mul_by(right)
-        elif node.operation_token.type == lexer.TT_DIV:
-            result, error = left.div_by(right)
-        elif node.operation_token.type == lexer.TT_POW:
-            result, error = left.pow_by(right)
-        elif node.operation_token.type == lexer.TT_EEQ:
-            result, error = left.get_comparison_eq(right)
-        elif node.operation_token.type == lexer.TT_NEQ:
-            result, error = left.get_comparison_neq(right)
-        elif node.operation_token.type == lexer.TT_LESS:
-            result, error = left.get_comparison_less(right)
-        elif node.operation_token.type == lexer.TT_GREATER:
-            result, error = left.get_comparison_greater(right)
-        elif node.operation_token.type == lexer.TT_LESS_OR_EQ:
-            result, error = left.get_comparison_less_or_eq(right)
-        elif node.operation_token.type == lexer.TT_GREATER_OR_EQ:
-            result, error = left.get_comparison_greater_or_eq(right)
-        elif node.operation_token.matches(lexer.TT_KEYWORD, 'AND'):
-            result, error = left.and_by(right)
-        elif node.operation_token.matches(lexer.TT_KEYWORD, 'OR'):
-            result, error = left.or_by(right)
-
-
-        if error:
-            return res.failure(error)
+        try:
+            site = node.site
+        except AttributeError:
+            site = self.attach_site(node)
+
+        if site.divides:
+            return self.divide(node, context)
+
+        left = self.visit(node.left_node, context)
+        right = self.visit(node.right_node, context)
+        left, right = left.value, right.value
+
+        if type(left) is site.left_type and type(right) is site.right_type:
+            site.hits += 1
+            return site.specialized(left, right)
+        return site.generic(left, right)
+
+    def attach_site(self, node):
+        # The site stays on the node, so a tree that runs again keeps its specialisations
+        site = node.site = Site(node)
+        if self.sites is not None: self.sites[node] = site
+        return site
+
+    def divide(self, node, context):
+        left = self.visit(node.left_node, context)
+
+        # Division by zero is reported on the span of the value the divisor came from
+        origin = parse.value_origin(node.right_node)
+        if origin is None:
+            right, origin = self.visit_tracked(node.right_node, context)
         else:
-            return res.success(result.set_pos(node.pos_start, node.pos_end))
+            right = self.visit(node.right_node, context)
+
+        if right.value == 0:
+            raise error.RuntimeError(origin.pos_start, origin.pos_end, 'Division by zero', context)
+
+        return make_number(left.value / right.value)
+
+    def visit_tracked(self, node, context):
+        # Evaluates `node` and returns its value with the node whose span that value came from
+        if isinstance(node, parse.IfNode):
+            for condition, expr in node.cases:
+                if self.visit(condition, context).value != 0:
+                    return self.visit_tracked(expr, context)
+
+            if node.else_case:
+                return self.visit_tracked(node.else_case, context)
+
+            return None, None
+
+        if isinstance(node, parse.VarAssignNode):
+            value, origin = self.visit_tracked(node.value_node, context)
+            self.store(node, value, context)
+            return value, origin
+
+        return self.visit(node, context), parse.value_origin(node)
 
     def visit_UnaryOperationNode(self, node, context):
-        result = RuntimeResult()
-        number = result.register(self.visit(node.node, context))
-        if result.error: return result
+        number = self.visit(node.node, context)
 
         if node.operation_token.type == lexer.TT_MINUS:
-            number, error = number.mul_by(Number(-1))
+            return make_number(number.value * -1)
         elif node.operation_token.matches(lexer.TT_KEYWORD, 'NOT'):
-            number, error = number.not_by()
+            return make_number(1 if number.value == 0 else 0)
 
-        if error: return result.failure(error)
-        else:
-            return result.success(number.set_pos(node.pos_start, node.pos_end))
+        return number
     
     def visit_IfNode(self, node, context):
-        result = RuntimeResult()
-
         for condition, expr in node.cases:
-            condition_value = result.register(self.visit(condition, context))
-            if result.error: return result
-
-            if condition_value.is_true():
-                expr_value = result.register(self.visit(expr, context))
-                if result.error: return result
-                return result.success(expr_value)
+            if self.visit(condition, context).value != 0:
+                return self.visit(expr, context)
 
         if node.else_case:
-            else_value = result.register(self.visit(node.else_case, context))
-            if result.error: return result
-            return result.success(else_value)
+            return self.visit(node.else_case, context)
 
-        return result.success(None)
+        return None
     
     def visit_ForNode(self, node, context):
-        result = RuntimeResult()
-        start_value = result.register(self.visit(node.start_value_node, context))
-        if result.error: return result
-        end_value = result.register(self.visit(node.end_value_node, context))
-        if result.error: return result
+        start_value = self.visit(node.start_value_node, context)
+        end_value = self.visit(node.end_value_node, context).value
 
         if node.step_value_node:
-            step_value = result.register(self.visit(node.step_value_node, context))
-            if result.error: return result
+            step_value = self.visit(node.step_value_node, context).value
         else:
-            step_value = Number(1)
+            step_value = 1
 
-        i = start_value.value
-        if step_value.value >= 0:
-            condition = lambda: i < end_value.value
-        else:
-            condition = lambda: i > end_value.value
-        
-        while condition():
-            context.symbol_table.set(node.var_name_token.value, Number(i))
-            i += step_value.value
+        frame = context.frame
+        for invariant in node.invariants:
+            frame[invariant.slot] = None
 
-            result.register(self.visit(node.body_node, context))
-            if result.error: return result
+        slot = node.slot
+        body_node = node.body_node
+        i = start_value.value
 
-        return result.success(None)
+        # Int bounds and a nonzero step give exactly the values of a range
+        if type(i) is int and type(end_value) is int and type(step_value) is int and step_value != 0:
+            values = range(i, end_value, step_value)
+            if self.reduce_loop(node, values, frame): return None
+
+            for i in values:
+                frame[slot] = make_number(i)
+                self.visit(body_node, context)
+            return None
+
+        if step_value >= 0:
+            while i < end_value:
+                frame[slot] = make_number(i)
+                i += step_value
+                self.visit(body_node, context)
+        else:
+            while i > end_value:
+                frame[slot] = make_number(i)
+                i += step_value
+                self.visit(body_node, context)
+
+        return None
+
+    def reduce_loop(self, node, values, frame):
+        # Runs the whole loop at once when the resolver recognised its body as a reduction
+        if node.accumulation and self.accumulate(node.accumulation, values, frame):
+            if values: frame[node.slot] = make_number(values[-1])
+            return True
+
+        if node.reduction and self.vectorize and len(values) >= vectorize.MIN_ITERATIONS:
+            total = vectorize.run(node.reduction, values, frame)
+            if total is not None:
+                frame[node.reduction[0]] = make_number(total)
+                frame[node.slot] = make_number(values[-1])
+                return True
+
+        return False
+
+    def accumulate(self, accumulation, values, frame):
+        # Runs a body `VAR s = s + f(i)` in closed form, adding sum(f(i) for i in values) to s at once;
+        # only done when every value involved is an int, so the result is exact
+        target_slot, form = accumulation
+        if not values: return True
+
+        total = frame[target_slot]
+        if total is None or type(total.value) is not int: return False
+
+        terms = linear_terms(form, frame)
+        if terms is None or terms[0] != 1: return False
+
+        # f(i) = a * i + b, summed over i = start + k * step for k < n
+        _, a, b = terms
+        n = len(values)
+        start, step = values.start, values.step
+        frame[target_slot] = make_number(total.value + n * (a * start + b) + a * step * (n * (n - 1) // 2))
+        return True
 
     def visit_WhileNode(self, node, context):
-        result = RuntimeResult()
-
-        while True:
-            condition = result.register(self.visit(node.condition_node, context))
-            if result.error: return result
+        for invariant in node.invariants:
+            context.frame[invariant.slot] = None
 
-            if not condition.is_true(): break
+        while self.visit(node.condition_node, context).value != 0:
+            self.visit(node.body_node, context)
 
-            result.register(self.visit(node.body_node, context))
-            if result.error: return result
+        return None
 
-        return result.success(None)
\ No newline at end of file
+    def visit_InvariantNode(self, node, context):
+        # Computed on first use after its loop starts; None also means the value was never computed
+        value = context.frame[node.slot]
+        if value is None:
+            value = context.frame[node.slot] = self.visit(node.value_node, context)
+        return value
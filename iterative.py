@@ -0,0 +1,453 @@
+##########
+# IMPORTS
+##########
+
+import error
+import interpreter
+import lexer
+import parse
+
+
+##########
+# CONSTANTS
+##########
+
+# Parser frames; each rule keeps its own locals in the frame while a nested expression is parsed
+P_ASSIGN = 0
+P_UNARY = 1
+P_POWER = 2
+P_BINARY = 3
+P_PAREN = 4
+P_IF = 5
+P_FOR = 6
+P_WHILE = 7
+
+# What the parser starts on next: an expression, a comparison or a binary_expr at some precedence, or a factor
+R_EXPR = 0
+R_COMP = 1
+R_BINARY = 2
+R_FACTOR = 3
+
+# Messages of the rules that report a failure before any token was consumed in their own words
+RULE_ERRORS = {
+    R_EXPR: "Expected 'Var', 'Identifier', int, float, '+', '-' or '('",
+    R_COMP: "Expected int, float, identifier, '+', '-', '(' or 'NOT'",
+}
+
+# Evaluator frames
+E_ASSIGN = 0
+E_LEFT = 1
+E_RIGHT = 2
+E_UNARY = 3
+E_IF = 4
+E_FOR_BOUNDS = 5
+E_FOR_BODY = 6
+E_WHILE_CONDITION = 7
+E_WHILE_BODY = 8
+
+
+####################
+# ITERATIVE PARSER
+####################
+
+# The same grammar, errors and nodes as parse.Parser, with the rules it would recurse into kept on a
+# list instead of the Python stack, so nesting is limited only by memory
+class IterativeParser(parse.Parser):
+    def expr(self):
+        builder = self.builder
+        stack = []
+        push = stack.append
+        rule = R_EXPR
+        min_precedence = parse.LOGICAL_PRECEDENCE
+
+        try:
+            while True:
+                # Start rules until one has produced a node
+                token = self.cur_token
+                token_type = token.type
+
+                if rule == R_EXPR and token_type == lexer.TT_KEYWORD and token.value == 'VAR':
+                    self.advance()
+                    if self.cur_token.type != lexer.TT_IDENTIFIER:
+                        raise error.InvalidSyntaxError(self.cur_token.pos_start, self.cur_token.pos_end, "Expected identifier")
+
+                    var_name = self.cur_token
+                    self.advance()
+                    if self.cur_token.type != lexer.TT_EQ:
+                        raise error.InvalidSyntaxError(self.cur_token.pos_start, self.cur_token.pos_end, "Expected '='")
+
+                    self.advance()
+                    push((P_ASSIGN, var_name))
+                    continue
+
+                if rule != R_FACTOR:
+                    # binary_expr; expr and comp_expr are binary_expr with their own error message
+                    if rule == R_EXPR: min_precedence = parse.LOGICAL_PRECEDENCE
+                    elif rule == R_COMP: min_precedence = parse.COMPARISON_PRECEDENCE
+                    push([P_BINARY, min_precedence, rule, self.token_index, None, None])
+
+                    if min_precedence <= parse.COMPARISON_PRECEDENCE and token_type == lexer.TT_KEYWORD and token.value == 'NOT':
+                        self.advance()
+                        push((P_UNARY, token))
+                        rule = R_COMP
+                    else:
+                        rule = R_FACTOR
+                    continue
+
+                if token_type == lexer.TT_PLUS or token_type == lexer.TT_MINUS:
+                    self.advance()
+                    push((P_UNARY, token))
+                    continue
+
+                # atom; a name or number is done at once unless '^' follows
+                if token_type == lexer.TT_INT or token_type == lexer.TT_FLOAT or token_type == lexer.TT_IDENTIFIER:
+                    self.advance()
+                    if token_type == lexer.TT_IDENTIFIER: node = builder.var_access_node(token)
+                    else: node = builder.number_node(token)
+
+                    if self.cur_token.type == lexer.TT_POW:
+                        push([P_POWER, node, self.cur_token])
+                        self.advance()
+                        continue
+                elif token_type == lexer.TT_LPAREN:
+                    self.advance()
+                    push([P_POWER, None, None])
+                    push((P_PAREN,))
+                    rule = R_EXPR
+                    continue
+                elif token_type == lexer.TT_KEYWORD and token.value == 'IF':
+                    self.advance()
+                    push([P_POWER, None, None])
+                    push([P_IF, [], None])
+                    rule = R_EXPR
+                    continue
+                elif token_type == lexer.TT_KEYWORD and token.value == 'FOR':
+                    self.advance()
+                    if self.cur_token.type != lexer.TT_IDENTIFIER:
+                        raise error.InvalidSyntaxError(self.cur_token.pos_start, self.cur_token.pos_end, f"Expected identifier")
+
+                    var_name = self.cur_token
+                    self.advance()
+                    if self.cur_token.type != lexer.TT_EQ:
+                        raise error.InvalidSyntaxError(self.cur_token.pos_start, self.cur_token.pos_end, f"Expected '='")
+
+                    self.advance()
+                    push([P_POWER, None, None])
+                    push([P_FOR, var_name, []])
+                    rule = R_EXPR
+                    continue
+                elif token_type == lexer.TT_KEYWORD and token.value == 'WHILE':
+                    self.advance()
+                    push([P_POWER, None, None])
+                    push([P_WHILE, None])
+                    rule = R_EXPR
+                    continue
+                else:
+                    raise error.InvalidSyntaxError(
+                        token.pos_start, token.pos_end, "Expected int, float, identifier, '+', '-', or '('")
+
+                # Hand the node to the waiting rules until one needs another expression
+                while True:
+                    frame = stack[-1]
+                    kind = frame[0]
+
+                    if kind == P_POWER:
+                        if frame[2] is not None:
+                            node = builder.binary_operation_node(frame[1], frame[2], node)
+
+                        if self.cur_token.type == lexer.TT_POW:
+                            frame[1] = node
+                            frame[2] = self.cur_token
+                            self.advance()
+                            rule = R_FACTOR
+                            break
+                        stack.pop()
+
+                    elif kind == P_BINARY:
+                        if frame[5] is not None:
+                            node = builder.binary_operation_node(frame[4], frame[5], node)
+
+                        # Climb while the next operator binds at least as tightly as this level
+                        operation_token = self.cur_token
+                        token_type = operation_token.type
+                        precedence = parse.BINARY_PRECEDENCE.get(operation_token.value if token_type == lexer.TT_KEYWORD else token_type, 0)
+                        if precedence >= frame[1]:
+                            frame[4] = node
+                            frame[5] = operation_token
+                            self.advance()
+                            if precedence == parse.LOGICAL_PRECEDENCE:
+                                rule = R_COMP
+                            else:
+                                rule = R_BINARY
+                                min_precedence = precedence + 1
+                            break
+                        stack.pop()
+
+                    elif kind == P_UNARY:
+                        stack.pop()
+                        node = builder.unary_operation_node(frame[1], node)
+
+                    elif kind == P_ASSIGN:
+                        stack.pop()
+                        node = builder.var_assign_node(frame[1], node)
+
+                    elif kind == P_PAREN:
+                        stack.pop()
+                        if self.cur_token.type != lexer.TT_RPAREN:
+                            raise error.InvalidSyntaxError(self.cur_token.pos_start, self.cur_token.pos_end, "Expected ')'")
+                        self.advance()
+
+                    elif kind == P_IF:
+                        cases = frame[1]
+                        if frame[2] is None:
+                            # A condition was parsed; its expression comes next
+                            frame[2] = node
+                            self.expect_keyword('THEN')
+                            rule = R_EXPR
+                            break
+
+                        if frame[2] is not cases:
+                            cases.append((frame[2], node))
+                            if self.cur_token.matches(lexer.TT_KEYWORD, 'ELIF'):
+                                self.advance()
+                                frame[2] = None
+                                rule = R_EXPR
+                                break
+                            if self.cur_token.matches(lexer.TT_KEYWORD, 'ELSE'):
+                                self.advance()
+                                frame[2] = cases
+                                rule = R_EXPR
+                                break
+                            node = builder.if_node(cases, None)
+                        else:
+                            node = builder.if_node(cases, node)
+                        stack.pop()
+
+                    elif kind == P_FOR:
+                        values = frame[2]
+                        values.append(node)
+
+                        if len(values) == 1:
+                            self.expect_keyword('TO')
+                            rule = R_EXPR
+                            break
+                        if len(values) == 2:
+                            if self.cur_token.matches(lexer.TT_KEYWORD, 'STEP'):
+                                self.advance()
+                                rule = R_EXPR
+                                break
+                            values.append(None)
+                        if len(values) == 3:
+                            self.expect_keyword('THEN')
+                            rule = R_EXPR
+                            break
+
+                        stack.pop()
+                        node = builder.for_node(frame[1], values[0], values[1], values[2], values[3])
+
+                    else:
+                        if frame[1] is None:
+                            frame[1] = node
+                            self.expect_keyword('THEN')
+                            rule = R_EXPR
+                            break
+
+                        stack.pop()
+                        node = builder.while_node(frame[1], node)
+
+                    if not stack: return node
+
+        except error.InvalidSyntaxError as err:
+            # As in Parser.expr/comp_expr: the outermost of those rules that hadn't consumed a token yet
+            # reports the failure with its expectations
+            for frame in stack:
+                if frame[0] == P_BINARY and frame[2] in RULE_ERRORS and frame[3] == self.token_index:
+                    raise error.InvalidSyntaxError(self.cur_token.pos_start, self.cur_token.pos_end, RULE_ERRORS[frame[2]])
+            raise
+
+
+####################
+# ITERATIVE INTERPRETER
+####################
+
+# Evaluates node trees like interpreter.Interpreter, with pending work kept on a list instead of the
+# Python stack. Variables are read and written through the symbol table, since the resolver and the
+# loop reductions recurse
+class IterativeInterpreter:
+    def run(self, node, context):
+        try:
+            return self.evaluate(node, context), None
+        except error.RuntimeError as err:
+            return None, err
+
+    def evaluate(self, node, context):
+        table = context.symbol_table
+        make_number = interpreter.make_number
+        stack = []
+        push = stack.append
+
+        # The frame of the division whose divisor is being evaluated, while the span its value comes
+        # from still depends on which IF branch runs
+        tracker = None
+
+        while True:
+            # Go down into `node` until something has a value
+            node_type = type(node)
+
+            if tracker is not None and node_type is not parse.IfNode and node_type is not parse.VarAssignNode:
+                tracker[3] = parse.value_origin(node)
+                tracker = None
+
+            if node_type is parse.NumberNode:
+                value = make_number(node.token.value)
+            elif node_type is parse.VarAccessNode:
+                value = table.get(node.var_name_token.value)
+                if value is None:
+                    raise error.RuntimeError(node.pos_start, node.pos_end, f"'{node.var_name_token.value}' is not defined", context)
+            elif node_type is parse.BinaryOperationNode:
+                push([E_LEFT, node, None, None])
+                node = node.left_node
+                continue
+            elif node_type is parse.UnaryOperationNode:
+                push((E_UNARY, node))
+                node = node.node
+                continue
+            elif node_type is parse.VarAssignNode:
+                push((E_ASSIGN, node))
+                node = node.value_node
+                continue
+            elif node_type is parse.IfNode:
+                # Conditions are never tracked; the branch taken is when the IF is
+                push([E_IF, node, 0, tracker])
+                tracker = None
+                node = node.cases[0][0]
+                continue
+            elif node_type is parse.ForNode:
+                push([E_FOR_BOUNDS, node, []])
+                node = node.start_value_node
+                continue
+            elif node_type is parse.WhileNode:
+                push((E_WHILE_CONDITION, node))
+                node = node.condition_node
+                continue
+            else:
+                raise Exception(f'No visit_{node_type.__name__} method defined')
+
+            # Hand the value to the waiting frames until one has another node to evaluate
+            while stack:
+                frame = stack[-1]
+                kind = frame[0]
+
+                if kind == E_LEFT:
+                    binary = frame[1]
+                    frame[0] = E_RIGHT
+                    frame[2] = value
+                    node = binary.right_node
+
+                    # Division by zero is reported on the span of the value the divisor came from
+                    if binary.operation_token.type == lexer.TT_DIV:
+                        frame[3] = parse.value_origin(node)
+                        if frame[3] is None: tracker = frame
+                    break
+
+                elif kind == E_RIGHT:
+                    stack.pop()
+                    binary = frame[1]
+                    token = binary.operation_token
+
+                    if token.type == lexer.TT_DIV:
+                        if value.value == 0:
+                            origin = frame[3]
+                            raise error.RuntimeError(origin.pos_start, origin.pos_end, 'Division by zero', context)
+                        value = make_number(frame[2].value / value.value)
+                    else:
+                        operation = interpreter.VALUE_OPERATIONS[token.value if token.type == lexer.TT_KEYWORD else token.type]
+                        value = make_number(operation(frame[2].value, value.value))
+
+                elif kind == E_UNARY:
+                    stack.pop()
+                    operation_token = frame[1].operation_token
+                    if operation_token.type == lexer.TT_MINUS:
+                        value = make_number(value.value * -1)
+                    elif operation_token.matches(lexer.TT_KEYWORD, 'NOT'):
+                        value = make_number(1 if value.value == 0 else 0)
+
+                elif kind == E_ASSIGN:
+                    stack.pop()
+                    table.set(frame[1].var_name_token.value, value)
+
+                elif kind == E_IF:
+                    if_node = frame[1]
+                    if value.value != 0:
+                        stack.pop()
+                        node = if_node.cases[frame[2]][1]
+                        tracker = frame[3]
+                        break
+
+                    frame[2] += 1
+                    if frame[2] < len(if_node.cases):
+                        node = if_node.cases[frame[2]][0]
+                        break
+
+                    stack.pop()
+                    if if_node.else_case:
+                        node = if_node.else_case
+                        tracker = frame[3]
+                        break
+
+                    value = None
+                    if frame[3] is not None: frame[3][3] = None
+
+                elif kind == E_FOR_BOUNDS:
+                    for_node = frame[1]
+                    bounds = frame[2]
+                    bounds.append(value.value)
+
+                    if len(bounds) == 1:
+                        node = for_node.end_value_node
+                        break
+                    if len(bounds) == 2 and for_node.step_value_node:
+                        node = for_node.step_value_node
+                        break
+
+                    # [kind, node, i, end, step]
+                    i, end_value = bounds[0], bounds[1]
+                    step_value = bounds[2] if len(bounds) == 3 else 1
+                    stack[-1] = frame = [E_FOR_BODY, for_node, i, end_value, step_value]
+
+                    if (i < end_value) if step_value >= 0 else (i > end_value):
+                        table.set(for_node.var_name_token.value, make_number(i))
+                        frame[2] = i + step_value
+                        node = for_node.body_node
+                        break
+
+                    stack.pop()
+                    value = None
+
+                elif kind == E_FOR_BODY:
+                    i = frame[2]
+                    if (i < frame[3]) if frame[4] >= 0 else (i > frame[3]):
+                        for_node = frame[1]
+                        table.set(for_node.var_name_token.value, make_number(i))
+                        frame[2] = i + frame[4]
+                        node = for_node.body_node
+                        break
+
+                    stack.pop()
+                    value = None
+
+                elif kind == E_WHILE_CONDITION:
+                    if value.value != 0:
+                        stack[-1] = (E_WHILE_BODY, frame[1])
+                        node = frame[1].body_node
+                        break
+
+                    stack.pop()
+                    value = None
+
+                else:
+                    stack[-1] = (E_WHILE_CONDITION, frame[1])
+                    node = frame[1].condition_node
+                    break
+            else:
+                return value
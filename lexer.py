@@ -2,7 +2,10 @@
 # IMPORTS
 ##########
 
+from array import array
+import bisect
 import error
+import re
 import string
 
 
@@ -15,30 +18,66 @@ LETTERS = string.ascii_letters
 LETTERS_DIGITS = DIGITS + LETTERS
 
 
+####################
+# SOURCE
+####################
+
+class Source:
+    __slots__ = ('file_name', 'text', 'line_starts', 'line_offset')
+
+    def __init__(self, file_name, text, line_offset=0):
+        self.file_name = file_name
+        self.text = text
+        self.line_starts = None
+
+        # Lines before the text in its file, when the text is one piece of a larger program
+        self.line_offset = line_offset
+
+    def position(self, index):
+        return Position(self, index)
+
+    def line_col(self, index):
+        # The line index is only built once an error message asks for a line number
+        if self.line_starts is None:
+            self.line_starts = [0] + [match.end() for match in re.finditer('\n', self.text)]
+
+        line_num = bisect.bisect_right(self.line_starts, index) - 1
+        return line_num + self.line_offset, index - self.line_starts[line_num]
+
+
 ####################
 # POSITION
 ####################
 
 class Position:
-    def __init__(self, index, line_num, col_num, file_name, file_text):
+    __slots__ = ('source', 'index')
+
+    def __init__(self, source, index):
+        self.source = source
         self.index = index
-        self.line_num = line_num
-        self.col_num = col_num
-        self.file_name = file_name
-        self.file_text = file_text
 
-    def advance(self, cur_char=None):
-        self.index += 1
-        self.col_num += 1
+    @property
+    def line_num(self):
+        return self.source.line_col(self.index)[0]
 
-        if cur_char == '\n':
-            self.line_num += 1
-            self.col_num = 0
+    @property
+    def col_num(self):
+        return self.source.line_col(self.index)[1]
 
+    @property
+    def file_name(self):
+        return self.source.file_name
+
+    @property
+    def file_text(self):
+        return self.source.text
+
+    def advance(self):
+        self.index += 1
         return self
     
     def copy(self):
-        return Position(self.index, self.line_num, self.col_num, self.file_name, self.file_text)
+        return Position(self.source, self.index)
 
 
 ####################
@@ -65,20 +104,26 @@ TT_LPAREN = 'LPAREN'
 TT_RPAREN = 'RPAREN'
 TT_EOF = 'EOF'
 
-KEYWORDS = ['VAR', 'AND', 'OR', 'NOT', 'IF', 'THEN', 'ELSE', 'ELIF', 'FOR', 'TO', 'STEP', 'WHILE']
+TOKEN_TYPES = (
+    TT_INT, TT_FLOAT, TT_IDENTIFIER, TT_KEYWORD, TT_EQ, TT_EEQ, TT_NEQ, TT_LESS, TT_GREATER, TT_LESS_OR_EQ,
+    TT_GREATER_OR_EQ, TT_PLUS, TT_MINUS, TT_MUL, TT_DIV, TT_POW, TT_LPAREN, TT_RPAREN, TT_EOF,
+)
+TYPE_CODES = {token_type: code for code, token_type in enumerate(TOKEN_TYPES)}
+
+KEYWORDS = {'VAR', 'AND', 'OR', 'NOT', 'IF', 'THEN', 'ELSE', 'ELIF', 'FOR', 'TO', 'STEP', 'WHILE'}
 
 
 class Token:
+    __slots__ = ('type', 'value', 'pos_start', 'pos_end')
+
     def __init__(self, type_, value=None, pos_start=None, pos_end=None):
         self.type = type_
         self.value = value 
 
         if pos_start:
-            self.pos_start = pos_start.copy()
-            self.pos_end = pos_start.copy()
-            self.pos_end.advance()
-
-        if pos_end:
+            self.pos_start = pos_start
+            self.pos_end = pos_end or pos_start.copy().advance()
+        elif pos_end:
             self.pos_end = pos_end
 
     def matches(self, type_, value):
@@ -91,143 +136,128 @@ class Token:
 
 
 ####################
-# LEXER
+# TOKEN STREAM
 ####################
 
-class Lexer:
-    def __init__(self, file_name, text):
-        self.file_name = file_name
-        self.text = text
-        self.pos = Position(-1, 0, -1, file_name, text)
-        self.cur_char = None
-        self.advance()
-
-    def advance(self):
-        self.pos.advance(self.cur_char)
-        self.cur_char = self.text[self.pos.index] if self.pos.index < len(self.text) else None
-
-    def create_tokens(self):
-        tokens = []
-
-        while self.cur_char != None:
-            if self.cur_char in ' \t' :
-                self.advance()
-            elif self.cur_char in DIGITS:
-                tokens.append(self.create_number())
-            elif self.cur_char in LETTERS:
-                tokens.append(self.create_identifier())
-            elif self.cur_char == '+':
-                tokens.append(Token(TT_PLUS, pos_start=self.pos))
-                self.advance()
-            elif self.cur_char == '-':
-                tokens.append(Token(TT_MINUS, pos_start=self.pos))
-                self.advance()
-            elif self.cur_char == '*':
-                tokens.append(Token(TT_MUL, pos_start=self.pos))
-                self.advance()
-            elif self.cur_char == '/':
-                tokens.append(Token(TT_DIV, pos_start=self.pos))
-                self.advance()
-            elif self.cur_char == '^':
-                tokens.append(Token(TT_POW, pos_start=self.pos))
-                self.advance()
-            elif self.cur_char == '(':
-                tokens.append(Token(TT_LPAREN, pos_start=self.pos))
-                self.advance()
-            elif self.cur_char == ')':
-                tokens.append(Token(TT_RPAREN, pos_start=self.pos))
-                self.advance()
-            elif self.cur_char == '!':
-                token, error = self.create_not_equals()
-                if error: return [], error
-                tokens.append(token)
-            elif self.cur_char == '=':
-                tokens.append(self.create_equals())
-            elif self.cur_char == '<':
-                tokens.append(self.create_less_than())
-            elif self.cur_char == '>':
-                tokens.append(self.create_greater_than())
+class TokenStream:
+    # Tokens are kept as parallel arrays of type codes, values and offsets;
+    # a Token is only built when the parser asks for one
+    def __init__(self, source):
+        self.source = source
+        self.types = array('B')
+        self.values = []
+        self.starts = array('L')
+        self.ends = array('L')
 
-            else:
-                pos_start = self.pos.copy()
-                char = self.cur_char
-                self.advance()
-                return [], error.IllegalCharError(pos_start,  self.pos, "'" + char + "'")
-
-        tokens.append(Token(TT_EOF, pos_start=self.pos))
-        return tokens, None
-    
-    def create_number(self):
-        num_str = ''
-        dot_count = 0
-        pos_start = self.pos.copy()
-
-        while self.cur_char != None and self.cur_char in DIGITS + '.':
-            if self.cur_char == '.':
-                if dot_count == 1: break
-                dot_count += 1
-                num_str += '.'
-            else:
-                num_str += self.cur_char
-            self.advance()
-
-        if dot_count == 0:
-            return Token(TT_INT, int(num_str), pos_start, self.pos)
-        else:
-            return Token(TT_FLOAT, float(num_str), pos_start, self.pos)
-        
-    def create_identifier(self):
-        id_str = ''
-        pos_start = self.pos.copy()
-        
-        while self.cur_char != None and self.cur_char in LETTERS_DIGITS + '_':
-            id_str += self.cur_char
-            self.advance()
-            
-        token_type = TT_KEYWORD if id_str in KEYWORDS else TT_IDENTIFIER
-        return Token(token_type, id_str, pos_start, self.pos)
-    
-    def create_not_equals(self):
-        pos_start = self.pos.copy()
-        self.advance()
+    def __len__(self):
+        return len(self.types)
 
-        if self.cur_char == '=':
-            self.advance()
-            return Token(TT_NEQ, pos_start=pos_start, pos_end=self.pos), None
+    def __getitem__(self, index):
+        source = self.source
+        return Token(TOKEN_TYPES[self.types[index]], self.values[index],
+                     Position(source, self.starts[index]), Position(source, self.ends[index]))
 
-        self.advance()
-        return None, error.ExpectedCharError(pos_start, self.pos, "'=' (after '!')")
+    def __iter__(self):
+        for index in range(len(self.types)):
+            yield self[index]
 
-    def create_equals(self):
-        token_type = TT_EQ
-        pos_start = self.pos.copy()
-        self.advance()
-
-        if self.cur_char == '=':
-            self.advance()
-            token_type = TT_EEQ
+    def __repr__(self):
+        return repr(list(self))
 
-        return Token(token_type, pos_start=pos_start, pos_end=self.pos)
 
-    def create_less_than(self):
-        token_type = TT_LESS
-        pos_start = self.pos.copy()
-        self.advance()
+####################
+# LEXER
+####################
 
-        if self.cur_char == '=':
-            self.advance()
-            token_type = TT_LESS_OR_EQ
+TOKEN_PATTERN = re.compile(rf'''
+    (?P<SKIP>[ \t]+)
+  | (?P<NAME>[{LETTERS}][{LETTERS_DIGITS}_]*)
+  | (?P<FLOAT>[{DIGITS}]+\.[{DIGITS}]*)
+  | (?P<INT>[{DIGITS}]+)
+  | (?P<SINGLE>[-+*/^()])
+  | (?P<COMPARISON>[=<>!]=|[=<>])
+  | (?P<BANG>!)
+  | (?P<ILLEGAL>.)
+''', re.VERBOSE | re.DOTALL)
+
+SINGLE_TOKENS = {
+    '+': TT_PLUS,
+    '-': TT_MINUS,
+    '*': TT_MUL,
+    '/': TT_DIV,
+    '^': TT_POW,
+    '(': TT_LPAREN,
+    ')': TT_RPAREN,
+}
+
+COMPARISON_TOKENS = {
+    '=': TT_EQ,
+    '==': TT_EEQ,
+    '!=': TT_NEQ,
+    '<': TT_LESS,
+    '<=': TT_LESS_OR_EQ,
+    '>': TT_GREATER,
+    '>=': TT_GREATER_OR_EQ,
+}
+
+SINGLE_CODES = {char: TYPE_CODES[token_type] for char, token_type in SINGLE_TOKENS.items()}
+COMPARISON_CODES = {chars: TYPE_CODES[token_type] for chars, token_type in COMPARISON_TOKENS.items()}
 
-        return Token(token_type, pos_start=pos_start, pos_end=self.pos)
 
-    def create_greater_than(self):
-        token_type = TT_GREATER
-        pos_start = self.pos.copy()
-        self.advance()
+class Lexer:
+    def __init__(self, file_name, text, line_offset=0):
+        self.file_name = file_name
+        self.text = text
+        self.source = Source(file_name, text, line_offset)
 
-        if self.cur_char == '=':
-            self.advance()
-            token_type = TT_GREATER_OR_EQ
+    def create_tokens(self):
+        source = self.source
+        text = self.text
+        tokens = TokenStream(source)
+        add_type = tokens.types.append
+        add_value = tokens.values.append
+        add_start = tokens.starts.append
+        add_end = tokens.ends.append
+
+        # Names, numbers and comparison operators have always reported the end of
+        # the text as their end position, which error arrows still rely on
+        text_end = len(text)
+
+        for match in TOKEN_PATTERN.finditer(text):
+            kind = match.lastgroup
+            if kind == 'SKIP': continue
+
+            index = match.start()
+            add_start(index)
+
+            if kind == 'NAME':
+                name = match.group()
+                add_type(TYPE_CODES[TT_KEYWORD if name in KEYWORDS else TT_IDENTIFIER])
+                add_value(name)
+                add_end(text_end)
+            elif kind == 'INT':
+                add_type(TYPE_CODES[TT_INT])
+                add_value(int(match.group()))
+                add_end(text_end)
+            elif kind == 'SINGLE':
+                add_type(SINGLE_CODES[match.group()])
+                add_value(None)
+                add_end(index + 1)
+            elif kind == 'COMPARISON':
+                add_type(COMPARISON_CODES[match.group()])
+                add_value(None)
+                add_end(text_end)
+            elif kind == 'FLOAT':
+                add_type(TYPE_CODES[TT_FLOAT])
+                add_value(float(match.group()))
+                add_end(text_end)
+            elif kind == 'BANG':
+                return [], error.ExpectedCharError(source.position(index), source.position(index + 2), "'=' (after '!')")
+            else:
+                return [], error.IllegalCharError(source.position(index), source.position(index + 1), "'" + match.group() + "'")
 
-        return Token(token_type, pos_start=pos_start, pos_end=self.pos)
-    
\ No newline at end of file
+        add_type(TYPE_CODES[TT_EOF])
+        add_value(None)
+        add_start(text_end)
+        add_end(text_end + 1)
+        return tokens, None
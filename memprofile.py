@@ -0,0 +1,250 @@
+##########
+# IMPORTS
+##########
+
+import argparse
+import gc
+import interpreter
+import json
+import lexer
+import parse
+import shell
+import sys
+import time
+import tracemalloc
+
+
+##########
+# CONSTANTS
+##########
+
+PHASES = ('lex', 'parse', 'evaluate')
+
+# Live instances are counted by walking the whole heap, so only the first and then every LIVE_EVERY-th
+# run of a phase is followed by a count; counting after every run made a profile O(runs x heap)
+LIVE_EVERY = 100
+
+# Classes counted by default: token and position objects, every AST node kind, and runtime values
+DEFAULT_CLASSES = (lexer.Position, lexer.Token, interpreter.Number, interpreter.Site) + tuple(
+    value for name, value in vars(parse).items() if isinstance(value, type) and name.endswith('Node'))
+
+
+####################
+# CLASS STATS
+####################
+
+class ClassStats:
+    __slots__ = ('allocations', 'bytes', 'live', 'live_bytes')
+
+    def __init__(self):
+        # Instances constructed and their size when constructed, over every run of the phase
+        self.allocations = 0
+        self.bytes = 0
+
+        # Instances created during the profile and alive when the phase ended, the most seen after any
+        # one sampled run of it
+        self.live = 0
+        self.live_bytes = 0
+
+    def as_dict(self):
+        return {name: getattr(self, name) for name in self.__slots__}
+
+
+def instance_size(instance):
+    # Attributes kept in a __dict__ are part of the instance's footprint
+    size = sys.getsizeof(instance)
+    if hasattr(instance, '__dict__'): size += sys.getsizeof(instance.__dict__)
+    return size
+
+
+####################
+# MEMORY PROFILER
+####################
+
+# While active, the counted classes' constructors are wrapped, so the plain classes pay nothing
+# outside a profile. Numbers shared from SMALL_NUMBERS are never constructed and never counted
+class MemoryProfiler:
+    def __init__(self, classes=DEFAULT_CLASSES, trace=True, live_every=LIVE_EVERY):
+        self.classes = classes
+        self.trace = trace
+        self.live_every = live_every
+        self.phase = None
+        self.class_stats = {phase: {} for phase in PHASES}
+        self.phase_stats = {phase: {'runs': 0, 'seconds': 0.0, 'net_bytes': 0, 'peak_bytes': 0} for phase in PHASES}
+        self.originals = {}
+        self.started_tracing = False
+
+        # Instances that existed before the profile, like SMALL_NUMBERS, are held so their ids stay unique
+        self.preexisting = []
+        self.preexisting_ids = set()
+
+    def __enter__(self):
+        self.preexisting = self.instances()
+        self.preexisting_ids = {id(instance) for instance in self.preexisting}
+
+        for cls in self.classes:
+            self.originals[cls] = cls.__dict__.get('__init__')
+            cls.__init__ = self.counting(cls.__init__)
+
+        if self.trace and not tracemalloc.is_tracing():
+            tracemalloc.start()
+            self.started_tracing = True
+        return self
+
+    def __exit__(self, *exc_info):
+        for cls, init in self.originals.items():
+            if init is None:
+                del cls.__init__
+            else:
+                cls.__init__ = init
+        self.originals = {}
+        self.preexisting = []
+        self.preexisting_ids = set()
+
+        if self.started_tracing:
+            tracemalloc.stop()
+            self.started_tracing = False
+
+    def counting(self, init):
+        def __init__(instance, *args, **kwargs):
+            init(instance, *args, **kwargs)
+            if self.phase is None: return
+
+            stats = self.stats_for(self.phase, type(instance).__name__)
+            stats.allocations += 1
+            stats.bytes += instance_size(instance)
+        return __init__
+
+    def stats_for(self, phase, class_name):
+        stats = self.class_stats[phase].get(class_name)
+        if stats is None:
+            stats = self.class_stats[phase][class_name] = ClassStats()
+        return stats
+
+    def measure(self, phase, function, *args):
+        # Runs function(*args) as one run of `phase`
+        self.phase = phase
+        if self.trace:
+            start_bytes = tracemalloc.get_traced_memory()[0]
+            tracemalloc.reset_peak()
+        start = time.perf_counter()
+
+        try:
+            return function(*args)
+        finally:
+            seconds = time.perf_counter() - start
+            self.phase = None
+
+            stats = self.phase_stats[phase]
+            stats['runs'] += 1
+            stats['seconds'] += seconds
+            if self.trace:
+                current, peak = tracemalloc.get_traced_memory()
+                stats['net_bytes'] += current - start_bytes
+                stats['peak_bytes'] = max(stats['peak_bytes'], peak - start_bytes)
+
+            if (stats['runs'] - 1) % self.live_every == 0:
+                self.count_live(phase)
+
+    def instances(self):
+        counted = tuple(self.classes)
+        return [instance for instance in gc.get_objects() if isinstance(instance, counted)]
+
+    def count_live(self, phase):
+        live = {}
+        for instance in self.instances():
+            if id(instance) not in self.preexisting_ids:
+                name = type(instance).__name__
+                count, size = live.get(name, (0, 0))
+                live[name] = (count + 1, size + instance_size(instance))
+
+        for name, (count, size) in live.items():
+            stats = self.stats_for(phase, name)
+            if count > stats.live:
+                stats.live = count
+                stats.live_bytes = size
+
+    def run(self, file_name, text, engine='interpreter', optimize=True, symbol_table=None, line_num=0):
+        # shell.run split into its three phases; the parse cache and the transpiler skip them, so neither
+        # is used. line_num is where the text starts in its file
+        lex = lexer.Lexer(file_name, text, line_num)
+        tokens, err = self.measure('lex', lex.create_tokens)
+        if err: return None, err
+
+        ast = self.measure('parse', shell.parse_tokens, tokens, engine)
+        if ast.error: return None, ast.error
+
+        context = interpreter.Context('<program>')
+        context.symbol_table = symbol_table or shell.global_symbol_table
+        return self.measure('evaluate', shell.evaluate, ast.node, context, engine, optimize)
+
+    def as_dict(self):
+        return {
+            'tracemalloc': self.trace,
+            'live_every': self.live_every,
+            'phases': {phase: dict(self.phase_stats[phase],
+                                   classes={name: stats.as_dict() for name, stats in sorted(self.class_stats[phase].items())})
+                       for phase in PHASES},
+        }
+
+    def report(self):
+        lines = []
+        for phase in PHASES:
+            stats = self.phase_stats[phase]
+            if not stats['runs']: continue
+
+            header = f'{phase}: {stats["runs"]} runs, {stats["seconds"] * 1000:.3f} ms'
+            if self.trace:
+                header += f', net {stats["net_bytes"]} bytes, peak {stats["peak_bytes"]} bytes'
+            lines.append(header)
+
+            by_bytes = sorted(self.class_stats[phase].items(), key=lambda item: item[1].bytes, reverse=True)
+            for name, class_stats in by_bytes:
+                lines.append(f'  {name:<22} {class_stats.allocations:>10} allocated {class_stats.bytes:>12} bytes'
+                             f' {class_stats.live:>10} live {class_stats.live_bytes:>12} bytes')
+            lines.append('')
+
+        return '\n'.join(lines)
+
+
+####################
+# PROFILE
+####################
+
+def main(argv=None):
+    arg_parser = argparse.ArgumentParser(description='Count allocations per class and pipeline phase while running an imp program.')
+    arg_parser.add_argument('path', help='program file; each line runs like REPL input')
+    arg_parser.add_argument('--engine', choices=('interpreter', 'vm', 'closure', 'flat', 'iterative'), default='interpreter')
+    arg_parser.add_argument('--no-optimize', dest='optimize', action='store_false', help='skip constant folding')
+    arg_parser.add_argument('--no-tracemalloc', dest='trace', action='store_false', help='only count constructors')
+    arg_parser.add_argument('--live-every', type=int, default=LIVE_EVERY, metavar='K',
+                            help=f'count live instances after the first and every K-th run of a phase (default {LIVE_EVERY})')
+    arg_parser.add_argument('--json', metavar='FILE', help="write the counts as JSON ('-' for stdout)")
+    args = arg_parser.parse_args(argv)
+
+    with open(args.path) as file:
+        lines = file.read().splitlines()
+
+    symbol_table = interpreter.SymbolTable()
+    with MemoryProfiler(trace=args.trace, live_every=args.live_every) as profiler:
+        for line_num, text in enumerate(lines):
+            if not text.strip(): continue
+
+            _, err = profiler.run(args.path, text, args.engine, args.optimize, symbol_table, line_num)
+            if err:
+                print(err.as_string(), file=sys.stderr)
+                break
+
+    dump = dict(profiler.as_dict(), program=args.path, engine=args.engine)
+    if args.json == '-':
+        print(json.dumps(dump, indent=2))
+        return
+
+    print(profiler.report())
+    if args.json:
+        with open(args.json, 'w') as file:
+            json.dump(dump, file, indent=2)
+
+
+if __name__ == '__main__':
+    main()
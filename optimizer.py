@@ -0,0 +1,357 @@
+##########
+# IMPORTS
+##########
+
+import lexer
+import math
+import parse
+
+
+##########
+# CONSTANTS
+##########
+
+# Folded integers larger than this stay in the tree and are computed at run time
+MAX_FOLDED_BITS = 4096
+
+FOLDABLE_OPERATIONS = {
+    lexer.TT_PLUS: lambda left, right: left + right,
+    lexer.TT_MINUS: lambda left, right: left - right,
+    lexer.TT_MUL: lambda left, right: left * right,
+    lexer.TT_DIV: lambda left, right: left / right,
+    lexer.TT_POW: lambda left, right: left ** right,
+    lexer.TT_EEQ: lambda left, right: int(left == right),
+    lexer.TT_NEQ: lambda left, right: int(left != right),
+    lexer.TT_LESS: lambda left, right: int(left < right),
+    lexer.TT_GREATER: lambda left, right: int(left > right),
+    lexer.TT_LESS_OR_EQ: lambda left, right: int(left <= right),
+    lexer.TT_GREATER_OR_EQ: lambda left, right: int(left >= right),
+    'AND': lambda left, right: int(left and right),
+    'OR': lambda left, right: int(left or right),
+}
+
+
+####################
+# HELPERS
+####################
+
+def children(node):
+    if isinstance(node, parse.VarAssignNode):
+        return [node.value_node]
+    elif isinstance(node, parse.BinaryOperationNode):
+        return [node.left_node, node.right_node]
+    elif isinstance(node, parse.UnaryOperationNode):
+        return [node.node]
+    elif isinstance(node, parse.IfNode):
+        nodes = [child for case in node.cases for child in case]
+        if node.else_case: nodes.append(node.else_case)
+        return nodes
+    elif isinstance(node, parse.ForNode):
+        nodes = [node.start_value_node, node.end_value_node]
+        if node.step_value_node: nodes.append(node.step_value_node)
+        nodes.append(node.body_node)
+        return nodes
+    elif isinstance(node, parse.WhileNode):
+        return [node.condition_node, node.body_node]
+    elif isinstance(node, parse.InvariantNode):
+        return [node.value_node]
+    return []
+
+
+def assigned_names(node):
+    names = set()
+    stack = [node]
+
+    while stack:
+        node = stack.pop()
+        if isinstance(node, parse.VarAssignNode):
+            names.add(node.var_name_token.value)
+        elif isinstance(node, parse.ForNode):
+            names.add(node.var_name_token.value)
+        stack.extend(children(node))
+
+    return names
+
+
+def number_node(value, node):
+    token_type = lexer.TT_INT if isinstance(value, int) else lexer.TT_FLOAT
+    return parse.NumberNode(lexer.Token(token_type, value, node.pos_start, node.pos_end))
+
+
+def with_span(new_node, node):
+    # Rebuilt nodes keep the span of the node they replace, so runtime errors point at the same source
+    new_node.pos_start = node.pos_start
+    new_node.pos_end = node.pos_end
+    return new_node
+
+
+def fold_binary(token, left, right):
+    operation = FOLDABLE_OPERATIONS[token.value if token.type == lexer.TT_KEYWORD else token.type]
+
+    # Division by zero is left for run time, where it is reported with its position
+    if token.type == lexer.TT_DIV and right == 0:
+        return None
+
+    if token.type == lexer.TT_POW and isinstance(left, int) and isinstance(right, int) and right > 0:
+        if right * max(left.bit_length(), 1) > MAX_FOLDED_BITS:
+            return None
+
+    try:
+        value = operation(left, right)
+    except (ArithmeticError, ValueError):
+        return None
+
+    if isinstance(value, int):
+        return value if value.bit_length() <= MAX_FOLDED_BITS else None
+    if isinstance(value, float):
+        return value if math.isfinite(value) else None
+    return None
+
+
+####################
+# CONSTANT FOLDER
+####################
+
+class ConstantFolder:
+    def optimize(self, node):
+        self.constants = {}
+        return self.visit(node)
+
+    def visit(self, node):
+        method_name = f'visit_{type(node).__name__}'
+        method = getattr(self, method_name, self.no_visit_method)
+        return method(node)
+
+    def no_visit_method(self, node):
+        raise Exception(f'No visit_{type(node).__name__} method defined')
+
+    def visit_NumberNode(self, node):
+        return node
+
+    def visit_VarAccessNode(self, node):
+        name = node.var_name_token.value
+        if name in self.constants:
+            return number_node(self.constants[name], node)
+        return node
+
+    def visit_VarAssignNode(self, node):
+        name = node.var_name_token.value
+        value_node = self.visit(node.value_node)
+
+        if isinstance(value_node, parse.NumberNode):
+            self.constants[name] = value_node.token.value
+        else:
+            self.constants.pop(name, None)
+
+        if value_node is node.value_node: return node
+        return with_span(parse.VarAssignNode(node.var_name_token, value_node), node)
+
+    def visit_BinaryOperationNode(self, node):
+        left = self.visit(node.left_node)
+        right = self.visit(node.right_node)
+
+        if isinstance(left, parse.NumberNode) and isinstance(right, parse.NumberNode):
+            value = fold_binary(node.operation_token, left.token.value, right.token.value)
+            if value is not None:
+                return number_node(value, node)
+
+        if left is node.left_node and right is node.right_node: return node
+        return with_span(parse.BinaryOperationNode(left, node.operation_token, right), node)
+
+    def visit_UnaryOperationNode(self, node):
+        operand = self.visit(node.node)
+
+        if isinstance(operand, parse.NumberNode):
+            if node.operation_token.type == lexer.TT_MINUS:
+                return number_node(-operand.token.value, node)
+            elif node.operation_token.matches(lexer.TT_KEYWORD, 'NOT'):
+                return number_node(1 if operand.token.value == 0 else 0, node)
+
+        if operand is node.node: return node
+        return with_span(parse.UnaryOperationNode(node.operation_token, operand), node)
+
+    def visit_IfNode(self, node):
+        cases = []
+        dropped_cases = []
+        branch_constants = []
+        else_case = None
+        always_taken = False
+
+        for condition, expr in node.cases:
+            condition = self.visit(condition)
+
+            if isinstance(condition, parse.NumberNode):
+                if condition.token.value == 0:
+                    dropped_cases.append((condition, expr))
+                    continue
+
+                # A constant true condition ends the chain: later cases can never run
+                else_case = self.visit_branch(expr, branch_constants)
+                always_taken = True
+                break
+
+            cases.append((condition, self.visit_branch(expr, branch_constants)))
+
+        if not always_taken:
+            if node.else_case:
+                else_case = self.visit_branch(node.else_case, branch_constants)
+            else:
+                branch_constants.append(self.constants)
+
+        self.constants = {
+            name: value for name, value in branch_constants[0].items()
+            if all(name in constants and repr(constants[name]) == repr(value) for constants in branch_constants[1:])
+        }
+
+        if not cases:
+            if else_case: return else_case
+            cases = dropped_cases[:1]
+
+        return with_span(parse.IfNode(cases, else_case), node)
+
+    def visit_branch(self, node, branch_constants):
+        outer_constants = self.constants
+        self.constants = dict(outer_constants)
+        node = self.visit(node)
+        branch_constants.append(self.constants)
+        self.constants = outer_constants
+        return node
+
+    def visit_ForNode(self, node):
+        start_value_node = self.visit(node.start_value_node)
+        end_value_node = self.visit(node.end_value_node)
+        step_value_node = self.visit(node.step_value_node) if node.step_value_node else None
+
+        # Anything the body assigns may differ between iterations, and the body may not run at all
+        for name in assigned_names(node.body_node) | {node.var_name_token.value}:
+            self.constants.pop(name, None)
+
+        outer_constants = dict(self.constants)
+        body_node = self.visit(node.body_node)
+        self.constants = outer_constants
+
+        return with_span(parse.ForNode(node.var_name_token, start_value_node, end_value_node, step_value_node, body_node), node)
+
+    def visit_WhileNode(self, node):
+        for name in assigned_names(node.condition_node) | assigned_names(node.body_node):
+            self.constants.pop(name, None)
+
+        condition_node = self.visit(node.condition_node)
+        outer_constants = dict(self.constants)
+        body_node = self.visit(node.body_node)
+        self.constants = outer_constants
+
+        return with_span(parse.WhileNode(condition_node, body_node), node)
+
+
+####################
+# LOOP INVARIANT CODE MOTION
+####################
+
+class LoopInvariantMotion:
+    # Wraps the largest subexpressions of a loop body or WHILE condition that read nothing the loop
+    # assigns in an InvariantNode, hoisted to the outermost loop they are invariant in. The value is
+    # computed where the expression first runs after the loop starts, never earlier, so a loop that
+    # runs zero times or a branch that isn't taken raises no error the original wouldn't have
+    def optimize(self, node):
+        # Each loop being visited, outermost first, as (names it assigns, invariants hoisted to it)
+        self.loops = []
+        node, _ = self.visit(node)
+        return node
+
+    def visit(self, node):
+        # Returns the new node with the names it reads, or None when it assigns or loops
+        method_name = f'visit_{type(node).__name__}'
+        method = getattr(self, method_name, self.no_visit_method)
+        return method(node)
+
+    def no_visit_method(self, node):
+        raise Exception(f'No visit_{type(node).__name__} method defined')
+
+    def target(self, names):
+        # The outermost loop that assigns none of `names`; loops further in assign a subset of what it does
+        if names is None: return None
+        for loop in self.loops:
+            if names.isdisjoint(loop[0]): return loop
+        return None
+
+    def hoisted(self, node, names, covered_by=None):
+        # Wraps `node` for its loop unless an enclosing expression hoisted to the same loop covers it
+        loop = self.target(names)
+        if loop is None or loop is covered_by: return node
+
+        if isinstance(node, parse.BinaryOperationNode) or (
+                isinstance(node, parse.UnaryOperationNode) and not isinstance(node.node, (parse.NumberNode, parse.VarAccessNode))):
+            node = parse.InvariantNode(node)
+            loop[1].append(node)
+        return node
+
+    def visit_NumberNode(self, node):
+        return node, frozenset()
+
+    def visit_VarAccessNode(self, node):
+        return node, frozenset([node.var_name_token.value])
+
+    def visit_VarAssignNode(self, node):
+        value_node = self.hoisted(*self.visit(node.value_node))
+
+        if value_node is node.value_node: return node, None
+        return with_span(parse.VarAssignNode(node.var_name_token, value_node), node), None
+
+    def visit_BinaryOperationNode(self, node):
+        left, left_names = self.visit(node.left_node)
+        right, right_names = self.visit(node.right_node)
+        names = left_names | right_names if left_names is not None and right_names is not None else None
+
+        loop = self.target(names)
+        left = self.hoisted(left, left_names, loop)
+        right = self.hoisted(right, right_names, loop)
+
+        if left is node.left_node and right is node.right_node: return node, names
+        return with_span(parse.BinaryOperationNode(left, node.operation_token, right), node), names
+
+    def visit_UnaryOperationNode(self, node):
+        # The operand reads the same names, so it is hoisted along with the operation
+        operand, names = self.visit(node.node)
+
+        if operand is node.node: return node, names
+        return with_span(parse.UnaryOperationNode(node.operation_token, operand), node), names
+
+    def visit_IfNode(self, node):
+        # An IF is never hoisted itself, since errors in its branches are reported through visit_tracked
+        cases = [(self.hoisted(*self.visit(condition)), self.hoisted(*self.visit(expr))) for condition, expr in node.cases]
+        else_case = self.hoisted(*self.visit(node.else_case)) if node.else_case else None
+
+        if else_case is node.else_case and all(new[0] is old[0] and new[1] is old[1] for new, old in zip(cases, node.cases)):
+            return node, None
+        return with_span(parse.IfNode(cases, else_case), node), None
+
+    def visit_ForNode(self, node):
+        # The bounds run once per start of the loop, so they belong to the loops around it
+        start_value_node = self.hoisted(*self.visit(node.start_value_node))
+        end_value_node = self.hoisted(*self.visit(node.end_value_node))
+        step_value_node = self.hoisted(*self.visit(node.step_value_node)) if node.step_value_node else None
+
+        loop = (assigned_names(node.body_node) | {node.var_name_token.value}, [])
+        self.loops.append(loop)
+        body_node = self.hoisted(*self.visit(node.body_node))
+        self.loops.pop()
+
+        new_node = with_span(parse.ForNode(node.var_name_token, start_value_node, end_value_node, step_value_node, body_node), node)
+        new_node.invariants = loop[1]
+        return new_node, None
+
+    def visit_WhileNode(self, node):
+        loop = (assigned_names(node.condition_node) | assigned_names(node.body_node), [])
+        self.loops.append(loop)
+        condition_node = self.hoisted(*self.visit(node.condition_node))
+        body_node = self.hoisted(*self.visit(node.body_node))
+        self.loops.pop()
+
+        new_node = with_span(parse.WhileNode(condition_node, body_node), node)
+        new_node.invariants = loop[1]
+        return new_node, None
+
+
+def optimize(node):
+    return LoopInvariantMotion().optimize(ConstantFolder().optimize(node))
@@ -80,6 +80,9 @@ class ForNode:
 		self.step_value_node = step_value_node
 		self.body_node = body_node
 
+		# InvariantNodes the optimizer hoisted to this loop; their values are forgotten each time it starts
+		self.invariants = []
+
 		self.pos_start = self.var_name_token.pos_start
 		self.pos_end = self.body_node.pos_end
 
@@ -87,311 +90,277 @@ class WhileNode:
 	def __init__(self, condition_node, body_node):
 		self.condition_node = condition_node
 		self.body_node = body_node
+		self.invariants = []
 
 		self.pos_start = self.condition_node.pos_start
 		self.pos_end = self.body_node.pos_end
 
+
+# Built by the optimizer, never by the parser: an expression that doesn't change while a loop runs.
+# It is evaluated where it first occurs and the value is reused until the loop starts again
+class InvariantNode:
+    def __init__(self, value_node):
+        self.value_node = value_node
+
+        self.pos_start = self.value_node.pos_start
+        self.pos_end = self.value_node.pos_end
+
 ####################
-# PARSE RESULT
+# VALUE ORIGIN
 ####################
 
-class ParseResult:
-    def __init__(self):
-        self.error = None
-        self.node = None
-        self.advance_count = 0
+def value_origin(node):
+    # The node whose span a runtime error about the value of `node` points at,
+    # or None when it depends on which IF branch runs
+    while isinstance(node, (VarAssignNode, InvariantNode)):
+        node = node.value_node
+
+    if isinstance(node, (IfNode, ForNode, WhileNode)):
+        return None
 
-    def register_advancement(self):
-        self.advance_count += 1
+    return node
 
-    def register(self, result):
-        self.advance_count += result.advance_count
-        if result.error: self.error = result.error
-        return result.node
 
-    def success(self, node):
+####################
+# PARSE RESULT
+####################
+
+class ParseResult:
+    def __init__(self, node=None, error=None):
         self.node = node
-        return self
+        self.error = error
+
 
-    def failure(self, error):
-        if not self.error or self.advance_count == 0:
-            self.error = error
-        return self
+####################
+# NODE BUILDER
+####################
+
+# The parser creates every node through its builder, so another tree
+# representation only needs a builder with these methods
+class NodeBuilder:
+    number_node = NumberNode
+    var_access_node = VarAccessNode
+    var_assign_node = VarAssignNode
+    binary_operation_node = BinaryOperationNode
+    unary_operation_node = UnaryOperationNode
+    if_node = IfNode
+    for_node = ForNode
+    while_node = WhileNode
 
 
 ####################
 # PARSER
 ####################
 
+LOGICAL_PRECEDENCE = 1
+COMPARISON_PRECEDENCE = 2
+
+# Binary operators by token type, or by keyword for AND/OR; '^' is parsed in factor
+BINARY_PRECEDENCE = {
+    'AND': LOGICAL_PRECEDENCE,
+    'OR': LOGICAL_PRECEDENCE,
+    lexer.TT_EEQ: COMPARISON_PRECEDENCE,
+    lexer.TT_NEQ: COMPARISON_PRECEDENCE,
+    lexer.TT_LESS: COMPARISON_PRECEDENCE,
+    lexer.TT_GREATER: COMPARISON_PRECEDENCE,
+    lexer.TT_LESS_OR_EQ: COMPARISON_PRECEDENCE,
+    lexer.TT_GREATER_OR_EQ: COMPARISON_PRECEDENCE,
+    lexer.TT_PLUS: 3,
+    lexer.TT_MINUS: 3,
+    lexer.TT_MUL: 4,
+    lexer.TT_DIV: 4,
+}
+
+
 class Parser:
-    def __init__(self, tokens):
+    def __init__(self, tokens, builder=None):
         self.tokens = tokens
+        self.builder = builder or NodeBuilder()
+        self.token_count = len(tokens)
         self.token_index = -1
         self.advance()
 
     def advance(self, ):
         self.token_index += 1
-        if self.token_index < len(self.tokens):
+        if self.token_index < self.token_count:
             self.cur_token = self.tokens[self.token_index]
         return self.cur_token
     
     def parse(self):
-        result = self.expr()
+        try:
+            node = self.expr()
+
+            if self.cur_token.type != lexer.TT_EOF:
+                raise error.InvalidSyntaxError(self.cur_token.pos_start, self.cur_token.pos_end, 
+                                               "Expected '+', '-', '*', '/', '^', '==', '!=', '<', '>', <=', '>=', 'AND' or 'OR'")
+        except error.InvalidSyntaxError as err:
+            return ParseResult(error=err)
 
-        if not result.error and self.cur_token.type != lexer.TT_EOF:
-            return result.failure(error.InvalidSynaxError(self.cur_token.pos_start, self.cur_token.pos_end, 
-                                                          "Expected '+', '-', '*', '/', '^', '==', '!=', '<', '>', <=', '>=', 'AND' or 'OR'"))
+        return ParseResult(node)
 
-        return result
+    def expect_keyword(self, value):
+        if not self.cur_token.matches(lexer.TT_KEYWORD, value):
+            raise error.InvalidSyntaxError(self.cur_token.pos_start, self.cur_token.pos_end, f"Expected '{value}'")
+        self.advance()
     
     def if_expr(self):
-        result = ParseResult()
         cases = []
         else_case = None
 
-        if not self.cur_token.matches(lexer.TT_KEYWORD, 'IF'):
-            return result.failure(error.InvalidSyntaxError(self.cur_token.pos_start, self.cur_token.pos_end, f"Expected 'IF'"))
-
-        result.register_advancement()
-        self.advance()
-        condition = result.register(self.expr())
-        if result.error: return result
-
-        if not self.cur_token.matches(lexer.TT_KEYWORD, 'THEN'):
-            return result.failure(error.InvalidSyntaxError(self.cur_token.pos_start, self.cur_token.pos_end, f"Expected 'THEN'"))
-
-        result.register_advancement()
-        self.advance()
-        expr = result.register(self.expr())
-        if result.error: return result
-        cases.append((condition, expr))
+        self.expect_keyword('IF')
+        condition = self.expr()
+        self.expect_keyword('THEN')
+        cases.append((condition, self.expr()))
 
         while self.cur_token.matches(lexer.TT_KEYWORD, 'ELIF'):
-            result.register_advancement()
             self.advance()
-            condition = result.register(self.expr())
-
-            if result.error: return result
-            if not self.cur_token.matches(lexer.TT_KEYWORD, 'THEN'):
-                return result.failure(error.InvalidSyntaxError(self.cur_token.pos_start, self.cur_token.pos_end,f"Expected 'THEN'"))
-
-            result.register_advancement()
-            self.advance()
-            expr = result.register(self.expr())
-            if result.error: return result
-            cases.append((condition, expr))
+            condition = self.expr()
+            self.expect_keyword('THEN')
+            cases.append((condition, self.expr()))
 
         if self.cur_token.matches(lexer.TT_KEYWORD, 'ELSE'):
-            result.register_advancement()
             self.advance()
-            else_case = result.register(self.expr())
-            if result.error: return result
+            else_case = self.expr()
 
-        return result.success(IfNode(cases, else_case))
+        return self.builder.if_node(cases, else_case)
     
     def for_expr(self):
-        result = ParseResult()
-
-        if not self.cur_token.matches(lexer.TT_KEYWORD, 'FOR'):
-            return result.failure(error.InvalidSyntaxError(self.cur_token.pos_start, self.cur_token.pos_end, f"Expected 'FOR'"))
-
-        result.register_advancement()
-        self.advance()
+        self.expect_keyword('FOR')
 
         if self.cur_token.type != lexer.TT_IDENTIFIER:
-            return result.failure(error.InvalidSyntaxError(self.cur_token.pos_start, self.cur_token.pos_end, f"Expected identifier"))
+            raise error.InvalidSyntaxError(self.cur_token.pos_start, self.cur_token.pos_end, f"Expected identifier")
 
         var_name = self.cur_token
-        result.register_advancement()
         self.advance()
 
         if self.cur_token.type != lexer.TT_EQ:
-            return result.failure(error.InvalidSyntaxError(self.cur_token.pos_start, self.cur_token.pos_end, f"Expected '='"))
+            raise error.InvalidSyntaxError(self.cur_token.pos_start, self.cur_token.pos_end, f"Expected '='")
         
-        result.register_advancement()
         self.advance()
-        start_value = result.register(self.expr())
-        if result.error: return result
+        start_value = self.expr()
 
-        if not self.cur_token.matches(lexer.TT_KEYWORD, 'TO'):
-            return result.failure(error.InvalidSyntaxError(self.cur_token.pos_start, self.cur_token.pos_end, f"Expected 'TO'"))
-        
-        result.register_advancement()
-        self.advance()
-        end_value = result.register(self.expr())
-        if result.error: return result
+        self.expect_keyword('TO')
+        end_value = self.expr()
 
         if self.cur_token.matches(lexer.TT_KEYWORD, 'STEP'):
-            result.register_advancement()
             self.advance()
-
-            step_value = result.register(self.expr())
-            if result.error: return result
+            step_value = self.expr()
         else:
             step_value = None
 
-        if not self.cur_token.matches(lexer.TT_KEYWORD, 'THEN'):
-            return result.failure(error.InvalidSyntaxError(self.cur_token.pos_start, self.cur_token.pos_end, f"Expected 'THEN'"))
+        self.expect_keyword('THEN')
+        body = self.expr()
 
-        result.register_advancement()
-        self.advance()
-        body = result.register(self.expr())
-        if result.error: return result
-
-        return result.success(ForNode(var_name, start_value, end_value, step_value, body))
+        return self.builder.for_node(var_name, start_value, end_value, step_value, body)
 
     def while_expr(self):
-        result = ParseResult()
-
-        if not self.cur_token.matches(lexer.TT_KEYWORD, 'WHILE'):
-            return result.failure(error.InvalidSyntaxError(self.cur_token.pos_start, self.cur_token.pos_end, f"Expected 'WHILE'"))
-
-        result.register_advancement()
-        self.advance()
-        condition = result.register(self.expr())
-        if result.error: return result
-
-        if not self.cur_token.matches(lexer.TT_KEYWORD, 'THEN'):
-            return result.failure(error.InvalidSyntaxError(self.cur_token.pos_start, self.cur_token.pos_end, f"Expected 'THEN'"))
-
-        result.register_advancement()
-        self.advance()
-        body = result.register(self.expr())
-        if result.error: return result
-        return result.success(WhileNode(condition, body))
+        self.expect_keyword('WHILE')
+        condition = self.expr()
+        self.expect_keyword('THEN')
+        body = self.expr()
+        return self.builder.while_node(condition, body)
     
     def atom(self):
-        result = ParseResult()
         token = self.cur_token
 
         if token.type in (lexer.TT_INT, lexer.TT_FLOAT):
-            result.register_advancement()
             self.advance()
-            return result.success(NumberNode(token))
+            return self.builder.number_node(token)
         
-        elif token.type in lexer.TT_IDENTIFIER:
-            result.register_advancement()
+        elif token.type == lexer.TT_IDENTIFIER:
             self.advance()
-            return result.success(VarAccessNode(token))
+            return self.builder.var_access_node(token)
         
-        elif token.type in lexer.TT_LPAREN:
-            result.register_advancement()
+        elif token.type == lexer.TT_LPAREN:
             self.advance()
-            expr = result.register(self.expr())
-            if result.error: return result
+            expr = self.expr()
             if self.cur_token.type == lexer.TT_RPAREN:
-                result.register_advancement()
                 self.advance()
-                return result.success(expr)
+                return expr
             else:
-                return result.failure(error.InvalidSynaxError(self.cur_token.pos_start, self.cur_token.pos_end, "Expected ')'"))
+                raise error.InvalidSyntaxError(self.cur_token.pos_start, self.cur_token.pos_end, "Expected ')'")
             
         elif token.matches(lexer.TT_KEYWORD, 'IF'):
-            if_expr = result.register(self.if_expr())
-            if result.error: return result
-            return result.success(if_expr)
+            return self.if_expr()
         
         elif token.matches(lexer.TT_KEYWORD, 'FOR'):
-            for_expr = result.register(self.for_expr())
-            if result.error: return result
-            return result.success(for_expr)
+            return self.for_expr()
 
         elif token.matches(lexer.TT_KEYWORD, 'WHILE'):
-            while_expr = result.register(self.while_expr())
-            if result.error: return result
-            return result.success(while_expr)
-
-        return result.failure(error.InvalidSynaxError(
-            token.pos_start, token.pos_end, "Expected int, float, identifier, '+', '-', or '('"))
-    
-    def power(self):
-        return self.binary_operation(self.atom, (lexer.TT_POW, ), self.factor)
+            return self.while_expr()
 
+        raise error.InvalidSyntaxError(
+            token.pos_start, token.pos_end, "Expected int, float, identifier, '+', '-', or '('")
     
     def factor(self):
-        result = ParseResult()
         token = self.cur_token
 
-        if token.type in (lexer.TT_PLUS, lexer.TT_MINUS):
-            result.register_advancement()
+        if token.type == lexer.TT_PLUS or token.type == lexer.TT_MINUS:
             self.advance()
-            factor =  result.register(self.factor())
-            if result.error: return result
-            return result.success(UnaryOperationNode(token, factor)) 
-        
-        return self.power()
-    
-    def term(self):
-        return self.binary_operation(self.factor, (lexer.TT_MUL, lexer.TT_DIV))
-    
-    def arith_expr(self):
-            return self.binary_operation(self.term, (lexer.TT_PLUS, lexer.TT_MINUS))
+            return self.builder.unary_operation_node(token, self.factor())
 
-    def comp_expr(self):
-        result = ParseResult()
+        # pow: atom (POW factor)*, where the factor makes '^' right-associative
+        left = self.atom()
 
-        if self.cur_token.matches(lexer.TT_KEYWORD, 'NOT'):
-            op_token = self.cur_token
-            result.register_advancement()
+        while self.cur_token.type == lexer.TT_POW:
+            operation_token = self.cur_token
             self.advance()
+            left = self.builder.binary_operation_node(left, operation_token, self.factor())
 
-            node = result.register(self.comp_expr())
-            if result.error: return result
-            return result.success(UnaryOperationNode(op_token, node))
-        
-        node = result.register(self.binary_operation(self.arith_expr, (
-            lexer.TT_EEQ, lexer.TT_NEQ, lexer.TT_LESS, lexer.TT_GREATER, lexer.TT_LESS_OR_EQ, lexer.TT_GREATER_OR_EQ)))
-        
-        if result.error:
-            return result.failure(error.InvalidSyntaxError(self.cur_token.pos_start, self.cur_token.pos_end, 
-                                                           "Expected int, float, identifier, '+', '-', '(' or 'NOT'"))
+        return left
 
-        return result.success(node)
+    def binary_expr(self, min_precedence):
+        token = self.cur_token
 
+        if min_precedence <= COMPARISON_PRECEDENCE and token.matches(lexer.TT_KEYWORD, 'NOT'):
+            self.advance()
+            left = self.builder.unary_operation_node(token, self.comp_expr())
+        else:
+            left = self.factor()
 
-    def expr(self):
-        result = ParseResult()
+        # Climb while the next operator binds at least as tightly as this level;
+        # every operator here is left-associative
+        while True:
+            operation_token = self.cur_token
+            token_type = operation_token.type
+            precedence = BINARY_PRECEDENCE.get(operation_token.value if token_type == lexer.TT_KEYWORD else token_type, 0)
+            if precedence < min_precedence: return left
+
+            self.advance()
+            if precedence == LOGICAL_PRECEDENCE: right = self.comp_expr()
+            else: right = self.binary_expr(precedence + 1)
+            left = self.builder.binary_operation_node(left, operation_token, right)
+
+    def comp_expr(self):
+        start_index = self.token_index
+        try:
+            return self.binary_expr(COMPARISON_PRECEDENCE)
+        except error.InvalidSyntaxError:
+            # A failure before any token was consumed is reported with this rule's expectations
+            if self.token_index != start_index: raise
+            raise error.InvalidSyntaxError(self.cur_token.pos_start, self.cur_token.pos_end, 
+                                           "Expected int, float, identifier, '+', '-', '(' or 'NOT'")
 
+    def expr(self):
         if self.cur_token.matches(lexer.TT_KEYWORD, 'VAR'):
-            result.register_advancement()
             self.advance()
 
             if self.cur_token.type != lexer.TT_IDENTIFIER:
-                return result.failure(lexer.InvalidSyntaxError(self.cur_token.pos_start, self.cur_token.pos_end, "Expected identifier"))
+                raise error.InvalidSyntaxError(self.cur_token.pos_start, self.cur_token.pos_end, "Expected identifier")
             
             var_name = self.cur_token
-            result.register_advancement()
             self.advance()
 
             if self.cur_token.type != lexer.TT_EQ:
-                return result.failure(lexer.InvalidSyntaxError(self.cur_token.pos_start, self.cur_token.pos_end, "Expected '='"))
+                raise error.InvalidSyntaxError(self.cur_token.pos_start, self.cur_token.pos_end, "Expected '='")
             
-            result.register_advancement()
             self.advance()
-            expr = result.register(self.expr())
-            if result.error: return result
-            return result.success(VarAssignNode(var_name, expr))
+            return self.builder.var_assign_node(var_name, self.expr())
             
-        node = result.register(self.binary_operation(self.comp_expr, ((lexer.TT_KEYWORD, 'AND'), (lexer.TT_KEYWORD, 'OR'))))
-
-        if result.error: return result.failure(error.InvalidSyntaxError(
-                self.cur_token.pos_start, self.cur_token.pos_end, "Expected 'Var', 'Identifier', int, float, '+', '-' or '('"))
-        return result.success(node)
-
-    def binary_operation(self, func_a, operations, func_b=None):
-        if func_b == None:
-            func_b = func_a
-
-        result = ParseResult()
-        left = result.register(func_a())
-        if result.error: return result
-
-        while self.cur_token.type in operations or (self.cur_token.type, self.cur_token.value) in operations:
-            operation_token = self.cur_token
-            result.register_advancement()
-            self.advance()
-            right = result.register(func_b())
-            if result.error: return result
-            left = BinaryOperationNode(left, operation_token, right)
-
-        return result.success(left)
\ No newline at end of file
+        start_index = self.token_index
+        try:
+            return self.binary_expr(LOGICAL_PRECEDENCE)
+        except error.InvalidSyntaxError:
+            if self.token_index != start_index: raise
+            raise error.InvalidSyntaxError(
+                self.cur_token.pos_start, self.cur_token.pos_end, "Expected 'Var', 'Identifier', int, float, '+', '-' or '('")
@@ -0,0 +1,187 @@
+##########
+# IMPORTS
+##########
+
+from string_with_arrows import *
+import argparse
+import interpreter
+import lexer
+import shell
+import sys
+import time
+
+
+####################
+# NODE STATS
+####################
+
+class NodeStats:
+    __slots__ = ('node', 'hits', 'self_time', 'total_time')
+
+    def __init__(self, node):
+        self.node = node
+        self.hits = 0
+        self.self_time = 0.0
+        self.total_time = 0.0
+
+
+def node_label(node):
+    # A short frame name: node kind, what it operates on and where it starts
+    kind = type(node).__name__.removesuffix('Node')
+    token = getattr(node, 'operation_token', None) or getattr(node, 'var_name_token', None) or getattr(node, 'token', None)
+    detail = f' {token.value if token.value is not None else token.type}' if token else ''
+    return f'{kind}{detail} {node.pos_start.line_num + 1}:{node.pos_start.col_num + 1}'
+
+
+####################
+# PROFILING INTERPRETER
+####################
+
+# Timing lives in this subclass only, so the plain Interpreter pays nothing for it
+class ProfilingInterpreter(interpreter.Interpreter):
+    def __init__(self, vectorize=True, clock=time.perf_counter):
+        super().__init__(vectorize)
+        self.clock = clock
+        self.stats = {}
+        self.sites = {}
+
+        # Every distinct stack of nodes gets a path id: (parent path id, node) -> id
+        self.path_ids = {}
+        self.paths = [None]
+        self.path_times = [0.0]
+        self.current_path = 0
+        self.child_times = [0.0]
+
+    def visit(self, node, context):
+        stats = self.stats.get(node)
+        if stats is None:
+            stats = self.stats[node] = NodeStats(node)
+
+        parent_path = self.current_path
+        path = self.path_ids.get((parent_path, node))
+        if path is None:
+            path = self.path_ids[(parent_path, node)] = len(self.paths)
+            self.paths.append((parent_path, node))
+            self.path_times.append(0.0)
+
+        self.current_path = path
+        self.child_times.append(0.0)
+        start = self.clock()
+
+        try:
+            return interpreter.Interpreter.visit(self, node, context)
+        finally:
+            elapsed = self.clock() - start
+            self_time = elapsed - self.child_times.pop()
+            self.child_times[-1] += elapsed
+            self.current_path = parent_path
+
+            stats.hits += 1
+            stats.self_time += self_time
+            stats.total_time += elapsed
+            self.path_times[path] += self_time
+
+    def top(self, limit=10):
+        return sorted(self.stats.values(), key=lambda stats: stats.self_time, reverse=True)[:limit]
+
+    def report(self, limit=10):
+        total = sum(stats.self_time for stats in self.stats.values()) or 1.0
+        lines = []
+
+        for rank, stats in enumerate(self.top(limit), 1):
+            node = stats.node
+            lines.append(f'#{rank} {node_label(node)} in {node.pos_start.file_name}: {stats.hits} hits, '
+                         f'self {stats.self_time * 1000:.3f} ms ({stats.self_time / total:.1%}), '
+                         f'total {stats.total_time * 1000:.3f} ms')
+            lines.append(string_with_arrows(node.pos_start.file_text, node.pos_start, node.pos_end))
+            lines.append('')
+
+        return '\n'.join(lines)
+
+    def collapsed_stacks(self):
+        # One `frame;frame;frame microseconds` line per stack, as flamegraph.pl and speedscope read it
+        labels = {}
+        lines = []
+
+        for path in range(1, len(self.paths)):
+            parent_path, node = self.paths[path]
+            labels[path] = node_label(node) if parent_path == 0 else f'{labels[parent_path]};{node_label(node)}'
+
+            microseconds = round(self.path_times[path] * 1e6)
+            if microseconds > 0:
+                lines.append(f'{labels[path]} {microseconds}')
+
+        return '\n'.join(lines) + '\n' if lines else ''
+
+
+####################
+# INLINE CACHES
+####################
+
+def site_report(sites, limit=10):
+    # The busiest binary operation sites, given as node -> Site, with the form they run in and how often their guard held
+    lines = []
+
+    operations = [(node, site) for node, site in sites.items() if not site.divides]
+    for node, site in sorted(operations, key=lambda item: item[1].runs, reverse=True)[:limit]:
+        guarded = site.hits + site.misses
+        rate = f'{site.hits / guarded:.1%} hit rate' if guarded else 'never specialised'
+        lines.append(f'{node_label(node)}: {site.describe()}, {site.runs} runs, {site.hits} hits, '
+                     f'{site.misses} misses, {site.generic_runs} before specialising ({rate})')
+
+    return '\n'.join(lines)
+
+
+####################
+# PROFILE
+####################
+
+def run_line(file_name, text, line_num, symbol_table, interp, optimize=True):
+    # shell.run for one line of a program file; the line's source keeps its place in the file, so
+    # frames on different lines get their own labels
+    tokens, err = lexer.Lexer(file_name, text, line_num).create_tokens()
+    if err: return None, err
+
+    ast = shell.parse_tokens(tokens, 'interpreter')
+    if ast.error: return None, ast.error
+
+    context = interpreter.Context('<program>')
+    context.symbol_table = symbol_table
+    return shell.evaluate(ast.node, context, 'interpreter', optimize, interp)
+
+
+def main(argv=None):
+    arg_parser = argparse.ArgumentParser(description='Profile an imp program per AST node.')
+    arg_parser.add_argument('path', help='program file; each line runs like REPL input')
+    arg_parser.add_argument('-n', '--top', type=int, default=10, help='number of spans to report')
+    arg_parser.add_argument('--collapsed', metavar='FILE', help='write collapsed stacks for flamegraph tools')
+    arg_parser.add_argument('--sites', action='store_true', help='report inline cache hits and misses per operation')
+    arg_parser.add_argument('--no-optimize', dest='optimize', action='store_false', help='skip constant folding')
+    args = arg_parser.parse_args(argv)
+
+    with open(args.path) as file:
+        lines = file.read().splitlines()
+
+    interp = ProfilingInterpreter()
+    symbol_table = interpreter.SymbolTable()
+
+    for line_num, text in enumerate(lines):
+        if not text.strip(): continue
+
+        _, err = run_line(args.path, text, line_num, symbol_table, interp, args.optimize)
+        if err:
+            print(err.as_string(), file=sys.stderr)
+            break
+
+    print(interp.report(args.top))
+
+    if args.sites:
+        print(site_report(interp.sites, args.top))
+
+    if args.collapsed:
+        with open(args.collapsed, 'w') as file:
+            file.write(interp.collapsed_stacks())
+
+
+if __name__ == '__main__':
+    main()
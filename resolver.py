@@ -0,0 +1,162 @@
+##########
+# IMPORTS
+##########
+
+import lexer
+import parse
+import vectorize
+
+
+####################
+# SCOPE
+####################
+
+class Scope:
+    # Every distinct variable name in a program gets one slot in a frame list
+    def __init__(self):
+        self.names = []
+        self.slots = {}
+        self.stored_slots = []
+
+    def slot(self, name):
+        slot = self.slots.get(name)
+        if slot is None:
+            slot = self.slots[name] = len(self.names)
+            self.names.append(name)
+        return slot
+
+    def invariant_slot(self):
+        # Hoisted loop invariants get unnamed slots, which start out empty
+        self.names.append(None)
+        return len(self.names) - 1
+
+    def store_slot(self, name):
+        slot = self.slot(name)
+        if slot not in self.stored_slots:
+            self.stored_slots.append(slot)
+        return slot
+
+    def load(self, symbol_table):
+        # The frame starts out with whatever the symbol table holds, so REPL globals carry over
+        return [symbol_table.get(name) if name is not None else None for name in self.names]
+
+    def store(self, frame, symbol_table):
+        # Storing None goes straight to the symbol table, so only numbers are written back
+        for slot in self.stored_slots:
+            if frame[slot] is not None:
+                symbol_table.set(self.names[slot], frame[slot])
+
+
+####################
+# RESOLVER
+####################
+
+class Resolver:
+    def resolve(self, node):
+        self.scope = Scope()
+        self.visit(node)
+        return self.scope
+
+    def visit(self, node):
+        method_name = f'visit_{type(node).__name__}'
+        method = getattr(self, method_name, self.no_visit_method)
+        return method(node)
+
+    def no_visit_method(self, node):
+        raise Exception(f'No visit_{type(node).__name__} method defined')
+
+    def visit_NumberNode(self, node):
+        pass
+
+    def visit_VarAccessNode(self, node):
+        node.slot = self.scope.slot(node.var_name_token.value)
+
+    def visit_VarAssignNode(self, node):
+        node.slot = self.scope.store_slot(node.var_name_token.value)
+        self.visit(node.value_node)
+
+    def visit_BinaryOperationNode(self, node):
+        self.visit(node.left_node)
+        self.visit(node.right_node)
+
+    def visit_UnaryOperationNode(self, node):
+        self.visit(node.node)
+
+    def visit_IfNode(self, node):
+        for condition, expr in node.cases:
+            self.visit(condition)
+            self.visit(expr)
+        if node.else_case:
+            self.visit(node.else_case)
+
+    def visit_ForNode(self, node):
+        node.slot = self.scope.store_slot(node.var_name_token.value)
+        self.visit(node.start_value_node)
+        self.visit(node.end_value_node)
+        if node.step_value_node:
+            self.visit(node.step_value_node)
+        self.visit(node.body_node)
+        node.accumulation = accumulation(node)
+        node.reduction = vectorize.reduction(node)
+
+    def visit_WhileNode(self, node):
+        self.visit(node.condition_node)
+        self.visit(node.body_node)
+
+    def visit_InvariantNode(self, node):
+        node.slot = self.scope.invariant_slot()
+        self.visit(node.value_node)
+
+
+####################
+# INDUCTION VARIABLES
+####################
+
+LINEAR_OPERATIONS = {
+    lexer.TT_PLUS: 'add',
+    lexer.TT_MINUS: 'sub',
+    lexer.TT_MUL: 'mul',
+}
+
+
+def accumulation(node):
+    # Recognises `FOR i = ... THEN VAR s = f(s, i)` where f is built from int literals, s, i and names
+    # the body doesn't assign with +, - and *; returns (slot of s, linear form of f)
+    body = node.body_node
+    if not isinstance(body, parse.VarAssignNode) or body.slot == node.slot: return None
+
+    form = linear_form(body.value_node, node.slot, body.slot)
+    if form is None: return None
+    return body.slot, form
+
+
+def linear_form(node, loop_slot, target_slot):
+    # Whether the form really is linear depends on the values of the names in it, so the
+    # interpreter checks that when the loop runs
+    if isinstance(node, parse.InvariantNode):
+        return linear_form(node.value_node, loop_slot, target_slot)
+
+    if isinstance(node, parse.NumberNode):
+        if type(node.token.value) is not int: return None
+        return ('const', node.token.value)
+
+    if isinstance(node, parse.VarAccessNode):
+        if node.slot == loop_slot: return ('induction',)
+        if node.slot == target_slot: return ('target',)
+        return ('var', node.slot)
+
+    if isinstance(node, parse.UnaryOperationNode):
+        if node.operation_token.type not in (lexer.TT_PLUS, lexer.TT_MINUS): return None
+        operand = linear_form(node.node, loop_slot, target_slot)
+        if operand is None: return None
+        return operand if node.operation_token.type == lexer.TT_PLUS else ('neg', operand)
+
+    if isinstance(node, parse.BinaryOperationNode):
+        operation = LINEAR_OPERATIONS.get(node.operation_token.type)
+        if operation is None: return None
+        left = linear_form(node.left_node, loop_slot, target_slot)
+        right = linear_form(node.right_node, loop_slot, target_slot)
+        if left is None or right is None: return None
+        return (operation, left, right)
+
+    return None
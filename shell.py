@@ -1,35 +1,87 @@
+import cache
+import closures
+import compiler
+import flat_ast
 import interpreter
+import iterative
 import lexer
+import optimizer
 import parse
+import transpiler
+import vm
 
 global_symbol_table = interpreter.SymbolTable()
 
-def run(file_name, text):
-    # Generate tokens
-    lex = lexer.Lexer(file_name, text)
-    tokens, error = lex.create_tokens()
-    if error: return None, error
+def run(file_name, text, engine='interpreter', optimize=True, use_cache=False, symbol_table=None, interp=None):
+    # Load or generate a Python module for the program; a cached one skips every stage below
+    if engine == 'transpile':
+        program, err = transpiler.load(file_name, text, optimize)
+        if err: return None, err
 
-    # return tokens, error
+        context = interpreter.Context('<program>')
+        context.symbol_table = symbol_table or global_symbol_table
+        return program.run(context)
 
-    # Generate AST
-    parser = parse.Parser(tokens)
-    ast = parser.parse()
-    if ast.error: return None, ast.error
-  
-    # return ast.node, ast.error
+    # Read the AST back from the parse cache, which generates and stores it on a miss
+    if use_cache:
+        tree, err = cache.load(file_name, text, iterative.IterativeParser if engine == 'iterative' else parse.Parser)
+        if err: return None, err
+        root = tree if engine == 'flat' else flat_ast.to_nodes(tree)
+    else:
+        # Generate tokens
+        lex = lexer.Lexer(file_name, text)
+        tokens, err = lex.create_tokens()
+        if err: return None, err
+
+        # return tokens, err
+
+        ast = parse_tokens(tokens, engine)
+        if ast.error: return None, ast.error
+
+        # return ast.node, ast.error
+        root = ast.node
 
-    # Generate Interpreter
-    interp = interpreter.Interpreter()
     context = interpreter.Context('<program>')
-    context.symbol_table = global_symbol_table
-    result = interp.visit(ast.node, context)
+    context.symbol_table = symbol_table or global_symbol_table
+    return evaluate(root, context, engine, optimize, interp)
+
+def parse_tokens(tokens, engine='interpreter'):
+    # Generate AST; the flat engine parses into flat columns instead of node objects
+    if engine == 'flat':
+        return flat_ast.parse_tokens(tokens)
+    elif engine == 'iterative':
+        return iterative.IterativeParser(tokens).parse()
+    return parse.Parser(tokens).parse()
+
+def evaluate(root, context, engine='interpreter', optimize=True, interp=None):
+    # Evaluate the flat columns directly; the optimizer works on node objects and is skipped
+    if engine == 'flat':
+        return flat_ast.FlatInterpreter().run(root, context)
+
+    # Evaluate on an explicit stack; the optimizer and resolver recurse, so the tree runs as parsed
+    if engine == 'iterative':
+        return iterative.IterativeInterpreter().run(root, context)
+
+    # Fold constant subtrees and propagate constant variables
+    node = optimizer.optimize(root) if optimize else root
+
+    # Compile to bytecode and run on the stack VM
+    if engine == 'vm':
+        chunk = compiler.Compiler().compile(node)
+        return vm.VM().run(chunk, context)
+
+    # Compile to nested Python closures and call them
+    if engine == 'closure':
+        program = closures.ClosureCompiler().compile(node)
+        return program.run(context)
 
-    return result.value, result.error
+    # Generate Interpreter; a profiling subclass can be passed in as interp
+    return (interp or interpreter.Interpreter()).run(node, context)
 
-while True:
-    text = input('imp > ')
-    result, err = run('<stdin>', text)
+if __name__ == '__main__':
+    while True:
+        text = input('imp > ')
+        result, err = run('<stdin>', text)
 
-    if err: print(err.as_string())
-    elif result: print(result)
+        if err: print(err.as_string())
+        elif result: print(result)
@@ -0,0 +1,177 @@
+##########
+# IMPORTS
+##########
+
+from array import array
+import bisect
+import interpreter
+import marshal
+import mmap
+import os
+import struct
+import sys
+
+
+##########
+# CONSTANTS
+##########
+
+FORMAT_VERSION = 1
+MAGIC = b'IMPS'
+
+# Magic, version, number of variables, size of the names block
+HEADER = struct.Struct('<4sI2Q')
+
+# Every variable has an 8 byte little-endian slot: an int that fits in 64 bits, a float, or for
+# anything else (None, larger ints, complex powers) an index into a marshalled list at the end
+KIND_INT = 0
+KIND_FLOAT = 1
+KIND_OTHER = 2
+
+INT_MIN = -2 ** 63
+INT_MAX = 2 ** 63 - 1
+
+
+####################
+# SAVE
+####################
+
+def save(symbol_table, path):
+    # Writes the table's own variables, not its parent's; the file replaces `path` atomically
+    if isinstance(symbol_table, SnapshotTable): symbol_table.read_all()
+
+    names = sorted(symbol_table.symbols)
+    kinds = bytearray(len(names))
+    slots = array('q', bytes(8 * len(names)))
+    others = []
+
+    with memoryview(slots) as raw, raw.cast('B') as data, data.cast('d') as floats:
+        for index, name in enumerate(names):
+            if '\n' in name: raise ValueError(f'Cannot save variable name {name!r}')
+            number = symbol_table.symbols[name]
+            value = None if number is None else number.value
+
+            if type(value) is int and INT_MIN <= value <= INT_MAX:
+                slots[index] = value
+            elif type(value) is float:
+                kinds[index] = KIND_FLOAT
+                floats[index] = value
+            else:
+                kinds[index] = KIND_OTHER
+                slots[index] = len(others)
+                others.append(value)
+
+    if sys.byteorder != 'little': slots.byteswap()
+
+    names_block = '\n'.join(names).encode()
+    padding = b'\0' * (-(HEADER.size + len(names_block)) % 8)
+
+    temp_path = f'{path}.{os.getpid()}.tmp'
+    with open(temp_path, 'wb') as file:
+        file.write(HEADER.pack(MAGIC, FORMAT_VERSION, len(names), len(names_block)))
+        file.write(names_block)
+        file.write(padding)
+        file.write(slots.tobytes())
+        file.write(kinds)
+        file.write(marshal.dumps(others))
+    os.replace(temp_path, path)
+
+
+####################
+# LOAD
+####################
+
+def load(path):
+    # Maps the file and copies its columns out in bulk; a file that isn't a valid snapshot raises ValueError
+    with open(path, 'rb') as file, mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as data:
+        if len(data) < HEADER.size: raise ValueError(f'{path} is not a symbol table snapshot')
+
+        magic, version, count, names_size = HEADER.unpack_from(data)
+        if magic != MAGIC or version != FORMAT_VERSION:
+            raise ValueError(f'{path} is not a symbol table snapshot of version {FORMAT_VERSION}')
+
+        slots_start = HEADER.size + names_size + (-(HEADER.size + names_size) % 8)
+        kinds_start = slots_start + 8 * count
+        others_start = kinds_start + count
+        if others_start > len(data): raise ValueError(f'{path} is truncated')
+
+        names = data[HEADER.size:HEADER.size + names_size].decode().split('\n') if count else []
+        kinds = data[kinds_start:others_start]
+        slots = array('q')
+        with memoryview(data) as view, view[slots_start:kinds_start] as raw:
+            slots.frombytes(raw)
+
+        try:
+            others = marshal.loads(data[others_start:])
+        except (EOFError, ValueError, TypeError):
+            raise ValueError(f'{path} is truncated') from None
+
+    if len(names) != count or not isinstance(others, list) or max(kinds, default=0) > KIND_OTHER:
+        raise ValueError(f'{path} is corrupt')
+
+    if sys.byteorder != 'little': slots.byteswap()
+
+    # Slots of other values index the marshalled list; only those are checked, so numbers cost nothing
+    index = kinds.find(KIND_OTHER)
+    while index >= 0:
+        if not 0 <= slots[index] < len(others): raise ValueError(f'{path} is corrupt')
+        index = kinds.find(KIND_OTHER, index + 1)
+
+    return SnapshotTable(names, kinds, slots, others)
+
+
+####################
+# SNAPSHOT TABLE
+####################
+
+# A restored table. Loading only copies the columns; each variable becomes a Number the first time
+# its name is read, so a restore costs about the same whether the program uses ten variables or all of them
+class SnapshotTable(interpreter.SymbolTable):
+    def __init__(self, names, kinds, slots, others):
+        super().__init__()
+        self.names = names
+        self.kinds = kinds
+        self.slots = slots
+        self.floats = memoryview(slots).cast('B').cast('d')
+        self.others = others
+
+        # Names read, set or removed since the restore no longer come from the snapshot
+        self.unread = bytearray(b'\1') * len(names)
+
+    def take(self, name):
+        # The snapshot index of `name` the first time it is used, otherwise None
+        names = self.names
+        index = bisect.bisect_left(names, name)
+        if index < len(names) and names[index] == name and self.unread[index]:
+            self.unread[index] = 0
+            return index
+        return None
+
+    def value(self, index):
+        kind = self.kinds[index]
+        if kind == KIND_INT: return interpreter.make_number(self.slots[index])
+        if kind == KIND_FLOAT: return interpreter.Number(self.floats[index])
+
+        value = self.others[self.slots[index]]
+        return None if value is None else interpreter.make_number(value)
+
+    def get(self, name):
+        if name not in self.symbols:
+            index = self.take(name)
+            if index is not None: self.symbols[name] = self.value(index)
+        return super().get(name)
+
+    def set(self, name, value):
+        if name not in self.symbols: self.take(name)
+        self.symbols[name] = value
+
+    def remove(self, name):
+        self.get(name)
+        super().remove(name)
+
+    def read_all(self):
+        # Makes `symbols` hold every variable, as it would after an eager restore
+        for index, name in enumerate(self.names):
+            if self.unread[index]:
+                self.unread[index] = 0
+                self.symbols[name] = self.value(index)
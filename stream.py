@@ -0,0 +1,124 @@
+##########
+# IMPORTS
+##########
+
+import argparse
+import interpreter
+import lexer
+import mmap
+import os
+import re
+import shell
+import sys
+
+
+##########
+# CONSTANTS
+##########
+
+# A statement ends at a newline or at a separator, so one line can hold several
+BOUNDARY = re.compile(rb'[\n;]')
+
+# Bytes of the mapping scanned for statement boundaries at a time
+CHUNK_BYTES = 1024 * 1024
+
+# The transpiler compiles and caches whole program texts, which doesn't suit one module per statement
+ENGINES = ('interpreter', 'vm', 'closure', 'flat', 'iterative')
+
+# Bytes read between two releases of the mapped pages behind them
+RELEASE_BYTES = 4 * 1024 * 1024
+
+
+####################
+# STREAM
+####################
+
+def statement_texts(path):
+    # Yields (line index, bytes) for each statement of the file. The mapping is read CHUNK_BYTES at a time,
+    # and only the part of a statement that runs past the chunks read so far is carried over, so memory
+    # depends on the longest statement rather than on the file or its lines
+    with open(path, 'rb') as file:
+        if os.fstat(file.fileno()).st_size == 0: return
+
+        with mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as data:
+            size = len(data)
+            line = 0
+            pending = []
+            released = 0
+
+            for offset in range(0, size, CHUNK_BYTES):
+                chunk = data[offset:offset + CHUNK_BYTES]
+                start = 0
+
+                for match in BOUNDARY.finditer(chunk):
+                    pending.append(chunk[start:match.start()])
+                    yield line, b''.join(pending)
+                    pending = []
+
+                    if match.group() == b'\n': line += 1
+                    start = match.end()
+
+                pending.append(chunk[start:])
+                del chunk
+
+                # Pages already read still count as resident until they are dropped
+                done = min(offset + CHUNK_BYTES, size) // mmap.PAGESIZE * mmap.PAGESIZE
+                if done - released >= RELEASE_BYTES and hasattr(data, 'madvise'):
+                    data.madvise(mmap.MADV_DONTNEED, released, done - released)
+                    released = done
+
+            if any(pending): yield line, b''.join(pending)
+
+
+def run_file(path, symbol_table=None, engine='interpreter', optimize=True):
+    # Runs every statement of the file in order against one symbol table and yields
+    # (line number, value, error) for each nonblank one
+    if engine not in ENGINES: raise ValueError(f'Engine {engine!r} cannot stream; use one of {", ".join(ENGINES)}')
+    if symbol_table is None: symbol_table = interpreter.SymbolTable()
+
+    for line_num, raw in statement_texts(path):
+        # A CRLF line ending leaves its CR on the statement before it
+        text = raw.decode(errors='replace').rstrip('\r')
+        if not text.strip(): continue
+
+        # Each statement is lexed as a text of its own, so positions index into it exactly as they would
+        # in shell.run, and line numbers count from its place in the file
+        tokens, err = lexer.Lexer(path, text, line_num).create_tokens()
+        if err:
+            yield line_num + 1, None, err
+            continue
+
+        ast = shell.parse_tokens(tokens, engine)
+        if ast.error:
+            yield line_num + 1, None, ast.error
+            continue
+
+        context = interpreter.Context('<program>')
+        context.symbol_table = symbol_table
+        value, err = shell.evaluate(ast.node, context, engine, optimize)
+        yield line_num + 1, value, err
+
+
+def main(argv=None):
+    arg_parser = argparse.ArgumentParser(description='Run a large imp script one statement at a time.')
+    arg_parser.add_argument('path', help='script file; statements end at a newline or a semicolon')
+    arg_parser.add_argument('--engine', choices=ENGINES, default='interpreter')
+    arg_parser.add_argument('--no-optimize', dest='optimize', action='store_false', help='skip constant folding')
+    arg_parser.add_argument('--keep-going', action='store_true', help='report errors and continue with the next statement')
+    arg_parser.add_argument('-q', '--quiet', action='store_true', help="don't print statement values")
+    args = arg_parser.parse_args(argv)
+
+    status = 0
+    for line_num, value, err in run_file(args.path, engine=args.engine, optimize=args.optimize):
+        if err:
+            print(err.as_string(), file=sys.stderr)
+            status = 1
+            if not args.keep_going: break
+        elif value is not None and not args.quiet:
+            print(value)
+
+    return status
+
+
+if __name__ == '__main__':
+    sys.exit(main())
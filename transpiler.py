@@ -0,0 +1,453 @@
+##########
+# IMPORTS
+##########
+
+import closures
+import error
+import hashlib
+import interpreter
+import lexer
+import marshal
+import optimizer
+import os
+import parse
+import re
+import sys
+
+
+##########
+# CONSTANTS
+##########
+
+FORMAT_VERSION = 4
+CACHE_DIR = os.path.join(os.environ.get('IMP_CACHE_DIR', os.path.join(os.path.expanduser('~'), '.cache', 'imp')), 'transpiled')
+
+# Expressions nested deeper than this are spilled into temporaries, which keeps
+# generated code well inside CPython's parser and compiler nesting limits
+MAX_EXPR_DEPTH = 40
+
+SIMPLE_EXPR = re.compile(r'_[ti]\d+|None|[0-9.e+-]+')
+
+ARITHMETIC_OPERATORS = {
+    lexer.TT_PLUS: '+',
+    lexer.TT_MINUS: '-',
+    lexer.TT_MUL: '*',
+    lexer.TT_POW: '**',
+}
+
+COMPARISON_OPERATORS = {
+    lexer.TT_EEQ: '==',
+    lexer.TT_NEQ: '!=',
+    lexer.TT_LESS: '<',
+    lexer.TT_GREATER: '>',
+    lexer.TT_LESS_OR_EQ: '<=',
+    lexer.TT_GREATER_OR_EQ: '>=',
+}
+
+
+####################
+# RUNTIME
+####################
+
+class TranspiledRuntime:
+    def __init__(self, context, file_name, text, spans):
+        self.context = context
+        self.source = lexer.Source(file_name, text)
+        self.spans = spans
+
+    def load(self, name):
+        number = self.context.symbol_table.get(name)
+        return number.value if number else None
+
+    def store(self, name, value):
+        if value is not None:
+            self.context.symbol_table.set(name, interpreter.make_number(value))
+
+    def assigned(self, name, value):
+        if value is None: self.context.symbol_table.set(name, None)
+        return value
+
+    def logical_and(self, left, right):
+        return int(left and right)
+
+    def logical_or(self, left, right):
+        return int(left or right)
+
+    def undefined(self, span, name):
+        self.fail(span, f"'{name}' is not defined")
+
+    def zero_division(self, span):
+        self.fail(span, 'Division by zero')
+
+    def fail(self, span, info):
+        index_start, index_end = self.spans[span]
+        pos_start = self.source.position(index_start)
+        pos_end = self.source.position(index_end)
+        raise error.RuntimeError(pos_start, pos_end, info, self.context)
+
+
+####################
+# TRANSPILED PROGRAM
+####################
+
+class TranspiledProgram:
+    def __init__(self, code, file_name, text):
+        self.namespace = {}
+        exec(code, self.namespace)
+        self.file_name = file_name
+        self.text = text
+
+    def run(self, context):
+        runtime = TranspiledRuntime(context, self.file_name, self.text, self.namespace['SPANS'])
+
+        try:
+            value = self.namespace['program'](runtime)
+        except error.RuntimeError as err:
+            return None, err
+
+        if value is None: return None, None
+        return interpreter.make_number(value), None
+
+
+####################
+# TRANSPILER
+####################
+
+class Transpiler:
+    def transpile(self, node):
+        self.spans = []
+        self.names = []
+        self.stored_names = []
+        self.temp_count = 0
+        self.invariant_names = {}
+        self.uses_span = False
+
+        block = []
+        result, _ = self.visit(node, block)
+        block.append(f'return {result}')
+
+        lines = [
+            f'SPANS = {tuple(self.spans)!r}',
+            '',
+            'def program(_rt):',
+            '    _undefined = _rt.undefined',
+            '    _zero_division = _rt.zero_division',
+            '    _assigned = _rt.assigned',
+            '    _and = _rt.logical_and',
+            '    _or = _rt.logical_or',
+        ]
+        if self.uses_span: lines.append('    _span = None')
+        lines += [f"    {self.variable(name)} = _rt.load('{name}')" for name in self.names]
+
+        if self.stored_names:
+            lines.append('    try:')
+            self.render(block, 2, lines)
+            lines.append('    finally:')
+            lines += [f"        _rt.store('{name}', {self.variable(name)})" for name in self.stored_names]
+        else:
+            self.render(block, 1, lines)
+
+        return '\n'.join(lines) + '\n'
+
+    def render(self, block, indent, lines):
+        for item in block:
+            if isinstance(item, tuple):
+                header, body = item
+                lines.append('    ' * indent + header)
+                self.render(body or ['pass'], indent + 1, lines)
+            else:
+                lines.append('    ' * indent + item)
+
+    def visit(self, node, block):
+        method_name = f'visit_{type(node).__name__}'
+        method = getattr(self, method_name, self.no_visit_method)
+        code, depth = method(node, block)
+
+        if depth > MAX_EXPR_DEPTH:
+            temp = self.temp()
+            block.append(f'{temp} = {code}')
+            return temp, 0
+
+        return code, depth
+
+    def no_visit_method(self, node, block):
+        raise Exception(f'No visit_{type(node).__name__} method defined')
+
+    def temp(self):
+        self.temp_count += 1
+        return f'_t{self.temp_count}'
+
+    def invariant(self, node):
+        if node not in self.invariant_names:
+            self.invariant_names[node] = f'_i{len(self.invariant_names) + 1}'
+        return self.invariant_names[node]
+
+    def reset_invariants(self, node, block):
+        for invariant in node.invariants:
+            block.append(f'{self.invariant(invariant)} = None')
+
+    def span(self, node):
+        self.spans.append((node.pos_start.index, node.pos_end.index))
+        return len(self.spans) - 1
+
+    def variable(self, name):
+        if name not in self.names:
+            self.names.append(name)
+        return f'v_{name}'
+
+    def operands(self, nodes, block, track_last=False):
+        results = []
+
+        for i, node in enumerate(nodes):
+            mark = len(block)
+            if track_last and i == len(nodes) - 1:
+                code, depth = self.visit_tracked(node, block)
+            else:
+                code, depth = self.visit(node, block)
+
+            # Statements emitted for this operand must not run before the operands to its left
+            if len(block) > mark:
+                for j, (previous, _) in enumerate(results):
+                    if not SIMPLE_EXPR.fullmatch(previous):
+                        temp = self.temp()
+                        block.insert(mark, f'{temp} = {previous}')
+                        mark += 1
+                        results[j] = (temp, 0)
+
+            results.append((code, depth))
+
+        return results
+
+    def visit_NumberNode(self, node, block):
+        # Folded constants can be negative, and -2 ** x would parse as -(2 ** x)
+        code = repr(node.token.value)
+        if code.startswith('-'): return f'({code})', 1
+        return code, 0
+
+    def visit_VarAccessNode(self, node, block):
+        name = node.var_name_token.value
+        variable = self.variable(name)
+        return f"({variable} if {variable} is not None else _undefined({self.span(node)}, '{name}'))", 1
+
+    def visit_VarAssignNode(self, node, block, track_span=False):
+        name = node.var_name_token.value
+        variable = self.variable(name)
+        if name not in self.stored_names:
+            self.stored_names.append(name)
+
+        code, depth = self.visit_tracked(node.value_node, block) if track_span else self.visit(node.value_node, block)
+
+        if parse.value_origin(node.value_node) is None:
+            return f"_assigned('{name}', ({variable} := {code}))", depth + 2
+        return f'({variable} := {code})', depth + 1
+
+    def visit_BinaryOperationNode(self, node, block):
+        token = node.operation_token
+
+        if token.type == lexer.TT_DIV:
+            origin = parse.value_origin(node.right_node)
+            (left, left_depth), (right, right_depth) = self.operands(
+                (node.left_node, node.right_node), block, track_last=origin is None)
+            span = '_span' if origin is None else self.span(origin)
+            temp = self.temp()
+            return f'({left} / ({temp} if ({temp} := {right}) != 0 else _zero_division({span})))', max(left_depth, right_depth + 2) + 1
+
+        (left, left_depth), (right, right_depth) = self.operands((node.left_node, node.right_node), block)
+        depth = max(left_depth, right_depth) + 1
+
+        if token.type in ARITHMETIC_OPERATORS:
+            return f'({left} {ARITHMETIC_OPERATORS[token.type]} {right})', depth
+        elif token.type in COMPARISON_OPERATORS:
+            return f'int({left} {COMPARISON_OPERATORS[token.type]} {right})', depth
+        elif token.matches(lexer.TT_KEYWORD, 'AND'):
+            return f'_and({left}, {right})', depth
+        elif token.matches(lexer.TT_KEYWORD, 'OR'):
+            return f'_or({left}, {right})', depth
+
+    def visit_UnaryOperationNode(self, node, block):
+        code, depth = self.visit(node.node, block)
+
+        if node.operation_token.type == lexer.TT_MINUS:
+            return f'(-{code})', depth + 1
+        elif node.operation_token.matches(lexer.TT_KEYWORD, 'NOT'):
+            return f'(1 if {code} == 0 else 0)', depth + 1
+
+        return code, depth
+
+    def visit_IfNode(self, node, block, track_span=False):
+        visit = self.visit_tracked if track_span else self.visit
+
+        # The first condition always runs, so its statements can go straight into the block
+        condition, depth = self.visit(node.cases[0][0], block)
+        cases = []
+
+        for i, (condition_node, expr_node) in enumerate(node.cases):
+            condition_block = []
+            if i > 0: condition, depth = self.visit(condition_node, condition_block)
+            expr_block = []
+            expr, expr_depth = visit(expr_node, expr_block)
+            cases.append((condition_block, condition, expr_block, expr, max(depth, expr_depth)))
+
+        else_block = []
+        if node.else_case: else_expr, else_depth = visit(node.else_case, else_block)
+        else: else_expr, else_depth = 'None', 0
+
+        if not else_block and not any(case[0] or case[2] for case in cases) and len(cases) + else_depth < MAX_EXPR_DEPTH:
+            code, depth = else_expr, else_depth
+            for _, condition, _, expr, case_depth in reversed(cases):
+                code, depth = f'({expr} if {condition} != 0 else {code})', max(depth, case_depth) + 1
+            return code, depth
+
+        temp = self.temp()
+        chain = block
+
+        for i, (condition_block, condition, expr_block, expr, _) in enumerate(cases):
+            if i == 0 or condition_block:
+                if i > 0:
+                    nested = list(condition_block)
+                    chain.append(('else:', nested))
+                    chain = nested
+                chain.append((f'if {condition} != 0:', expr_block + [f'{temp} = {expr}']))
+            else:
+                chain.append((f'elif {condition} != 0:', expr_block + [f'{temp} = {expr}']))
+
+        chain.append(('else:', else_block + [f'{temp} = {else_expr}']))
+        return temp, 0
+
+    def visit_ForNode(self, node, block):
+        nodes = [node.start_value_node, node.end_value_node]
+        if node.step_value_node: nodes.append(node.step_value_node)
+        values = [code for code, _ in self.operands(nodes, block)]
+        if not node.step_value_node: values.append('1')
+
+        i, end, step = self.temp(), self.temp(), self.temp()
+        block.append(f'{i} = {values[0]}')
+        block.append(f'{end} = {values[1]}')
+        block.append(f'{step} = {values[2]}')
+
+        self.reset_invariants(node, block)
+
+        variable = self.variable(node.var_name_token.value)
+        if node.var_name_token.value not in self.stored_names:
+            self.stored_names.append(node.var_name_token.value)
+
+        body = [f'{variable} = {i}', f'{i} += {step}']
+        self.statement(node.body_node, body)
+
+        direction = self.step_direction(node.step_value_node)
+        if direction == 1:
+            block.append((f'while {i} < {end}:', body))
+        elif direction == -1:
+            block.append((f'while {i} > {end}:', body))
+        else:
+            ascending = self.temp()
+            block.append(f'{ascending} = {step} >= 0')
+            block.append((f'while ({i} < {end}) if {ascending} else ({i} > {end}):', body))
+
+        return 'None', 0
+
+    def visit_WhileNode(self, node, block):
+        self.reset_invariants(node, block)
+        condition_block = []
+        condition, _ = self.visit(node.condition_node, condition_block)
+        body = []
+        self.statement(node.body_node, body)
+
+        if condition_block:
+            block.append(('while True:', condition_block + [f'if {condition} == 0: break'] + body))
+        else:
+            block.append((f'while {condition} != 0:', body))
+
+        return 'None', 0
+
+    def visit_InvariantNode(self, node, block):
+        variable = self.invariant(node)
+        value_block = []
+        code, depth = self.visit(node.value_node, value_block)
+
+        # Statements the expression needs have to be skipped too once the value is cached
+        if value_block:
+            block.append((f'if {variable} is None:', value_block + [f'{variable} = {code}']))
+            return variable, 0
+        return f'({variable} if {variable} is not None else ({variable} := {code}))', depth + 1
+
+    def visit_tracked(self, node, block):
+        if isinstance(node, parse.IfNode):
+            return self.visit_IfNode(node, block, track_span=True)
+        elif isinstance(node, parse.VarAssignNode):
+            return self.visit_VarAssignNode(node, block, track_span=True)
+
+        code, depth = self.visit(node, block)
+        origin = parse.value_origin(node)
+        if origin is None: return code, depth
+
+        self.uses_span = True
+        return f'({code}, (_span := {self.span(origin)}))[0]', depth + 1
+
+    def statement(self, node, block):
+        code, _ = self.visit(node, block)
+        if not SIMPLE_EXPR.fullmatch(code):
+            block.append(code)
+
+    def step_direction(self, node):
+        if node is None:
+            return 1
+
+        sign = 1
+        while isinstance(node, parse.UnaryOperationNode) and node.operation_token.type in (lexer.TT_PLUS, lexer.TT_MINUS):
+            if node.operation_token.type == lexer.TT_MINUS: sign = -sign
+            node = node.node
+
+        if isinstance(node, parse.NumberNode):
+            return 1 if sign * node.token.value >= 0 else -1
+
+        return 0
+
+
+####################
+# CACHE
+####################
+
+def cache_path(text, optimize=True):
+    key = hashlib.sha256(f'{FORMAT_VERSION}\0{int(optimize)}\0{text}'.encode()).hexdigest()
+    return os.path.join(CACHE_DIR, f'{key}.{sys.implementation.cache_tag}.impc')
+
+
+def load(file_name, text, optimize=True):
+    path = cache_path(text, optimize)
+
+    try:
+        with open(path, 'rb') as file:
+            return TranspiledProgram(marshal.load(file), file_name, text), None
+    except (OSError, EOFError, ValueError, TypeError):
+        pass
+
+    # Generate tokens
+    lex = lexer.Lexer(file_name, text)
+    tokens, error = lex.create_tokens()
+    if error: return None, error
+
+    # Generate AST
+    parser = parse.Parser(tokens)
+    ast = parser.parse()
+    if ast.error: return None, ast.error
+
+    node = optimizer.optimize(ast.node) if optimize else ast.node
+    source = Transpiler().transpile(node)
+
+    try:
+        code = compile(source, '<imp>', 'exec')
+    except (SyntaxError, RecursionError, MemoryError):
+        # Nesting beyond what CPython can compile runs on the closure engine instead
+        return closures.ClosureCompiler().compile(node), None
+
+    try:
+        os.makedirs(CACHE_DIR, exist_ok=True)
+        temp_path = f'{path}.{os.getpid()}.tmp'
+        with open(temp_path, 'wb') as file:
+            marshal.dump(code, file)
+        os.replace(temp_path, path)
+    except OSError:
+        pass
+
+    return TranspiledProgram(code, file_name, text), None
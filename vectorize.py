@@ -0,0 +1,240 @@
+##########
+# IMPORTS
+##########
+
+import lexer
+import parse
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+
+##########
+# CONSTANTS
+##########
+
+# Below this many iterations building the arrays costs more than the scalar loop
+MIN_ITERATIONS = 256
+
+# Longer loops are evaluated this many iterations at a time, carrying the total between chunks,
+# so the arrays stay the same size however long the loop runs
+CHUNK_ITERATIONS = 1 << 20
+
+# Ints are only vectorised while every value stays within this bound, where int64
+# arithmetic and conversion to float64 are both exact
+EXACT_INT_LIMIT = 2 ** 53
+INT64_MAX = 2 ** 63 - 1
+
+COMPARISON_FUNCTIONS = {
+    lexer.TT_EEQ: 'equal',
+    lexer.TT_NEQ: 'not_equal',
+    lexer.TT_LESS: 'less',
+    lexer.TT_GREATER: 'greater',
+    lexer.TT_LESS_OR_EQ: 'less_equal',
+    lexer.TT_GREATER_OR_EQ: 'greater_equal',
+}
+
+VECTOR_OPERATIONS = {
+    lexer.TT_PLUS, lexer.TT_MINUS, lexer.TT_MUL, lexer.TT_DIV, lexer.TT_EEQ, lexer.TT_NEQ, lexer.TT_LESS,
+    lexer.TT_GREATER, lexer.TT_LESS_OR_EQ, lexer.TT_GREATER_OR_EQ, 'AND', 'OR',
+}
+
+
+####################
+# REDUCTIONS
+####################
+
+def reduction(node):
+    # Recognises `FOR i = ... THEN VAR s = s + f(i)`, or a chain like `s + f(i) - g(i)`, where each term
+    # only uses literals, i and names the body doesn't assign, with arithmetic and comparison operators;
+    # returns (slot of s, [(sign, form of term), ...]), or None when NumPy isn't installed
+    if numpy is None: return None
+
+    body = node.body_node
+    if not isinstance(body, parse.VarAssignNode) or body.slot == node.slot: return None
+
+    # Walk down the left operands of ((s + f) - g) + h until s is reached
+    terms = []
+    value = body.value_node
+    while True:
+        if not isinstance(value, parse.BinaryOperationNode): return None
+        token_type = value.operation_token.type
+        if token_type not in (lexer.TT_PLUS, lexer.TT_MINUS): return None
+
+        if token_type == lexer.TT_PLUS and is_access(value.right_node, body.slot):
+            terms.append((1, value.left_node))
+            break
+        terms.append((1 if token_type == lexer.TT_PLUS else -1, value.right_node))
+        if is_access(value.left_node, body.slot): break
+        value = value.left_node
+
+    forms = []
+    for sign, term in reversed(terms):
+        form = vector_form(term, node.slot, body.slot)
+        if form is None: return None
+        forms.append((sign, form))
+    return body.slot, forms
+
+
+def is_access(node, slot):
+    return isinstance(node, parse.VarAccessNode) and node.slot == slot
+
+
+def vector_form(node, loop_slot, target_slot):
+    if isinstance(node, parse.InvariantNode):
+        return vector_form(node.value_node, loop_slot, target_slot)
+
+    if isinstance(node, parse.NumberNode):
+        return ('const', node.token.value)
+
+    if isinstance(node, parse.VarAccessNode):
+        if node.slot == loop_slot: return ('induction',)
+        if node.slot == target_slot: return None
+        return ('var', node.slot)
+
+    if isinstance(node, parse.UnaryOperationNode):
+        operand = vector_form(node.node, loop_slot, target_slot)
+        if operand is None: return None
+        if node.operation_token.type == lexer.TT_MINUS: return ('neg', operand)
+        if node.operation_token.type == lexer.TT_KEYWORD: return ('not', operand)
+        return operand
+
+    if isinstance(node, parse.BinaryOperationNode):
+        token = node.operation_token
+        operation = token.value if token.type == lexer.TT_KEYWORD else token.type
+        if operation not in VECTOR_OPERATIONS: return None
+        left = vector_form(node.left_node, loop_slot, target_slot)
+        right = vector_form(node.right_node, loop_slot, target_slot)
+        if left is None or right is None: return None
+        return (operation, left, right)
+
+    return None
+
+
+####################
+# EVALUATION
+####################
+
+class Unsafe(Exception):
+    # The arrays can't reproduce what the scalar loop would do, which then runs instead
+    pass
+
+
+def run(reduction, values, frame):
+    # The value of s after adding every term for every i in `values` in order, or None when the
+    # scalar loop has to run instead
+    target_slot, forms = reduction
+
+    total = frame[target_slot]
+    if total is None: return None
+
+    # Checked on the range itself, before anything is allocated
+    bound = max(abs(values[0]), abs(values[-1]))
+    if bound > EXACT_INT_LIMIT: return None
+
+    total = total.value
+    try:
+        with numpy.errstate(all='ignore'):
+            for offset in range(0, len(values), CHUNK_ITERATIONS):
+                chunk = values[offset:offset + CHUNK_ITERATIONS]
+                indices = numpy.arange(chunk.start, chunk.stop, chunk.step, dtype=numpy.int64)
+
+                columns = []
+                for sign, form in forms:
+                    terms, term_bound = evaluate(form, (indices, bound), frame)
+                    terms = numpy.broadcast_to(terms, indices.shape)
+                    columns.append((-terms if sign < 0 else terms, term_bound))
+
+                total = total_after(total, columns)
+            return total
+    except (Unsafe, MemoryError):
+        return None
+
+
+def total_after(start, columns):
+    # Int sums are exact as long as each column's sum fits in int64; the start is added as a Python
+    # int, so it can grow past int64 over many chunks. Otherwise the terms are accumulated one at a
+    # time in the order the loop adds them, so they round exactly like the scalar loop; ints added
+    # before the first float term stay small enough to convert to float exactly
+    int_bounds = [bound for _, bound in columns if bound is not None]
+
+    if type(start) is int and len(int_bounds) == len(columns):
+        if len(columns[0][0]) * sum(int_bounds) > INT64_MAX: raise Unsafe()
+        return start + sum(int(terms.sum()) for terms, _ in columns)
+
+    if type(start) is int and abs(start) + sum(int_bounds) > EXACT_INT_LIMIT: raise Unsafe()
+    terms = numpy.stack([terms.astype(numpy.float64) for terms, _ in columns], axis=1).ravel()
+    sums = numpy.add.accumulate(numpy.concatenate(([float(start)], terms)))
+    return float(sums[-1])
+
+
+def evaluate(form, induction, frame):
+    # Returns an array (or 0-d array) with the form's value for every i, and the largest
+    # magnitude it can hold when it is an int array, or None for floats
+    kind = form[0]
+
+    if kind == 'induction':
+        return induction
+
+    if kind == 'const' or kind == 'var':
+        if kind == 'const':
+            value = form[1]
+        else:
+            number = frame[form[1]]
+            if number is None: raise Unsafe()
+            value = number.value
+
+        if type(value) is int:
+            if abs(value) > EXACT_INT_LIMIT: raise Unsafe()
+            return numpy.array(value, dtype=numpy.int64), abs(value)
+        return numpy.array(value, dtype=numpy.float64), None
+
+    if kind == 'neg':
+        operand, bound = evaluate(form[1], induction, frame)
+        return -operand, bound
+
+    if kind == 'not':
+        operand, _ = evaluate(form[1], induction, frame)
+        return (operand == 0).astype(numpy.int64), 1
+
+    left, left_bound = evaluate(form[1], induction, frame)
+    right, right_bound = evaluate(form[2], induction, frame)
+    ints = left_bound is not None and right_bound is not None
+
+    if kind == lexer.TT_PLUS or kind == lexer.TT_MINUS:
+        bound = left_bound + right_bound if ints else None
+        if ints and bound > EXACT_INT_LIMIT: raise Unsafe()
+        return (left + right if kind == lexer.TT_PLUS else left - right), bound
+
+    if kind == lexer.TT_MUL:
+        bound = left_bound * right_bound if ints else None
+        if ints and bound > EXACT_INT_LIMIT: raise Unsafe()
+        return left * right, bound
+
+    if kind == lexer.TT_DIV:
+        # Division by zero has to be raised by the scalar loop, on the right node
+        if numpy.any(right == 0): raise Unsafe()
+        return numpy.true_divide(left, right), None
+
+    if kind == 'AND':
+        return numpy.where(left != 0, truncate(right, right_bound), 0), truncated_bound(right_bound)
+
+    if kind == 'OR':
+        return numpy.where(left != 0, truncate(left, left_bound), truncate(right, right_bound)), \
+            max(truncated_bound(left_bound), truncated_bound(right_bound))
+
+    comparison = getattr(numpy, COMPARISON_FUNCTIONS[kind])
+    return comparison(left, right).astype(numpy.int64), 1
+
+
+def truncate(values, bound):
+    # AND/OR return int() of an operand, which truncates floats and fails on inf and nan
+    if bound is not None: return values
+    if not numpy.all(numpy.isfinite(values)) or numpy.any(numpy.abs(values) > EXACT_INT_LIMIT): raise Unsafe()
+    return numpy.trunc(values).astype(numpy.int64)
+
+
+def truncated_bound(bound):
+    return EXACT_INT_LIMIT if bound is None else bound
@@ -0,0 +1,144 @@
+##########
+# IMPORTS
+##########
+
+from compiler import *
+import error
+import interpreter
+
+
+####################
+# VM
+####################
+
+UNBOUND = object()
+
+
+class VM:
+    def run(self, chunk, context):
+        table = context.symbol_table
+        names = chunk.names
+        slots = [UNBOUND] * len(names)
+
+        try:
+            value, err = self.execute(chunk, context, slots)
+        finally:
+            # Stores are kept in slots while the chunk runs and written back once
+            for slot in chunk.stored_slots:
+                if slots[slot] is not UNBOUND:
+                    table.set(names[slot], interpreter.make_number(slots[slot]))
+
+        if err: return None, err
+        if value is None: return None, None
+        return interpreter.make_number(value), None
+
+    def execute(self, chunk, context, slots):
+        code = chunk.code
+        table = context.symbol_table
+        names = chunk.names
+        invariants = [None] * len(chunk.invariant_slots)
+        stack = []
+        push = stack.append
+        pop = stack.pop
+        span = None
+        pc = 0
+
+        while True:
+            op = code[pc]
+            arg = code[pc + 1]
+            pc += 2
+
+            if op == OP_LOAD_NAME:
+                value = slots[arg]
+                if value is UNBOUND:
+                    number = table.get(names[arg])
+                    if not number:
+                        pos_start, pos_end = chunk.spans[pc - 2]
+                        return None, error.RuntimeError(pos_start, pos_end, f"'{names[arg]}' is not defined", context)
+                    value = slots[arg] = number.value
+                push(value)
+            elif op == OP_LOAD_CONST:
+                push(arg)
+            elif op == OP_ADD:
+                right = pop()
+                stack[-1] = stack[-1] + right
+            elif op == OP_STORE_NAME:
+                value = stack[-1]
+                if value is None:
+                    table.set(names[arg], None)
+                    slots[arg] = UNBOUND
+                else:
+                    slots[arg] = value
+            elif op == OP_POP_TOP:
+                pop()
+            elif op == OP_FOR_ITER:
+                i = stack[-3]
+                if (i < stack[-2]) if stack[-1] >= 0 else (i > stack[-2]):
+                    slots[arg[0]] = i
+                    stack[-3] = i + stack[-1]
+                else:
+                    del stack[-3:]
+                    pc = arg[1]
+            elif op == OP_JUMP:
+                pc = arg
+            elif op == OP_POP_JUMP_IF_FALSE:
+                if pop() == 0: pc = arg
+            elif op == OP_SUB:
+                right = pop()
+                stack[-1] = stack[-1] - right
+            elif op == OP_MUL:
+                right = pop()
+                stack[-1] = stack[-1] * right
+            elif op == OP_LESS:
+                right = pop()
+                stack[-1] = int(stack[-1] < right)
+            elif op == OP_GREATER:
+                right = pop()
+                stack[-1] = int(stack[-1] > right)
+            elif op == OP_LESS_OR_EQ:
+                right = pop()
+                stack[-1] = int(stack[-1] <= right)
+            elif op == OP_GREATER_OR_EQ:
+                right = pop()
+                stack[-1] = int(stack[-1] >= right)
+            elif op == OP_EQ:
+                right = pop()
+                stack[-1] = int(stack[-1] == right)
+            elif op == OP_NEQ:
+                right = pop()
+                stack[-1] = int(stack[-1] != right)
+            elif op == OP_DIV:
+                right = pop()
+                if right == 0:
+                    pos_start, pos_end = chunk.spans.get(pc - 2, span)
+                    return None, error.RuntimeError(pos_start, pos_end, 'Division by zero', context)
+                stack[-1] = stack[-1] / right
+            elif op == OP_POW:
+                right = pop()
+                stack[-1] = stack[-1] ** right
+            elif op == OP_AND:
+                right = pop()
+                stack[-1] = int(stack[-1] and right)
+            elif op == OP_OR:
+                right = pop()
+                stack[-1] = int(stack[-1] or right)
+            elif op == OP_NEG:
+                stack[-1] = -stack[-1]
+            elif op == OP_NOT:
+                stack[-1] = 1 if stack[-1] == 0 else 0
+            elif op == OP_LOAD_NONE:
+                push(None)
+            elif op == OP_LOAD_INVARIANT:
+                value = invariants[arg[0]]
+                if value is not None:
+                    push(value)
+                    pc = arg[1]
+            elif op == OP_STORE_INVARIANT:
+                invariants[arg] = stack[-1]
+            elif op == OP_RESET_INVARIANTS:
+                for slot in arg:
+                    invariants[slot] = None
+            elif op == OP_SET_SPAN:
+                span = chunk.spans[pc - 2]
+            elif op == OP_RETURN:
+                return pop(), None